@@ -1,22 +1,50 @@
 import argparse
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Literal
 
-from pydantic import BaseModel
-
-class Argument(BaseModel):
+# 起動を速くするため pydantic は使わず、パスの変換は argparse で行う
+@dataclass
+class Argument:
+    command: Literal["run", "serve", "client", "compile-templates"] = "run"
     config: Path = Path("config.yaml")
     input: Path | None = None
     recipes: list[str] | None = None
     presets: list[str] | None = None
+    jobs: int | None = None
+    engine: Literal["sync", "async"] = "sync"
+    queue_size: int = 16
+    incremental: bool = False
+    force: bool = False
+    prune_manifest: bool = False
+    watch: bool = False
+    watch_interval: float = 1.0
+    socket: Path | None = None
+    port: int | None = None
+    cache_dir: Path | None = None
+    no_cache: bool = False
+    parse_cache_size: int = 512
+    compiled_templates: Path | None = None
+    compile_zip: bool = False
+    validate_textfsm: bool = False
     verbose: bool = False
 
 
 def set_parser() -> tuple[argparse.ArgumentParser, Argument]:
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["run", "serve", "client", "compile-templates"],
+        default="run",
+        help="run: render recipes (default), serve: start a render server, "
+        "client: send recipes to a running server, "
+        "compile-templates: precompile the templates referenced by the config",
+    )
     parser.add_argument(
         "-c",
         "--config",
-        type=str,
+        type=Path,
         metavar="<config-path>",
         default="config.yaml",
         help="Path to the configuration file (default: config.yaml)",
@@ -24,7 +52,7 @@ def set_parser() -> tuple[argparse.ArgumentParser, Argument]:
     parser.add_argument(
         "-i",
         "--input",
-        type=str,
+        type=Path,
         metavar="<input-path>",
         help="Path to the input file or directory",
     )
@@ -44,6 +72,103 @@ def set_parser() -> tuple[argparse.ArgumentParser, Argument]:
         metavar="<preset-names>",
         help="List of preset names to use",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="<num-jobs>",
+        help="Number of worker processes per recipe (0: CPU count; overrides 'parallel')",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["sync", "async"],
+        default="sync",
+        help="Execution engine (async: overlap reading, rendering and writing)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        metavar="<size>",
+        default=16,
+        help="Maximum number of files buffered between async pipeline stages",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip input files whose inputs, recipe and templates are unchanged",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-render all files even in incremental mode",
+    )
+    parser.add_argument(
+        "--prune-manifest",
+        action="store_true",
+        help="Remove manifest entries for input files that no longer exist",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and re-render input files when they change",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        metavar="<seconds>",
+        default=1.0,
+        help="Polling interval in seconds for --watch (default: 1.0)",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        metavar="<socket-path>",
+        help="Unix socket path for serve/client (default: stapler.sock)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        metavar="<port>",
+        help="Use loopback HTTP on this port instead of a Unix socket "
+        "(requests are authenticated with a token written to stapler.token)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        metavar="<cache-dir>",
+        help="Directory for compiled template and parse result caches "
+        "(default: user cache directory)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write on-disk caches",
+    )
+    parser.add_argument(
+        "--parse-cache-size",
+        type=int,
+        metavar="<size-mib>",
+        default=512,
+        help="Maximum size of the parse result cache in MiB (0: disabled; default: 512)",
+    )
+    parser.add_argument(
+        "--compiled-templates",
+        type=Path,
+        metavar="<compiled-dir>",
+        help="Directory of precompiled templates to load "
+        "(output directory for compile-templates; default: compiled_templates)",
+    )
+    parser.add_argument(
+        "--compile-zip",
+        action="store_true",
+        help="Write compile-templates output as zip archives",
+    )
+    parser.add_argument(
+        "--validate-textfsm",
+        action="store_true",
+        help="Load every TextFSM template referenced by the config before running",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -0,0 +1,147 @@
+import argparse
+import sys
+from pathlib import Path
+
+from loguru import logger
+from pydantic import ValidationError
+from ruamel.yaml import YAML
+
+from args import Argument
+from config import Config, RunOption
+from processor.runner import run_processor
+from processor.templater import (
+    compile_config_templates,
+    set_compiled_template_dir,
+    set_template_cache_dir,
+)
+from utilities.cache_dir import get_default_cache_dir
+from utilities.resolve_path import resolve_path
+
+DEFAULT_COMPILED_TEMPLATES = "compiled_templates"
+
+
+def get_config(config_path: Path) -> Config | None:
+    with config_path.open("r", encoding="utf-8") as f:
+        config_data = YAML().load(f)
+    try:
+        return Config(**config_data)
+    except ValidationError as e:
+        logger.error(f"Failed to load config from {config_path}: {e}")
+        return None
+
+
+def run_cli(parser: argparse.ArgumentParser, args: Argument):
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if args.verbose else "INFO")
+
+    socket_path = resolve_path(args.socket) if args.socket else None
+    if args.command == "client":
+        # serve/client/--watch などでのみ使うモジュールは、それぞれの処理で読み込む
+        from server import run_client
+
+        if not args.recipes:
+            parser.error("At least one recipe must be provided with --recipes.")
+        sys.exit(
+            run_client(
+                recipes=args.recipes,
+                input_path=resolve_path(args.input) if args.input else None,
+                socket_path=socket_path,
+                port=args.port,
+            )
+        )
+
+    config = get_config(resolve_path(args.config))
+    if not config:
+        parser.error(f"Invalid configuration file: {args.config}")
+        parser.exit(1)
+    logger.debug(config)
+
+    if args.validate_textfsm:
+        from processor.parser.textfsm_parser import validate_textfsm_templates
+
+        textfsm_options = [
+            recipe.parse.textfsm_options
+            for recipe in config.recipes
+            if recipe.parse and recipe.parse.textfsm_options
+        ]
+        if not validate_textfsm_templates(textfsm_options):
+            logger.error("TextFSM template validation failed.")
+            sys.exit(1)
+        logger.info(f"Validated {len(textfsm_options)} TextFSM template references.")
+
+    if args.command == "compile-templates":
+        target = resolve_path(args.compiled_templates or DEFAULT_COMPILED_TEMPLATES)
+        sys.exit(compile_config_templates(config, target, args.compile_zip))
+
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir:
+        cache_dir = resolve_path(args.cache_dir)
+    else:
+        cache_dir = get_default_cache_dir()
+    set_template_cache_dir(cache_dir / "templates" if cache_dir else None)
+    if args.compiled_templates:
+        set_compiled_template_dir(resolve_path(args.compiled_templates))
+
+    run_option = RunOption(
+        jobs=args.jobs,
+        engine=args.engine,
+        queue_size=args.queue_size,
+        incremental=args.incremental,
+        force=args.force,
+        prune_manifest=args.prune_manifest,
+        cache_dir=cache_dir,
+        parse_cache_size=args.parse_cache_size << 20,
+    )
+    if args.command == "serve":
+        from server import serve
+
+        serve(config, run_option, socket_path=socket_path, port=args.port)
+        return
+
+    logger.debug(
+        f"Input Path: {resolve_path(args.input) if args.input else 'Not provided'}"
+    )
+    logger.debug(f"Recipes: {args.recipes if args.recipes else 'None'}")
+    logger.debug(f"Presets: {args.presets if args.presets else 'None'}")
+
+    if args.recipes or args.presets:
+        recipes = args.recipes
+        presets = args.presets
+    else:
+        recipes_str = input("Enter recipes to run (comma-separated)>> ")
+        recipes = [recipe.strip() for recipe in recipes_str.split(",")]
+        presets_str = input("Enter presets to run (comma-separated)>> ")
+        presets = [preset.strip() for preset in presets_str.split(",")]
+
+    if args.input:
+        input_path = resolve_path(args.input)
+    else:
+        input_path = resolve_path(input("Enter input path>> "))
+
+    if not input_path.exists():
+        parser.error(f"The input path '{input_path}' does not exist.")
+        parser.exit(1)
+
+    if args.watch:
+        from processor.watcher import watch_processor
+
+        watch_processor(
+            input_path=input_path,
+            config_path=resolve_path(args.config),
+            config=config,
+            load_config=get_config,
+            recipes=recipes,
+            presets=presets,
+            run_option=run_option,
+            interval=args.watch_interval,
+        )
+        return
+
+    run_processor(
+        input_path=input_path,
+        config=config,
+        recipes=recipes,
+        presets=presets,
+        run_option=run_option,
+    )
@@ -1,6 +1,19 @@
+from pathlib import Path
 from typing import List, Literal
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, field_validator, model_validator
+
+
+def _check_pattern(pattern: str) -> str:
+    # 不正な正規表現は設定の読み込み時にエラーとする
+    # (regex モジュールは読み込みに時間がかかるため、パターンがある場合にのみ読み込む)
+    import regex
+
+    try:
+        regex.compile(pattern)
+    except regex.error as e:
+        raise ValueError(f"Invalid regex pattern '{pattern}': {e}") from e
+    return pattern
 
 
 class InputOption(BaseModel):
@@ -11,6 +24,8 @@ class OutputOption(BaseModel):
     path: str
     encoding: str = "utf-8"
     write_mode: Literal["w", "a"] = "w"
+    skip_unchanged: bool = False
+    stream: bool = False
 
 
 class TemplateOption(BaseModel):
@@ -36,6 +51,8 @@ class ReadContentExtractOption(BaseModel):
             raise ValueError(
                 f"For '{self.extract_type}' extract_type, 'extract' must be a string."
             )
+        if self.extract_type == "regex":
+            _check_pattern(str(self.target))
         return self
 
 
@@ -56,26 +73,36 @@ class YamlOption(BaseModel):
 class XmlOption(BaseModel):
     attribute_key: str = "@{key}"
     text_key: str = "#text"
+    paths: list[str] | None = None
+    stream: bool = False
 
 
 class DsvOption(BaseModel):
-    parse_type: Literal["list", "dict"] = "dict"
+    parse_type: Literal["list", "dict", "columnar"] = "dict"
     enable_header: bool = True
     delimiter: str = "\t"
     skip_empty_lines: bool = True
     comment_line: str | None = None
+    quotechar: str | None = None
+    escapechar: str | None = None
+    doublequote: bool = True
+    stream: bool = False
 
 
 class TextFSMOption(BaseModel):
-    parse_type: Literal["list", "dict"] = "dict"
+    parse_type: Literal["list", "dict", "columnar"] = "dict"
     enable_header: bool = True
     template: str
     encoding: str = "utf-8"
+    stream: bool = False
 
 
 class ParseOption(BaseModel):
-    parse_type: Literal["plain", "json", "yaml", "xml", "dsv", "textfsm"]
+    parse_type: Literal[
+        "plain", "json", "jsonl", "yaml", "yaml_stream", "xml", "dsv", "textfsm"
+    ]
     parse_result_name: str = "parse_result"
+    per_record: bool = False
     json_options: JsonOption | None = None
     yaml_options: YamlOption | None = None
     xml_options: XmlOption | None = None
@@ -88,6 +115,14 @@ class ParseOption(BaseModel):
             raise ValueError("textfsm_options is required when parse_type is 'textfsm'")
         return self
 
+    @model_validator(mode="after")
+    def check_per_record_supported(self):
+        if self.per_record and self.parse_type not in ("jsonl", "yaml_stream"):
+            raise ValueError(
+                "per_record is only supported when parse_type is 'jsonl' or 'yaml_stream'"
+            )
+        return self
+
 
 class PresetVariableOption(BaseModel):
     path_separator: Literal["local", "posix"] = "posix"
@@ -99,6 +134,11 @@ class VariableOption(BaseModel):
     pattern: str
     match_index: int | str = 0
 
+    @field_validator("pattern")
+    @classmethod
+    def check_pattern(cls, value: str) -> str:
+        return _check_pattern(value)
+
 
 class VariablesOption(BaseModel):
     presets_overwrite: (
@@ -134,6 +174,8 @@ class RecipeOption(BaseModel):
     parse: ParseOption | None = None
     variables: VariablesOption | None = None
     additional_params: dict[str, str | AdditionalParamOption] | None = None
+    parallel: int | None = None
+    incremental: bool = False
 
 
 class PresetRecipeOption(BaseModel):
@@ -189,3 +231,15 @@ class Config(BaseModel):
             if preset.id == preset_id:
                 return preset
         return None
+
+
+class RunOption(BaseModel):
+    jobs: int | None = None
+    engine: Literal["sync", "async"] = "sync"
+    queue_size: int = 16
+    incremental: bool = False
+    force: bool = False
+    prune_manifest: bool = False
+    cache_dir: Path | None = None
+    # パース結果のキャッシュ (cache_dir/parse) の上限サイズ (バイト; 0 以下で無効)
+    parse_cache_size: int = 512 << 20
@@ -0,0 +1,195 @@
+import hashlib
+from pathlib import Path
+
+from jinja2 import Environment, TemplateError, TemplateNotFound, meta
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from config import RecipeOption, RunOption
+from utilities.resolve_path import resolve_path
+
+MANIFEST_VERSION = "1"
+
+
+class ManifestEntry(BaseModel):
+    digest: str
+    output: str
+
+
+class Manifest(BaseModel):
+    version: str = MANIFEST_VERSION
+    recipe: str
+    entries: dict[str, ManifestEntry] = {}
+
+    def is_up_to_date(self, file: Path, digest: str) -> bool:
+        entry = self.entries.get(str(file))
+        if entry is None or entry.digest != digest:
+            return False
+        # 出力ファイルが削除されている場合は再生成する
+        return Path(entry.output).exists()
+
+    def update(self, file: Path, digest: str, output: Path):
+        self.entries[str(file)] = ManifestEntry(digest=digest, output=str(output))
+
+    def prune(self) -> int:
+        stale = [file for file in self.entries if not Path(file).exists()]
+        for file in stale:
+            del self.entries[file]
+        return len(stale)
+
+
+def get_manifest_path(recipe: RecipeOption) -> Path:
+    # 出力パスのうちプレースホルダーを含まない部分のフォルダに配置する
+    prefix = recipe.output.path.split("${", 1)[0]
+    if prefix.endswith(("/", "\\")):
+        folder = resolve_path(prefix)
+    else:
+        folder = resolve_path(prefix).parent
+    return folder / f".stapler-manifest.{recipe.id}.json"
+
+
+def load_manifest(recipe: RecipeOption) -> Manifest:
+    manifest_path = get_manifest_path(recipe)
+    if not manifest_path.exists():
+        return Manifest(recipe=recipe.id)
+    try:
+        manifest = Manifest.model_validate_json(manifest_path.read_bytes())
+    except (OSError, ValidationError) as e:
+        logger.warning(f"Ignoring invalid manifest {manifest_path}: {e}")
+        return Manifest(recipe=recipe.id)
+    if manifest.version != MANIFEST_VERSION or manifest.recipe != recipe.id:
+        return Manifest(recipe=recipe.id)
+    return manifest
+
+
+def save_manifest(recipe: RecipeOption, manifest: Manifest):
+    manifest_path = get_manifest_path(recipe)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_path.write_text(manifest.model_dump_json(indent=2), encoding="utf-8")
+    tmp_path.replace(manifest_path)
+    logger.debug(f"Manifest written: {manifest_path}")
+
+
+def compute_file_digest(file: Path) -> str:
+    with file.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def compute_recipe_digest(recipe: RecipeOption, template_env: Environment) -> str:
+    h = hashlib.sha256()
+    h.update(recipe.model_dump_json().encode("utf-8"))
+    compiled_digest = getattr(template_env.loader, "digest", None)
+    if compiled_digest is not None:
+        # コンパイル済みテンプレートはソースを参照できないため、成果物のハッシュを使う
+        h.update(b"\0compiled\0" + compiled_digest.encode("utf-8"))
+    for name, source in _iter_template_sources(template_env, recipe.template.file):
+        h.update(b"\0template\0" + name.encode("utf-8") + b"\0")
+        h.update(source.encode("utf-8"))
+    if recipe.parse and recipe.parse.textfsm_options:
+        textfsm_path = resolve_path(recipe.parse.textfsm_options.template)
+        h.update(b"\0textfsm\0")
+        if textfsm_path.is_file():
+            h.update(textfsm_path.read_bytes())
+    return h.hexdigest()
+
+
+def _iter_template_sources(env: Environment, template_name: str):
+    # include/extends/import で参照されるテンプレートも含めてハッシュ対象とする
+    if env.loader is None or not env.loader.has_source_access:
+        return
+    pending = [template_name]
+    seen: set[str] = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            source, _, _ = env.loader.get_source(env, name)  # type: ignore[union-attr]
+        except TemplateNotFound:
+            continue
+        yield name, source
+        try:
+            references = meta.find_referenced_templates(env.parse(source))
+            pending.extend(ref for ref in references if ref)
+        except TemplateError as e:
+            logger.debug(f"Failed to analyse template references in {name}: {e}")
+
+
+class IncrementalState:
+    def __init__(
+        self,
+        recipes: list[RecipeOption],
+        template_envs: list[Environment],
+        run_option: RunOption,
+    ):
+        self.recipes = recipes
+        self.force = run_option.force
+        self.enabled = [
+            (run_option.incremental or recipe.incremental)
+            and self._supports_incremental(recipe)
+            for recipe in recipes
+        ]
+        self.manifests = [
+            load_manifest(recipe) if enabled else None
+            for recipe, enabled in zip(recipes, self.enabled)
+        ]
+        self.recipe_digests = [
+            compute_recipe_digest(recipe, template_env) if enabled else ""
+            for recipe, template_env, enabled in zip(
+                recipes, template_envs, self.enabled
+            )
+        ]
+        self.prune = run_option.prune_manifest
+        self._file_digests: dict[Path, str] = {}
+
+    @staticmethod
+    def _supports_incremental(recipe: RecipeOption) -> bool:
+        if recipe.output.write_mode != "w":
+            logger.warning(
+                f"Incremental mode is ignored for recipe '{recipe.id}' "
+                f"(write_mode: {recipe.output.write_mode})"
+            )
+            return False
+        return True
+
+    def _entry_digest(self, index: int, file: Path) -> str:
+        if file not in self._file_digests:
+            self._file_digests[file] = compute_file_digest(file)
+        return hashlib.sha256(
+            (self.recipe_digests[index] + self._file_digests[file]).encode("utf-8")
+        ).hexdigest()
+
+    def pending(self, file: Path) -> list[int]:
+        indices = []
+        for index, manifest in enumerate(self.manifests):
+            if manifest is not None and not self.force:
+                try:
+                    if manifest.is_up_to_date(file, self._entry_digest(index, file)):
+                        logger.debug(
+                            f"Skipping unchanged file {file} ({self.recipes[index].id})"
+                        )
+                        continue
+                except OSError as e:
+                    logger.warning(f"Failed to hash file {file}: {e}")
+            indices.append(index)
+        return indices
+
+    def record(self, index: int, file: Path, output: Path):
+        manifest = self.manifests[index]
+        if manifest is None:
+            return
+        try:
+            manifest.update(file, self._entry_digest(index, file), output)
+        except OSError as e:
+            logger.warning(f"Failed to hash file {file}: {e}")
+
+    def save(self):
+        for recipe, manifest in zip(self.recipes, self.manifests):
+            if manifest is None:
+                continue
+            if self.prune:
+                pruned = manifest.prune()
+                logger.info(f"Pruned {pruned} stale manifest entries ({recipe.id})")
+            save_manifest(recipe, manifest)
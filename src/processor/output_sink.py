@@ -0,0 +1,222 @@
+import codecs
+import hashlib
+import os
+import secrets
+import shutil
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Self, TextIO
+
+from loguru import logger
+
+DEFAULT_MAX_HANDLES = 64
+DEFAULT_BUFFER_SIZE = 1 << 20
+DEFAULT_STREAM_BUFFER_SIZE = 1 << 16
+
+
+class OutputSink:
+    def __init__(
+        self,
+        max_handles: int = DEFAULT_MAX_HANDLES,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        self.max_handles = max(1, max_handles)
+        self.buffer_size = buffer_size
+        self._handles: OrderedDict[Path, TextIO] = OrderedDict()
+        self._buffers: dict[Path, list[str]] = {}
+        self._buffered_sizes: dict[Path, int] = {}
+        self._encodings: dict[Path, str] = {}
+        self._known_dirs: set[Path] = set()
+        self._total_buffered = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def write(
+        self,
+        path: Path,
+        text: str | Iterable[str],
+        write_mode: str,
+        encoding: str,
+        skip_unchanged: bool = False,
+    ) -> bool:
+        self._ensure_parent(path)
+        if self._encodings.get(path, encoding) != encoding:
+            self._release(path)
+        if write_mode == "w":
+            # 上書きの場合は未書き込みの追記内容を破棄して即座に書き込む
+            self._discard(path)
+            return write_file(path, text, write_mode, encoding, skip_unchanged)
+        self._encodings[path] = encoding
+        for chunk in [text] if isinstance(text, str) else text:
+            self._append(path, chunk)
+        return True
+
+    def _append(self, path: Path, text: str):
+        self._buffers.setdefault(path, []).append(text)
+        self._buffered_sizes[path] = self._buffered_sizes.get(path, 0) + len(text)
+        self._total_buffered += len(text)
+        if self._buffered_sizes[path] >= self.buffer_size:
+            self._flush_path(path)
+        elif self._total_buffered >= self.buffer_size * self.max_handles:
+            self.flush()
+
+    def flush(self):
+        for path in list(self._buffers):
+            try:
+                self._flush_path(path)
+            except OSError as e:
+                logger.error(f"Failed to write output {path}: {e}")
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+            self._encodings.clear()
+
+    def _ensure_parent(self, path: Path):
+        parent = path.parent
+        if parent in self._known_dirs:
+            return
+        if not parent.exists():
+            parent.mkdir(parents=True, exist_ok=True)
+        self._known_dirs.add(parent)
+
+    def _get_handle(self, path: Path) -> TextIO:
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle
+        while len(self._handles) >= self.max_handles:
+            evicted_path, evicted = self._handles.popitem(last=False)
+            logger.debug(f"Closing output handle: {evicted_path}")
+            evicted.close()
+        handle = path.open("a", encoding=self._encodings[path])
+        self._handles[path] = handle
+        return handle
+
+    def _flush_path(self, path: Path):
+        chunks = self._buffers.pop(path, None)
+        size = self._buffered_sizes.pop(path, 0)
+        self._total_buffered -= size
+        if not chunks:
+            return
+        handle = self._get_handle(path)
+        handle.write("".join(chunks))
+        handle.flush()
+
+    def _discard(self, path: Path):
+        self._total_buffered -= self._buffered_sizes.pop(path, 0)
+        self._buffers.pop(path, None)
+        handle = self._handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+        self._encodings.pop(path, None)
+
+    def _release(self, path: Path):
+        self._flush_path(path)
+        handle = self._handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+        self._encodings.pop(path, None)
+
+
+def write_file(
+    path: Path,
+    text: str | Iterable[str],
+    write_mode: str,
+    encoding: str,
+    skip_unchanged: bool = False,
+) -> bool:
+    # 返り値: 書き込みを行ったか (内容が同一でスキップした場合は False)
+    if not isinstance(text, str):
+        return _write_chunks(path, text, write_mode, encoding, skip_unchanged)
+    if write_mode != "w" or not skip_unchanged:
+        with path.open(write_mode, encoding=encoding) as f:
+            f.write(text)
+        return True
+    # テキストモードでの書き込みと同じバイト列にする
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    data = text.encode(encoding)
+    if _has_same_content(path, data):
+        return False
+    # 同じフォルダの一時ファイルに書き込んでから置き換え、書き込み途中の内容を見せない
+    tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with tmp_path.open("xb") as f:
+            f.write(data)
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def _write_chunks(
+    path: Path,
+    chunks: Iterable[str],
+    write_mode: str,
+    encoding: str,
+    skip_unchanged: bool,
+) -> bool:
+    if write_mode != "w":
+        # 追記の場合、途中でエラーが発生するとそれまでの内容は書き込まれる
+        with path.open(
+            write_mode, encoding=encoding, buffering=DEFAULT_STREAM_BUFFER_SIZE
+        ) as f:
+            f.writelines(chunks)
+        return True
+    # 一時ファイルに書き込みながらハッシュを計算し、完了後に置き換える
+    tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+    encoder = codecs.getincrementalencoder(encoding)()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp_path.open("xb", buffering=DEFAULT_STREAM_BUFFER_SIZE) as f:
+            for chunk in chunks:
+                # テキストモードでの書き込みと同じバイト列にする
+                if os.linesep != "\n":
+                    chunk = chunk.replace("\n", os.linesep)
+                data = encoder.encode(chunk)
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+            data = encoder.encode("", final=True)
+            digest.update(data)
+            size += len(data)
+            f.write(data)
+        if skip_unchanged and _has_same_digest(path, size, digest.digest()):
+            tmp_path.unlink()
+            return False
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def _has_same_content(path: Path, data: bytes) -> bool:
+    return _has_same_digest(path, len(data), hashlib.sha256(data).digest())
+
+
+def _has_same_digest(path: Path, size: int, digest: bytes) -> bool:
+    try:
+        if path.stat().st_size != size:
+            return False
+        with path.open("rb") as f:
+            current = hashlib.file_digest(f, "sha256").digest()
+    except OSError:
+        return False
+    return current == digest
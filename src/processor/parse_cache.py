@@ -0,0 +1,252 @@
+import hashlib
+import os
+import pickle
+import secrets
+import sys
+import threading
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from loguru import logger
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# パース結果の形式を変更した場合は更新し、古いキャッシュを使わないようにする
+PARSE_CACHE_VERSION = "1"
+# 上限を超えた場合は、この割合まで古いものから削除する
+_EVICT_RATIO = 0.8
+_SUFFIX = ".pickle"
+_LOCK_NAME = ".lock"
+_USAGE_NAME = ".usage"
+
+_MISSING = object()
+# pickle の読み込み・書き込みで発生しうる例外 (pickle モジュールのドキュメントを参照)
+_UNPICKLE_ERRORS = (
+    pickle.UnpicklingError,
+    AttributeError,
+    EOFError,
+    ImportError,
+    IndexError,
+    TypeError,
+    ValueError,
+)
+_PICKLE_ERRORS = (pickle.PicklingError, AttributeError, RecursionError, TypeError)
+
+
+class ParseCache:
+    def __init__(self, directory: Path, max_size: int):
+        # 内容とパース設定のハッシュをキーに、パース結果をファイルとして保存する
+        # 同じフォルダを複数のプロセスで共有するため、登録と削除はロックファイルで直列化する
+        self.directory = directory
+        self.max_size = max_size
+        self.stats: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # ワーカープロセスへは設定のみを渡す
+        return {"directory": self.directory, "max_size": self.max_size}
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__init__(state["directory"], state["max_size"])
+
+    @staticmethod
+    def make_key(content: str, parse_key: str) -> str:
+        h = hashlib.sha256(parse_key.encode("utf-8"))
+        h.update(b"\0")
+        h.update(content.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}{_SUFFIX}"
+
+    def get(self, key: str) -> Any:
+        # 見つからない場合は _MISSING を返す (None もパース結果として保存できるようにする)
+        path = self._entry_path(key)
+        try:
+            with path.open("rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self._count("misses")
+            return _MISSING
+        except (OSError, *_UNPICKLE_ERRORS) as e:
+            # 書き込み途中のものは置き換えで見えないため、壊れたファイルは削除する
+            logger.warning(f"Discarding unreadable parse cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            self._count("misses")
+            return _MISSING
+        try:
+            # 更新日時を最終利用日時として扱う
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return value
+
+    def put(self, key: str, value: Any):
+        try:
+            data = pickle.dumps(value, protocol=5)
+        except _PICKLE_ERRORS as e:
+            logger.debug(f"Parse result is not cacheable: {e}")
+            return
+        if len(data) > self.max_size:
+            return
+        path = self._entry_path(key)
+        tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("xb") as f:
+                f.write(data)
+            with self._locked():
+                usage = self._read_usage() + len(data)
+                if usage > self.max_size:
+                    usage = self._evict(int(self.max_size * _EVICT_RATIO) - len(data))
+                    usage += len(data)
+                os.replace(tmp_path, path)
+                self._write_usage(usage)
+        except OSError as e:
+            logger.warning(f"Failed to write parse cache entry {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._count("stores")
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def take_stats(self) -> Counter[str]:
+        # ワーカープロセスの集計を親プロセスへ渡すため、取得した値はリセットする
+        with self._lock:
+            stats, self.stats = self.stats, Counter()
+        return stats
+
+    def add_stats(self, stats: Counter[str]):
+        with self._lock:
+            self.stats.update(stats)
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (
+            f"Parse cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['stores']} stored, {stats['evictions']} evicted"
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / _LOCK_NAME, "a+b") as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    def _read_usage(self) -> int:
+        # 使用量はロック中にのみ読み書きする
+        # 他のプロセスが削除した場合などは実際より大きくなるが、削除時に集計し直す
+        try:
+            return int((self.directory / _USAGE_NAME).read_text())
+        except (OSError, ValueError):
+            return self._evict(self.max_size)
+
+    def _write_usage(self, usage: int):
+        (self.directory / _USAGE_NAME).write_text(str(usage))
+
+    def _evict(self, target: int) -> int:
+        # 最終利用日時の古いものから target 以下になるまで削除し、残りの合計サイズを返す
+        entries: list[tuple[int, int, str]] = []
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(subdir.path):
+                if not entry.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        usage = sum(size for _, size, _ in entries)
+        if usage <= target:
+            return usage
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict parse cache entry {path}: {e}")
+                continue
+            usage -= size
+            evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+            logger.debug(f"Evicted {evicted} parse cache entries ({self.directory})")
+        return usage
+
+
+if sys.platform == "win32":
+
+    def _lock_file(f: BinaryIO):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK は一定回数で諦めるため、取得できるまで繰り返す
+                continue
+
+    def _unlock_file(f: BinaryIO):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+
+    def _lock_file(f: BinaryIO):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f: BinaryIO):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def open_parse_cache(cache_dir: Path | None, max_size: int) -> ParseCache | None:
+    # cache_dir が None (--no-cache) または上限が 0 以下の場合は使わない
+    if cache_dir is None or max_size <= 0:
+        return None
+    directory = cache_dir / "parse"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Parse cache disabled ({directory}): {e}")
+        return None
+    return ParseCache(directory, max_size)
+
+
+def cached_parse(
+    cache: ParseCache | None,
+    parse_key: str | None,
+    parser: Callable[[str], Any],
+    content: str,
+) -> Any:
+    # パース結果がキャッシュにあれば使い、なければパースして保存する
+    # パースに失敗した場合 (None) は次回も再試行するため保存しない
+    if cache is None or parse_key is None:
+        return parser(content)
+    key = cache.make_key(content, parse_key)
+    value = cache.get(key)
+    if value is not _MISSING:
+        return value
+    value = parser(content)
+    if value is not None:
+        cache.put(key, value)
+    return value
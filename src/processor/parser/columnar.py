@@ -0,0 +1,137 @@
+import sys
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from itertools import islice, zip_longest
+from typing import Any
+
+# 行を列に振り分ける単位 (行の一覧を一度に保持しない)
+_BATCH_SIZE = 1 << 16
+# 値の種類がこれ以下の列は常にインターンする
+_MIN_DISTINCT = 64
+
+
+class ColumnarTable:
+    def __init__(self, header: Sequence[Any], columns: list[list[Any]]):
+        # 列ごとの値の一覧として保持し、行は参照時にビューを作る
+        # 繰り返し現れる文字列はインターンして同じオブジェクトを共有する
+        self.header = list(header)
+        self.columns = columns
+        self._positions = {name: i for i, name in enumerate(self.header)}
+        self._size = len(columns[0]) if columns else 0
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[Sequence[Any]], header: Sequence[Any] | None = None
+    ) -> "ColumnarTable":
+        # header が None の場合は列番号を列名とする
+        # 列の足りない行は空文字列で埋め、header より多い列は無視する
+        names: list[Any] = list(header) if header is not None else []
+        columns: list[list[Any]] = [[] for _ in names]
+        # 列ごとにインターンするか (最初に値が入ったバッチで判定する)
+        interned: list[bool | None] = [None for _ in names]
+        size = 0
+        iterator = iter(rows)
+        while batch := list(islice(iterator, _BATCH_SIZE)):
+            if header is None:
+                for _ in range(len(columns), max(map(len, batch))):
+                    names.append(len(columns))
+                    columns.append([""] * size)
+                    interned.append(None)
+            for i, values in enumerate(zip_longest(*batch, fillvalue="")):
+                if i >= len(columns):
+                    break
+                if interned[i] is None:
+                    interned[i] = _is_repetitive(values)
+                columns[i].extend(_intern(values) if interned[i] else values)
+            size += len(batch)
+            for column in columns:
+                if len(column) < size:
+                    column.extend([""] * (size - len(column)))
+        return cls(names, columns)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator["ColumnarRow"]:
+        return self.rows()
+
+    def __getitem__(self, index: int) -> "ColumnarRow":
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("row index out of range")
+        return ColumnarRow(self, index)
+
+    def __repr__(self) -> str:
+        return f"ColumnarTable(header={self.header!r}, rows={self._size})"
+
+    def rows(self) -> Iterator["ColumnarRow"]:
+        return (ColumnarRow(self, index) for index in range(self._size))
+
+    def column(self, name: Any) -> list[Any]:
+        return self.columns[self._positions[name]]
+
+    def where(
+        self, conditions: Mapping[Any, Any] | None = None, **kwargs: Any
+    ) -> "ColumnarTable":
+        # 列の値がすべて一致する行のテーブルを返す
+        indices: Iterable[int] = range(self._size)
+        for name, value in {**(conditions or {}), **kwargs}.items():
+            column = self.column(name)
+            indices = [index for index in indices if column[index] == value]
+        return self._take(indices)
+
+    def group_by(self, name: Any) -> dict[Any, "ColumnarTable"]:
+        # 列の値ごとのテーブル (値が最初に現れた順)
+        groups: dict[Any, list[int]] = {}
+        for index, value in enumerate(self.column(name)):
+            groups.setdefault(_hashable(value), []).append(index)
+        return {value: self._take(indices) for value, indices in groups.items()}
+
+    def _take(self, indices: Iterable[int]) -> "ColumnarTable":
+        if isinstance(indices, range) and len(indices) == self._size:
+            return self
+        indices = list(indices)
+        return ColumnarTable(
+            self.header,
+            [list(map(column.__getitem__, indices)) for column in self.columns],
+        )
+
+
+class ColumnarRow(Mapping):
+    __slots__ = ("_index", "_table")
+
+    def __init__(self, table: ColumnarTable, index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, name: Any) -> Any:
+        return self._table.columns[self._table._positions[name]][self._index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._table.header)
+
+    def __len__(self) -> int:
+        return len(self._table.header)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+def _is_repetitive(values: tuple[Any, ...]) -> bool:
+    # 値の種類が少ない列のみインターンする (一意な値ばかりの列ではインターンの負荷が大きい)
+    try:
+        return len(set(values)) <= max(len(values) // 2, _MIN_DISTINCT)
+    except TypeError:
+        return True
+
+
+def _intern(values: tuple[Any, ...]) -> list[Any]:
+    try:
+        return list(map(sys.intern, values))
+    except TypeError:
+        # TextFSM の List 値など、文字列以外を含む列
+        return [sys.intern(v) if type(v) is str else v for v in values]
+
+
+def _hashable(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
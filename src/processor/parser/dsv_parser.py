@@ -1,33 +1,142 @@
+import csv
+from collections.abc import Iterator
+from itertools import repeat
 from typing import Any
 
+from loguru import logger
+
 from config import DsvOption
+from processor.parser.columnar import ColumnarTable
+from processor.read_content import iter_lines
+
+
+class DsvRows:
+    def __init__(self, content: str, options: DsvOption):
+        # stream が有効な場合のパース結果
+        # 反復するたびに内容を先頭から読み、行を順に返す (全行を保持しない)
+        self.content = content
+        self.options = options
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            yield from iter_dsv_rows(self.content, self.options)
+        except csv.Error as e:
+            logger.error(f"Error parsing DSV: {e}")
+
+    def __repr__(self) -> str:
+        return f"DsvRows(delimiter={self.options.delimiter!r})"
 
 
 def parse_dsv(content: str, options: DsvOption | None) -> Any:
     if options is None:
         options = DsvOption()
+    if options.stream and options.parse_type != "columnar":
+        return DsvRows(content, options)
+    try:
+        if options.parse_type == "columnar":
+            rows = _read_rows(content, options)
+            if not options.enable_header:
+                return ColumnarTable.from_rows(rows)
+            return ColumnarTable.from_rows(rows, next(rows, []))
+        return list(iter_dsv_rows(content, options))
+    except csv.Error as e:
+        logger.error(f"Error parsing DSV: {e}")
+        return None
+
+
+def iter_dsv_rows(content: str, options: DsvOption) -> Iterator[Any]:
+    rows = _read_rows(content, options)
+    if options.parse_type == "dict":
+        if options.enable_header:
+            header = next(rows, None)
+            if header is None:
+                return iter(())
+            return map(dict, map(zip, repeat(header), rows))
+        return map(dict, map(enumerate, rows))
+    if options.enable_header:
+        next(rows, None)
+    return rows
+
+
+def _read_rows(content: str, options: DsvOption) -> Iterator[list[str]]:
+    quotechar = options.quotechar or None
+    escapechar = options.escapechar or None
+    if len(options.delimiter) != 1 or not (
+        (quotechar and quotechar in content) or (escapechar and escapechar in content)
+    ):
+        # 引用符・エスケープ文字を含まない場合は、csv モジュールより速い str.split で分割する
+        # (csv モジュールは 1 文字の区切り文字のみ対応)
+        lines = _filter_lines(iter_lines(content, newlines_only=True), options)
+        return map(str.split, lines, repeat(options.delimiter))
+    # 改行を残したまま一行ずつ渡し、引用符内の改行を csv モジュールに処理させる
+    # (どちらの場合も csv モジュールと同じく "\r\n"・"\r"・"\n" のみを改行とする)
+    source = _LastLine(
+        _filter_lines(
+            iter_lines(content, keepends=True, newlines_only=True),
+            options,
+            skip_empty=False,
+        )
+    )
+    reader = csv.reader(
+        source,
+        delimiter=options.delimiter,
+        quotechar=quotechar,
+        escapechar=escapechar,
+        doublequote=options.doublequote,
+        quoting=csv.QUOTE_MINIMAL if quotechar else csv.QUOTE_NONE,
+        # 閉じられていない引用符などは、以降の行をまとめて一つの値にせずエラーとする
+        strict=True,
+    )
+    if options.skip_empty_lines:
+        return _skip_blank_rows(reader, source)
+    # 空行は空文字列 1 つの行とする
+    return (row or [""] for row in reader)
+
 
-    lines = content.splitlines()
-    rows = []
+def _filter_lines(
+    lines: Iterator[str], options: DsvOption, skip_empty: bool = True
+) -> Iterator[str]:
+    # 引用符内の改行を含む場合 (skip_empty=False) は行単位で空行を除外しない
+    skip_empty = skip_empty and options.skip_empty_lines
+    if not options.comment_line:
+        return filter(str.strip, lines) if skip_empty else lines
+    return _skip_comments(lines, options.comment_line, skip_empty)
+
+
+def _skip_comments(
+    lines: Iterator[str], comment_line: str, skip_empty: bool
+) -> Iterator[str]:
     for line in lines:
-        if options.skip_empty_lines and not line.strip():
-            continue
-        if options.comment_line and line.strip().startswith(options.comment_line):
+        stripped = line.strip()
+        if not stripped:
+            if skip_empty:
+                continue
+        elif stripped.startswith(comment_line):
             continue
-        rows.append(line.split(options.delimiter))
+        yield line
 
-    if not rows:
-        return [] if options.parse_type == "list" else []
 
-    if options.parse_type == "dict":
-        if options.enable_header:
-            header = rows[0]
-            data_rows = rows[1:]
-            return [dict(zip(header, row)) for row in data_rows]
-        else:
-            return [{i: v for i, v in enumerate(row)} for row in rows]
-    else:
-        if options.enable_header:
-            return rows[1:]
-        else:
-            return rows
+class _LastLine:
+    def __init__(self, lines: Iterator[str]):
+        # csv.reader に最後に渡した行を保持する
+        self._lines = lines
+        self.line = ""
+
+    def __iter__(self) -> "_LastLine":
+        return self
+
+    def __next__(self) -> str:
+        self.line = next(self._lines)
+        return self.line
+
+
+def _skip_blank_rows(reader: Any, source: _LastLine) -> Iterator[list[str]]:
+    # str.split で分割する場合と同じく、空白のみの行から読んだ行だけを除外する
+    # (",," のような値が空の行や、引用符内の空白のみの行は残す)
+    line_num = 0
+    for row in reader:
+        single_line = reader.line_num == line_num + 1
+        line_num = reader.line_num
+        if single_line and not source.line.strip():
+            continue
+        yield row
@@ -1,4 +1,8 @@
 import json
+from collections.abc import Iterator
+from typing import Any
+
+from loguru import logger
 
 from config import JsonOption
 
@@ -8,3 +12,37 @@ def parse_json(content: str, _: JsonOption | None):
         return json.loads(content)
     except Exception:
         return None
+
+
+class JsonLines:
+    def __init__(self, content: str):
+        # JSON Lines のパース結果
+        # 反復するたびに内容を一行ずつ読み、レコードを順に返す (全件を保持しない)
+        self.content = content
+
+    def __iter__(self) -> Iterator[Any]:
+        for number, line in enumerate(_iter_json_lines(self.content), 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.warning(f"Skipping invalid JSON at line {number}: {e}")
+
+    def __repr__(self) -> str:
+        return "JsonLines()"
+
+
+def _iter_json_lines(content: str) -> Iterator[str]:
+    # JSON Lines は "\n" のみで区切る (str.splitlines は文字列内の U+2028 などでも区切るため使わない)
+    pos = 0
+    while pos < len(content):
+        end = content.find("\n", pos)
+        if end < 0:
+            end = len(content)
+        yield content[pos:end].removesuffix("\r")
+        pos = end + 1
+
+
+def parse_jsonl(content: str, _: JsonOption | None) -> JsonLines:
+    return JsonLines(content)
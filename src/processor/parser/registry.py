@@ -0,0 +1,34 @@
+import importlib
+from collections.abc import Callable
+from typing import Any
+
+from config import ParseOption
+
+# parse_type ごとのパーサー: (モジュール名, 関数名, ParseOption のオプションの属性名)
+# パーサーのモジュールは依存パッケージ (textfsm, ruamel.yaml など) の読み込みに時間がかかるため、
+# レシピで使われる場合に初めて読み込む
+PARSERS: dict[str, tuple[str, str, str]] = {
+    "json": ("processor.parser.json_parser", "parse_json", "json_options"),
+    "jsonl": ("processor.parser.json_parser", "parse_jsonl", "json_options"),
+    "yaml": ("processor.parser.yaml_parser", "parse_yaml", "yaml_options"),
+    "yaml_stream": (
+        "processor.parser.yaml_parser",
+        "parse_yaml_stream",
+        "yaml_options",
+    ),
+    "xml": ("processor.parser.xml_parser", "parse_xml", "xml_options"),
+    "dsv": ("processor.parser.dsv_parser", "parse_dsv", "dsv_options"),
+    "textfsm": ("processor.parser.textfsm_parser", "parse_textfsm", "textfsm_options"),
+}
+
+
+def load_parser(
+    parse_option: ParseOption,
+) -> tuple[Callable[[str, Any], Any], Any] | None:
+    # 返り値: (パーサー, パーサーに渡すオプション) (未登録の parse_type の場合は None)
+    entry = PARSERS.get(parse_option.parse_type)
+    if entry is None:
+        return None
+    module_name, function_name, options_name = entry
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name), getattr(parse_option, options_name)
@@ -1,9 +1,122 @@
+import hashlib
+import io
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
 from loguru import logger
 
 import textfsm
 from config import TextFSMOption
+from processor.parser.columnar import ColumnarTable
+from processor.read_content import iter_lines
 from utilities.resolve_path import resolve_path
 
+# (mtime_ns, size)
+TemplateStat = tuple[int, int]
+
+
+class CachedTextFSM:
+    def __init__(self, stat: TemplateStat, source: str):
+        # FSM は状態を持つため、使用中でないインスタンスを使い回し、不足する場合は追加で構築する
+        self.stat = stat
+        self.source = source
+        self.digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        self._idle = [self._build()]
+        self._lock = threading.Lock()
+
+    def _build(self) -> textfsm.TextFSM:
+        return textfsm.TextFSM(io.StringIO(self.source))
+
+    @contextmanager
+    def acquire(self) -> Iterator[textfsm.TextFSM]:
+        with self._lock:
+            fsm = self._idle.pop() if self._idle else None
+        if fsm is None:
+            fsm = self._build()
+        fsm.Reset()
+        try:
+            yield fsm
+        finally:
+            with self._lock:
+                self._idle.append(fsm)
+
+
+# テンプレートの読み込みで発生しうる例外
+TEMPLATE_ERRORS = (OSError, UnicodeError, textfsm.TextFSMTemplateError)
+
+# (テンプレートのパス, エンコーディング) ごとにコンパイル済みの FSM を保持する
+_templates: dict[tuple[Path, str], CachedTextFSM] = {}
+_templates_lock = threading.Lock()
+
+
+def load_textfsm_template(template_path: Path, encoding: str) -> CachedTextFSM:
+    # 更新日時とサイズが変わっていない場合はキャッシュを使う
+    st = template_path.stat()
+    stat = (st.st_mtime_ns, st.st_size)
+    key = (template_path, encoding)
+    with _templates_lock:
+        cached = _templates.get(key)
+        if cached is not None and cached.stat == stat:
+            return cached
+    with open(template_path, encoding=encoding) as f:
+        cached = CachedTextFSM(stat, f.read())
+    with _templates_lock:
+        _templates[key] = cached
+    return cached
+
+
+def clear_textfsm_templates():
+    with _templates_lock:
+        _templates.clear()
+
+
+class TextFSMRecords:
+    def __init__(self, content: str, cached: CachedTextFSM, options: TextFSMOption):
+        # stream が有効な場合のパース結果
+        # 反復するたびに内容を一行ずつ FSM に渡し、完成したレコードから順に返す (全件を保持しない)
+        self.content = content
+        self.cached = cached
+        self.options = options
+
+    def __iter__(self) -> Iterator[Any]:
+        with self.cached.acquire() as fsm:
+            header = fsm.header
+            if self.options.parse_type == "list":
+                if self.options.enable_header:
+                    yield header
+                yield from _iter_records(fsm, self.content)
+            else:
+                for record in _iter_records(fsm, self.content):
+                    yield dict(zip(header, record))
+
+    def __repr__(self) -> str:
+        return f"TextFSMRecords({self.options.template!r})"
+
+
+def _iter_records(fsm: textfsm.TextFSM, content: str) -> Iterator[list[Any]]:
+    # TextFSM.ParseText と同じ処理を一行ずつ行う
+    # ParseText は全件をリストにして返すため、完成したレコードを順に取り出せるよう
+    # 非公開の属性 (_CheckLine, _result, _cur_state_name, _AppendRecord) を直接扱う
+    # (TextFSM の内部を参照するのはこの関数のみとする)
+    # Fillup の値は後の行で前のレコードを書き換えるため、最後まで取り出さずに保持する
+    fillup = any(
+        option.name == "Fillup" for value in fsm.values for option in value.options
+    )
+    for line in iter_lines(content):
+        fsm._CheckLine(line)
+        if fsm._result and not fillup:
+            yield from fsm._result
+            fsm._result = []
+        if fsm._cur_state_name in ("End", "EOF"):
+            break
+    if fsm._cur_state_name != "End" and "EOF" not in fsm.states:
+        fsm._AppendRecord()
+    yield from fsm._result
+    fsm._result = []
+
 
 def parse_textfsm(content: str, options: TextFSMOption | None):
     if options is None or not hasattr(options, "template"):
@@ -13,18 +126,36 @@ def parse_textfsm(content: str, options: TextFSMOption | None):
         logger.error(f"Template path not found: {options.template}")
         return [template_path.as_posix()]
     try:
-        with open(template_path, encoding=options.encoding) as f:
-            fsm = textfsm.TextFSM(f)
-
-        if options.parse_type == "list":
-            result = []
-            if options.enable_header:
-                result.append(fsm.header)
-            result.extend(fsm.ParseText(content))
-            return result
-        elif options.parse_type == "dict":
-            return fsm.ParseTextToDicts(content)
-        return None
+        cached = load_textfsm_template(template_path, options.encoding)
+        if options.stream and options.parse_type != "columnar":
+            return TextFSMRecords(content, cached, options)
+        with cached.acquire() as fsm:
+            if options.parse_type == "list":
+                result = []
+                if options.enable_header:
+                    result.append(fsm.header)
+                result.extend(fsm.ParseText(content))
+                return result
+            elif options.parse_type == "dict":
+                return fsm.ParseTextToDicts(content)
+            elif options.parse_type == "columnar":
+                # 一行ずつ処理したレコードを順に列へ振り分ける
+                # (Fillup の値を含む場合は全行の処理後に振り分けるため、dict と同じ結果になる)
+                return ColumnarTable.from_rows(_iter_records(fsm, content), fsm.header)
+            return None
     except Exception as e:
         logger.error(f"Error parsing TextFSM template: {e}")
         return None
+
+
+def validate_textfsm_templates(options: Iterable[TextFSMOption]) -> bool:
+    # 返り値: すべてのテンプレートを読み込めたか (読み込んだテンプレートはキャッシュされる)
+    valid = True
+    for option in {(o.template, o.encoding): o for o in options}.values():
+        template_path = resolve_path(option.template)
+        try:
+            load_textfsm_template(template_path, option.encoding)
+        except TEMPLATE_ERRORS as e:
+            logger.error(f"Invalid TextFSM template {template_path}: {e}")
+            valid = False
+    return valid
@@ -1,51 +1,182 @@
 import xml.etree.ElementTree as ET
-from typing import Any, Dict
+from collections.abc import Iterator
+from typing import Any
+
+from loguru import logger
 
 from config import XmlOption
 
+# パスを指定した場合に XMLPullParser へ一度に渡す文字数
+_FEED_SIZE = 1 << 16
+
+# パスの分割結果: (ルートからのパスか, 要素名の一覧)
+XmlPath = tuple[bool, tuple[str, ...]]
+
+
+class _AttributeKeys(dict):
+    def __init__(self, attribute_key: str):
+        # 属性名ごとに attribute_key.format の結果を保持する
+        super().__init__()
+        self.attribute_key = attribute_key
+
+    def __missing__(self, key: str) -> str:
+        value = self[key] = self.attribute_key.format(key=key)
+        return value
+
 
 def _etree_to_dict(elem, attribute_key, text_key) -> dict:
-    d: Dict[str, Any] = {elem.tag: {} if elem.attrib else None}
-    children = list(elem)
-    if children:
-        dd: Dict[str, Any] = {}
-        for child in children:
-            dc = _etree_to_dict(child, attribute_key, text_key)
-            if not isinstance(dc, dict):
-                continue
-            for k, v in dc.items():
-                if k in dd:
-                    if not isinstance(dd[k], list):
-                        dd[k] = [dd[k]]
-                    dd[k].append(v)
-                else:
-                    dd[k] = v
-        d = {elem.tag: dd}
-    if elem.attrib:
-        t = d[elem.tag]
-        if t is None:
-            t = {}
-        t.update((attribute_key.format(key=k), v) for k, v in elem.attrib.items())
-        d[elem.tag] = t
-    text = (elem.text or "").strip()
-    if text:
-        t = d[elem.tag]
-        if t is None:
-            t = {}
-        t[text_key] = text
-        d[elem.tag] = t
-    return d
+    return {elem.tag: _convert(elem, _AttributeKeys(attribute_key), text_key)}
+
+
+def _convert(root: ET.Element, attribute_keys: _AttributeKeys, text_key: str) -> Any:
+    # 深い階層でも再帰の上限に達しないよう、スタックを使って子から順に変換する
+    # スタックの要素: [要素, 子要素のイテレーター, 子要素の変換結果]
+    stack: list[list[Any]] = [[root, iter(root), None]]
+    value: Any = None
+    while stack:
+        frame = stack[-1]
+        child = next(frame[1], None)
+        if child is not None:
+            stack.append([child, iter(child), None])
+            continue
+        stack.pop()
+        elem, _, value = frame
+        if elem.attrib:
+            if value is None:
+                value = {}
+            for k, v in elem.attrib.items():
+                value[attribute_keys[k]] = v
+        text = (elem.text or "").strip()
+        if text:
+            if value is None:
+                value = {}
+            value[text_key] = text
+        if not stack:
+            break
+        parent = stack[-1]
+        if parent[2] is None:
+            parent[2] = {}
+        siblings = parent[2]
+        if elem.tag in siblings:
+            if not isinstance(siblings[elem.tag], list):
+                siblings[elem.tag] = [siblings[elem.tag]]
+            siblings[elem.tag].append(value)
+        else:
+            siblings[elem.tag] = value
+    return value
 
 
 def parse_xml(content: str, options: XmlOption | None):
+    if options is not None:
+        attribute_key = options.attribute_key
+        text_key = options.text_key
+    else:
+        attribute_key = "@{key}"
+        text_key = "#text"
+    if options is not None and options.paths:
+        if options.stream:
+            return {path: XmlElements(content, path, options) for path in options.paths}
+        results: dict[str, list[Any]] = {path: [] for path in options.paths}
+        try:
+            for path, value in iter_xml_elements(content, options.paths, options):
+                results[path].append(value)
+        except ET.ParseError as e:
+            logger.error(f"Error parsing XML: {e}")
+            return None
+        return results
     try:
         root = ET.fromstring(content)
-        if options is not None:
-            attribute_key = options.attribute_key
-            text_key = options.text_key
-        else:
-            attribute_key = "@{key}"
-            text_key = "#text"
         return _etree_to_dict(root, attribute_key, text_key)
     except Exception:
         return None
+
+
+class XmlElements:
+    def __init__(self, content: str, path: str, options: XmlOption):
+        # stream が有効な場合のパスごとのパース結果
+        # 反復するたびに内容を先頭から読み、一致した要素を変換して順に返す (木全体を保持しない)
+        # 要素の選択は stream でない場合と同じく全てのパスで行い、他のパスの要素は変換しない
+        self.content = content
+        self.path = path
+        self.options = options
+
+    def __iter__(self) -> Iterator[Any]:
+        paths = self.options.paths or [self.path]
+        for _, value in iter_xml_elements(self.content, paths, self.options, self.path):
+            yield value
+
+    def __repr__(self) -> str:
+        return f"XmlElements({self.path!r})"
+
+
+def iter_xml_elements(
+    content: str, paths: list[str], options: XmlOption, target: str | None = None
+) -> Iterator[tuple[str, Any]]:
+    # 返り値: (パス, 要素の変換結果) を文書内の順に返す
+    # 一致した要素の内側にある要素は、その要素の変換結果に含まれる
+    # target を指定した場合は、そのパスで選択された要素のみを変換して返す
+    compiled = [(path, _compile_path(path)) for path in paths]
+    attribute_keys = _AttributeKeys(options.attribute_key)
+    parser = ET.XMLPullParser(events=("start", "end"))
+    tags: list[str] = []
+    elements: list[ET.Element] = []
+    # 変換対象の要素の深さとパス
+    selected: tuple[int, str] | None = None
+    for pos in range(0, max(len(content), 1), _FEED_SIZE):
+        parser.feed(content[pos : pos + _FEED_SIZE])
+        for event, elem in parser.read_events():
+            if event == "start":
+                tags.append(elem.tag)
+                elements.append(elem)
+                if selected is None:
+                    for path, xml_path in compiled:
+                        if _match_path(xml_path, tags):
+                            selected = (len(tags), path)
+                            break
+                continue
+            depth = len(tags)
+            tags.pop()
+            elements.pop()
+            if selected is not None:
+                if selected[0] != depth:
+                    continue
+                path = selected[1]
+                selected = None
+                if target is not None and path != target:
+                    _release(elem, elements)
+                    continue
+                value = _convert(elem, attribute_keys, options.text_key)
+                _release(elem, elements)
+                yield path, value
+            else:
+                _release(elem, elements)
+    parser.close()
+
+
+def _release(elem: ET.Element, elements: list[ET.Element]):
+    # 処理済みの要素を空にして親から外し、木が大きくならないようにする
+    elem.clear()
+    if elements:
+        parent = elements[-1]
+        if len(parent) and parent[-1] is elem:
+            del parent[-1]
+
+
+def _compile_path(path: str) -> XmlPath:
+    # "/" で始まる場合はルート要素からのパス、それ以外は任意の深さの要素に一致する
+    # 名前空間を含まない要素名は、名前空間を除いた要素名と比較する ("*" は任意の要素)
+    return (path.startswith("/"), tuple(s for s in path.split("/") if s))
+
+
+def _match_path(xml_path: XmlPath, tags: list[str]) -> bool:
+    absolute, segments = xml_path
+    if not segments or len(tags) < len(segments):
+        return False
+    if absolute and len(tags) != len(segments):
+        return False
+    for segment, tag in zip(segments, tags[len(tags) - len(segments) :]):
+        if segment == "*" or segment == tag:
+            continue
+        if "{" in segment or tag.rpartition("}")[2] != segment:
+            return False
+    return True
@@ -1,6 +1,10 @@
+from collections.abc import Iterator
 from io import StringIO
+from typing import Any
 
+from loguru import logger
 from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
 
 from config import YamlOption
 
@@ -11,3 +15,24 @@ def parse_yaml(content: str, _: YamlOption | None):
         return yaml.load(StringIO(content))
     except Exception:
         return None
+
+
+class YamlDocuments:
+    def __init__(self, content: str):
+        # 複数ドキュメントの YAML のパース結果
+        # 反復するたびにドキュメントを一つずつ読み込んで順に返す (全件を保持しない)
+        self.content = content
+
+    def __iter__(self) -> Iterator[Any]:
+        yaml = YAML(typ="safe")
+        try:
+            yield from yaml.load_all(self.content)
+        except YAMLError as e:
+            logger.error(f"Error parsing YAML stream: {e}")
+
+    def __repr__(self) -> str:
+        return "YamlDocuments()"
+
+
+def parse_yaml_stream(content: str, _: YamlOption | None) -> YamlDocuments:
+    return YamlDocuments(content)
@@ -0,0 +1,70 @@
+import asyncio
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+_DONE = object()
+
+
+def run_pipeline(
+    files: Iterable[Path],
+    read: Callable[[Path], Any],
+    compute: Callable[[Path, Any], Any],
+    write: Callable[[Path, Any], None],
+    executor: Executor,
+    queue_size: int = 16,
+):
+    # read/write はスレッドで、compute は executor で実行し、各ステージを有界キューでつなぐ
+    # read が None を返したファイルはスキップする
+    asyncio.run(_run_stages(files, read, compute, write, executor, queue_size))
+
+
+async def _run_stages(
+    files: Iterable[Path],
+    read: Callable[[Path], Any],
+    compute: Callable[[Path, Any], Any],
+    write: Callable[[Path, Any], None],
+    executor: Executor,
+    queue_size: int,
+):
+    loop = asyncio.get_running_loop()
+    compute_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+
+    async def read_stage():
+        for file in await asyncio.to_thread(list, files):
+            try:
+                data = await asyncio.to_thread(read, file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading file {file}: {e}")
+                continue
+            if data is None:
+                continue
+            await compute_queue.put((file, data))
+        await compute_queue.put(_DONE)
+
+    async def compute_stage():
+        # 実行中のタスク (future) を順番どおりに書き込みステージへ渡す
+        while (item := await compute_queue.get()) is not _DONE:
+            file, data = item
+            future = loop.run_in_executor(executor, compute, file, data)
+            await write_queue.put((file, future))
+        await write_queue.put(_DONE)
+
+    async def write_stage():
+        while (item := await write_queue.get()) is not _DONE:
+            file, future = item
+            try:
+                result = await future
+                await asyncio.to_thread(write, file, result)
+            except Exception as e:  # noqa: BLE001
+                # compute/write の例外はファイルごとに報告し、残りのファイルの処理を続ける
+                logger.error(f"Error processing file {file}: {e}")
+
+    async with asyncio.TaskGroup() as group:
+        group.create_task(read_stage())
+        group.create_task(compute_stage())
+        group.create_task(write_stage())
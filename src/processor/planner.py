@@ -0,0 +1,56 @@
+from collections.abc import Iterable
+
+from loguru import logger
+
+from config import RecipeOption
+
+
+def plan_recipe_groups(
+    recipes: Iterable[RecipeOption | None],
+) -> list[list[RecipeOption]]:
+    # 入力・読み込み・パース設定が同一のレシピをまとめ、ファイルの読み込みとパースを共有する
+    # グループ内はファイルごとに各レシピを実行するため、実行順序が変わらないよう
+    # 指定順で隣り合うレシピのみをまとめる
+    groups: list[list[RecipeOption]] = []
+    group_key = None
+    seen: set[str] = set()
+    for recipe in recipes:
+        if not recipe:
+            logger.warning("No valid recipes found in the provided configuration.")
+            continue
+        if recipe.id in seen:
+            logger.debug(f"Recipe '{recipe.id}' is already planned, skipping.")
+            continue
+        seen.add(recipe.id)
+        key = shared_work_key(recipe)
+        if groups and key == group_key and _can_share(groups[-1], recipe):
+            groups[-1].append(recipe)
+        else:
+            groups.append([recipe])
+            group_key = key
+    for group in groups:
+        if len(group) > 1:
+            logger.debug(
+                f"Sharing read/parse across recipes: {[recipe.id for recipe in group]}"
+            )
+    return groups
+
+
+def _can_share(group: list[RecipeOption], recipe: RecipeOption) -> bool:
+    # 同じ出力に追記するレシピをまとめると、レシピごとの出力がファイルごとに交互に並ぶ
+    paths = {member.output.path for member in group}
+    if recipe.output.path not in paths:
+        return True
+    return recipe.output.write_mode != "a" and all(
+        member.output.write_mode != "a" for member in group
+    )
+
+
+def shared_work_key(recipe: RecipeOption) -> str:
+    return "\0".join(
+        [
+            recipe.input.model_dump_json(),
+            recipe.read_content.model_dump_json() if recipe.read_content else "",
+            recipe.parse.model_dump_json() if recipe.parse else "",
+        ]
+    )
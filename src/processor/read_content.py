@@ -1,13 +1,63 @@
+import functools
+import os
 import re
+from collections.abc import Iterator
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, TextIO
 
 from loguru import logger
 
 from config import ReadContentExtractOption, ReadContentOption
 
+if TYPE_CHECKING:
+    import regex
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+# 先頭・末尾の数行だけが必要な場合に備え、小さいチャンクから読み始めて倍々に増やす
+_INITIAL_CHUNK_SIZE = 1 << 13
+# 行頭 (^) や後読みを正しく判定するため、検索位置より前に残しておく文字数
+_SEARCH_CONTEXT = 256
+# str.splitlines が改行として扱う文字
+_LINE_BREAK_PATTERN = r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]"
+_LINE_BREAK = re.compile(_LINE_BREAK_PATTERN)
+_NEWLINE = re.compile(r"\r\n?|\n")
+
+# start/end の検索に使うパターン (exact/regex 以外は None)
+# regex モジュールは読み込みに時間がかかるため、start/end にパターンを使う場合にのみ読み込む
+ContentMarkers = tuple[Any, Any]
+
+
+def compile_markers(option: ReadContentOption | None) -> ContentMarkers:
+    if option is None:
+        return (None, None)
+    return (_compile_marker(option.start), _compile_marker(option.end))
+
+
+def _compile_marker(
+    extract_option: ReadContentExtractOption | None,
+) -> "regex.Pattern | None":
+    if extract_option is None:
+        return None
+    import regex
+
+    match extract_option.extract_type:
+        case "exact":
+            return regex.compile(regex.escape(str(extract_option.target)))
+        case "regex":
+            try:
+                return regex.compile(str(extract_option.target))
+            except regex.error as e:
+                raise ValueError(
+                    f"Invalid regex pattern '{extract_option.target}': {e}"
+                ) from e
+    return None
+
 
 def _extract_position(
-    content: str, extract_option: ReadContentExtractOption, is_start: bool
+    content: str,
+    extract_option: ReadContentExtractOption,
+    is_start: bool,
+    pattern: "regex.Pattern | None" = None,
 ) -> tuple[int, int]:
     # 返り値: (位置, マッチ長)
     if extract_option.extract_type == "auto":
@@ -16,21 +66,18 @@ def _extract_position(
         if isinstance(extract_option.target, int):
             idx = extract_option.target
             if idx < 0:
-                return (0 if is_start else len(content), 0)
-            if idx > len(content):
-                return (len(content), 0)
-            return (idx, 0)
+                # 負の値は末尾からの位置
+                return (max(0, len(content) + idx), 0)
+            return (min(idx, len(content)), 0)
         else:
             return (0 if is_start else len(content), 0)
     elif extract_option.extract_type == "line":
         if isinstance(extract_option.target, int):
-            lines = content.splitlines(keepends=True)
-            if extract_option.target <= 0:
+            if extract_option.target == 0:
                 return (0 if is_start else len(content), 0)
-            if extract_option.target > len(lines):
-                return (len(content), 0)
-            pos = sum(len(line) for line in lines[: extract_option.target - 1])
-            return (pos, 0)
+            if extract_option.target < 0:
+                return (_tail_line_start(content, -extract_option.target), 0)
+            return (_line_start(content, extract_option.target), 0)
         else:
             return (0 if is_start else len(content), 0)
     elif extract_option.extract_type == "exact":
@@ -43,7 +90,9 @@ def _extract_position(
         else:
             return (idx + match_len, match_len)
     elif extract_option.extract_type == "regex":
-        m = re.search(str(extract_option.target), content)
+        if pattern is None:
+            pattern = _compile_marker(extract_option)
+        m = pattern.search(content)
         if not m:
             return (0 if is_start else len(content), 0)
         if is_start:
@@ -53,16 +102,70 @@ def _extract_position(
     return (0 if is_start else len(content), 0)
 
 
-def read_content(file_path: Path, option: ReadContentOption | None) -> str:
-    try:
-        with file_path.open("r", encoding=option.encoding if option else "utf-8") as f:
-            content = f.read()
-    except Exception as e:
-        logger.error(f"Failed to read file {file_path}: {e}")
-        return ""
+def _line_start(content: str, line: int) -> int:
+    # line 行目の先頭位置 (行数が足りない場合は末尾)
+    if line <= 1:
+        return 0
+    for count, m in enumerate(_LINE_BREAK.finditer(content), 2):
+        if count == line:
+            return m.end()
+    return len(content)
+
+
+def _tail_line_start(content: str, line: int) -> int:
+    # 末尾から line 行目の先頭位置 (行数が足りない場合は先頭)
+    skip = 1 if content and _LINE_BREAK.fullmatch(content[-1]) else 0
+    for count, m in enumerate(_line_break_reverse().finditer(content), 1):
+        if count == line + skip:
+            return m.end()
+    return 0
+
+
+@functools.cache
+def _line_break_reverse() -> "regex.Pattern":
+    import regex
+
+    return regex.compile(_LINE_BREAK_PATTERN, regex.REVERSE)
+
 
+def iter_lines(
+    content: str,
+    keepends: bool = False,
+    chunk_size: int = _INITIAL_CHUNK_SIZE,
+    newlines_only: bool = False,
+) -> Iterator[str]:
+    # str.splitlines と同じ分割を、全体の一覧を作らずに一行ずつ返す
+    # newlines_only の場合は csv モジュールと同じく "\r\n"・"\r"・"\n" のみを改行とする
+    # "\n" の直後で区切った範囲ごとに分割する ("\r\n" が分断されることはない)
+    pos = 0
+    while pos < len(content):
+        end = content.find("\n", pos + chunk_size)
+        end = len(content) if end < 0 else end + 1
+        if newlines_only:
+            yield from _split_newlines(content[pos:end], keepends)
+        else:
+            yield from content[pos:end].splitlines(keepends)
+        pos = end
+
+
+def _split_newlines(text: str, keepends: bool) -> Iterator[str]:
+    pos = 0
+    for m in _NEWLINE.finditer(text):
+        yield text[pos : m.end() if keepends else m.start()]
+        pos = m.end()
+    if pos < len(text):
+        yield text[pos:]
+
+
+def extract_content(
+    content: str,
+    option: ReadContentOption | None,
+    markers: ContentMarkers | None = None,
+) -> str:
     if option is None or (option.start is None and option.end is None):
         return content
+    if markers is None:
+        markers = compile_markers(option)
 
     start_pos = 0
     end_pos = len(content)
@@ -71,11 +174,11 @@ def read_content(file_path: Path, option: ReadContentOption | None) -> str:
 
     if option.start is not None:
         start_pos, start_match_len = _extract_position(
-            content, option.start, is_start=True
+            content, option.start, is_start=True, pattern=markers[0]
         )
     if option.end is not None:
         end_pos_rel, end_match_len = _extract_position(
-            content[start_pos:], option.end, is_start=False
+            content[start_pos:], option.end, is_start=False, pattern=markers[1]
         )
         end_pos = start_pos + end_pos_rel
 
@@ -95,3 +198,253 @@ def read_content(file_path: Path, option: ReadContentOption | None) -> str:
         )
         return ""
     return content[start_pos:end_pos]
+
+
+def read_content(
+    file_path: Path,
+    option: ReadContentOption | None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    markers: ContentMarkers | None = None,
+) -> str:
+    # start/end が指定されている場合はファイル全体を読み込まず、チャンク単位で位置を探す
+    encoding = option.encoding if option else "utf-8"
+    if markers is None:
+        markers = compile_markers(option)
+    try:
+        if (
+            option is not None
+            and option.start is not None
+            and _is_from_end(option.start)
+            and _is_ascii_compatible(encoding)
+        ):
+            # 末尾からの位置は、ファイルの末尾から必要な分だけ読み込んで求める
+            with file_path.open("rb") as f:
+                content = _read_tail(f, encoding, option.start, chunk_size)
+            return extract_content(content, option, markers)
+        with file_path.open("r", encoding=encoding) as f:
+            if option is None or (option.start is None and option.end is None):
+                return f.read()
+            if _is_from_end(option.start):
+                return extract_content(f.read(), option, markers)
+            return _extract_stream(_TextStream(f, chunk_size), option, markers)
+    except (OSError, ValueError, LookupError) as e:
+        logger.error(f"Failed to read file {file_path}: {e}")
+        return ""
+
+
+def _is_from_end(extract_option: ReadContentExtractOption | None) -> bool:
+    return (
+        extract_option is not None
+        and extract_option.extract_type in ("index", "line")
+        and isinstance(extract_option.target, int)
+        and extract_option.target < 0
+    )
+
+
+def _is_ascii_compatible(encoding: str) -> bool:
+    # マルチバイト文字の途中に改行のバイトが現れないエンコーディングのみ末尾から読める
+    return "\n".encode(encoding) == b"\n"
+
+
+def _read_tail(
+    f: BinaryIO,
+    encoding: str,
+    extract_option: ReadContentExtractOption,
+    chunk_size: int,
+) -> str:
+    # 末尾から読み込む範囲を倍々に広げ、必要な文字数・行数を含むテキストを返す
+    size = f.seek(0, os.SEEK_END)
+    needed = -int(extract_option.target)
+    block = max(1, min(chunk_size, _INITIAL_CHUNK_SIZE))
+    while True:
+        start = max(0, size - block)
+        f.seek(start)
+        data = f.read(size - start)
+        if start > 0:
+            # 途中から読み込んだ最初の行は不完全なため捨てる
+            cut = data.find(b"\n")
+            data = data[cut + 1 :] if cut >= 0 else b""
+        # テキストモードでの読み込みと同じ改行にそろえる
+        text = data.decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+        if start == 0:
+            return text
+        if extract_option.extract_type == "index" and len(text) >= needed:
+            return text
+        if extract_option.extract_type == "line" and len(text.splitlines()) >= needed:
+            return text
+        block *= 2
+
+
+class _TextStream:
+    def __init__(self, f: TextIO, chunk_size: int):
+        # 検索に必要な範囲だけをバッファに保持し、keep_from 以降のテキストは破棄せず残す
+        self._f = f
+        self.chunk_size = max(1, chunk_size)
+        self._next_size = min(self.chunk_size, _INITIAL_CHUNK_SIZE)
+        self.buffer = ""
+        self.offset = 0
+        self.eof = False
+        self._kept: list[str] = []
+        self._keep_from: int | None = None
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.buffer)
+
+    def read_chunk(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self._f.read(self._next_size)
+        self._next_size = min(self._next_size * 2, self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def discard(self, pos: int):
+        cut = min(pos, self.end) - self.offset
+        if cut <= 0:
+            return
+        if self._keep_from is not None:
+            self._kept.append(self.buffer[:cut])
+        self.buffer = self.buffer[cut:]
+        self.offset += cut
+
+    def keep_from(self, pos: int):
+        self.discard(pos)
+        self._keep_from = pos
+
+    def rewind(self):
+        self._f.seek(0)
+        self.buffer = ""
+        self.offset = 0
+        self.eof = False
+        self._next_size = min(self.chunk_size, _INITIAL_CHUNK_SIZE)
+
+    def text(self, start: int, end: int) -> str:
+        origin = self._keep_from or 0
+        return ("".join(self._kept) + self.buffer)[start - origin : end - origin]
+
+
+def _extract_stream(
+    stream: _TextStream, option: ReadContentOption, markers: ContentMarkers
+) -> str:
+    start_pos = 0
+    start_match_len = 0
+    if option.start is not None:
+        found = _locate(stream, option.start, markers[0], 0, is_start=True)
+        if found is not None:
+            start_pos, start_match_len = found
+        elif stream.offset > 0:
+            # 見つからない場合はファイルの先頭から
+            stream.rewind()
+    stream.keep_from(start_pos)
+
+    end_match_len = 0
+    found = None
+    if option.end is not None:
+        found = _locate(stream, option.end, markers[1], start_pos, is_start=False)
+    if found is not None:
+        end_pos, end_match_len = found
+    else:
+        end_pos = _advance(stream, None)
+
+    if option.start is not None and not option.start.include_match:
+        start_pos += start_match_len
+    if option.end is not None and not option.end.include_match:
+        end_pos -= end_match_len
+
+    if start_pos > end_pos:
+        logger.warning(
+            f"start_pos({start_pos}) > end_pos({end_pos}), returning empty string."
+        )
+        return ""
+    return stream.text(start_pos, end_pos)
+
+
+def _locate(
+    stream: _TextStream,
+    extract_option: ReadContentExtractOption,
+    pattern: "regex.Pattern | None",
+    origin: int,
+    is_start: bool,
+) -> tuple[int, int] | None:
+    # 返り値: (位置, マッチ長)、見つからない場合は None
+    target = extract_option.target
+    match extract_option.extract_type:
+        case "index" if isinstance(target, int) and target >= 0:
+            return (_advance(stream, origin + target), 0)
+        case "line" if isinstance(target, int) and target > 0:
+            return (_find_line(stream, origin, target), 0)
+        case "index" | "line" if _is_from_end(extract_option):
+            # 末尾からの位置は、残りを読み込んでから求める
+            end = _advance(stream, None)
+            pos, _ = _extract_position(
+                stream.text(origin, end), extract_option, is_start
+            )
+            return (origin + pos, 0)
+        case "exact" | "regex":
+            if pattern is None:
+                pattern = _compile_marker(extract_option)
+            found = _search_stream(stream, pattern, origin)
+            if found is None:
+                return None
+            pos, match_len = found
+            return (pos if is_start else pos + match_len, match_len)
+    return None
+
+
+def _advance(stream: _TextStream, target: int | None) -> int:
+    # target (None の場合は末尾) まで読み進める
+    while (target is None or stream.end < target) and stream.read_chunk():
+        if target is not None:
+            stream.discard(target)
+    return stream.end if target is None else min(target, stream.end)
+
+
+def _find_line(stream: _TextStream, origin: int, line: int) -> int:
+    # splitlines と同じ改行文字を数えて line 行目の先頭位置を返す
+    remaining = line - 1
+    pos = origin
+    while remaining > 0:
+        for m in _LINE_BREAK.finditer(stream.buffer, pos - stream.offset):
+            remaining -= 1
+            if remaining == 0:
+                return stream.offset + m.end()
+        pos = stream.end
+        stream.discard(pos)
+        if not stream.read_chunk():
+            return stream.end
+    return origin
+
+
+def _search_stream(
+    stream: _TextStream, pattern: "regex.Pattern", origin: int
+) -> tuple[int, int] | None:
+    # チャンクの境界をまたぐマッチは部分一致 (partial) で検出し、続きを読んでから再検索する
+    pos = origin
+    while True:
+        window_start = max(origin, pos - _SEARCH_CONTEXT, stream.offset)
+        window = stream.buffer[window_start - stream.offset :]
+        m = pattern.search(window, pos - window_start, partial=not stream.eof)
+        if m is None:
+            if stream.eof:
+                return None
+            pos = stream.end
+        elif stream.eof or (not m.partial and not _may_change(window, m.end())):
+            return (window_start + m.start(), m.end() - m.start())
+        else:
+            # 続きを読むとマッチが長くなる・変わる可能性がある
+            pos = window_start + m.start()
+        stream.discard(pos - _SEARCH_CONTEXT)
+        stream.read_chunk()
+
+
+def _may_change(window: str, end: int) -> bool:
+    # 貪欲な量指定子 (.* など) はマッチの後ろの同じ行の続きまで伸びる可能性があり、
+    # $ (MULTILINE なし) や \Z は末尾の改行の直前・末尾にのみ一致するため、
+    # マッチの後の改行と、さらにその後の文字まで読み込んでいる場合のみ確定とする
+    # (改行をまたいで伸びるパターンは、ファイル全体を読み込んだ場合と異なる可能性がある)
+    m = _LINE_BREAK.search(window, end)
+    return m is None or m.end() >= len(window)
@@ -0,0 +1,271 @@
+import re
+import sys
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from typing import Any
+
+from jinja2 import Environment, Template, TemplateError, meta, nodes
+from loguru import logger
+from pydantic import BaseModel, ConfigDict
+
+from config import ParseOption, RecipeOption
+from processor.parse_cache import PARSE_CACHE_VERSION
+from processor.parser.registry import load_parser
+from processor.read_content import ContentMarkers, compile_markers
+from processor.recipe_variables import VariablePlan, compile_variables
+from processor.templater import setup_template_environment
+from utilities.resolve_path import resolve_path
+
+_PLACEHOLDER = re.compile(r"\$\{(.*?)\}")
+
+# 出力パスの分割結果: (文字列, プレースホルダーのキー)
+PathToken = tuple[str, str | None]
+
+
+class RecipePlan(BaseModel):
+    # レシピごとに一度だけ構築し、ファイルごとの処理ではこれだけを参照する
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+
+    recipe: RecipeOption
+    template_env: Environment
+    template: Template
+    markers: ContentMarkers
+    parser: Callable[[str], Any] | None
+    parse_key: str | None
+    result_name: str
+    variables: tuple[VariablePlan, ...]
+    lazy_variables: bool
+    output_path: tuple[PathToken, ...]
+
+    def get_template(self) -> Template:
+        # テンプレートが更新されている場合は環境から読み込み直す
+        if self.template.is_up_to_date:
+            return self.template
+        return self.template_env.get_template(self.recipe.template.file)
+
+    def get_parse_key(self) -> str | None:
+        # パース結果のキャッシュのキー (キャッシュしない場合は None)
+        # TextFSM はテンプレートの内容もキーに含め、更新された場合は再パースする
+        parse_option = self.recipe.parse
+        if self.parse_key is None or parse_option is None:
+            return None
+        textfsm_options = parse_option.textfsm_options
+        if parse_option.parse_type != "textfsm" or textfsm_options is None:
+            return self.parse_key
+        # パーサーと同じく、TextFSM を使う場合にのみ読み込む
+        from processor.parser.textfsm_parser import (
+            TEMPLATE_ERRORS,
+            load_textfsm_template,
+        )
+
+        try:
+            cached = load_textfsm_template(
+                resolve_path(textfsm_options.template), textfsm_options.encoding
+            )
+        except TEMPLATE_ERRORS:
+            # エラーはパース時に出力する
+            return None
+        return f"{self.parse_key}\0{cached.digest}"
+
+    @property
+    def per_record(self) -> bool:
+        # パース結果のレコードごとにレンダリングし、それぞれ出力するか
+        return self.recipe.parse is not None and self.recipe.parse.per_record
+
+    @property
+    def output_keys(self) -> list[str]:
+        return [key for _, key in self.output_path if key is not None]
+
+    def resolve_output_path(self, variables: Mapping[str, Any]) -> Path:
+        return resolve_path(fill_placeholders(self.output_path, variables))
+
+
+def build_recipe_plan(recipe: RecipeOption) -> RecipePlan | None:
+    template_env = setup_template_environment(recipe.template)
+    if not template_env:
+        return None
+    try:
+        template = template_env.get_template(recipe.template.file)
+    except TemplateError as e:
+        logger.error(f"Failed to load template {recipe.template.file}: {e}")
+        return None
+    try:
+        markers = compile_markers(recipe.read_content)
+        variables = compile_variables(recipe)
+    except ValueError as e:
+        logger.error(f"Failed to compile patterns in recipe {recipe.id}: {e}")
+        return None
+    output_path = tokenize_placeholders(recipe.output.path)
+    lazy_variables = _check_variable_usage(recipe, template_env, output_path)
+    # 構成要素は検証済みのため、モデルの検証は省略する
+    return RecipePlan.model_construct(
+        recipe=recipe,
+        template_env=template_env,
+        template=template,
+        markers=markers,
+        parser=bind_parser(recipe.parse),
+        parse_key=build_parse_key(recipe.parse),
+        result_name=(recipe.parse.parse_result_name if recipe.parse else None)
+        or "parse_result",
+        variables=variables,
+        lazy_variables=lazy_variables,
+        output_path=output_path,
+    )
+
+
+def bind_parser(parse_option: ParseOption | None) -> Callable[[str], Any] | None:
+    if parse_option is None:
+        return None
+    if parse_option.parse_type == "plain":
+        return _parse_plain
+    loaded = load_parser(parse_option)
+    if loaded is None:
+        logger.error(f"Unsupported parse type: {parse_option.parse_type}")
+        return _parse_unsupported
+    parser, options = loaded
+    return lambda content: parser(content, options)
+
+
+# キャッシュするパース形式と、パース結果に影響するパッケージ
+# json/dsv は読み込みと同程度の速さでパースできるため、キャッシュしない
+_CACHED_PARSE_TYPES = {"xml": None, "yaml": "ruamel.yaml", "textfsm": "textfsm"}
+
+
+def build_parse_key(parse_option: ParseOption | None) -> str | None:
+    if parse_option is None or parse_option.parse_type not in _CACHED_PARSE_TYPES:
+        return None
+    # stream が有効な場合は遅延評価のため、キャッシュしない
+    xml_options = parse_option.xml_options
+    if xml_options is not None and xml_options.paths and xml_options.stream:
+        return None
+    textfsm_options = parse_option.textfsm_options
+    if (
+        textfsm_options is not None
+        and textfsm_options.stream
+        and textfsm_options.parse_type != "columnar"
+    ):
+        return None
+    package = _CACHED_PARSE_TYPES[parse_option.parse_type]
+    return "\0".join(
+        (
+            PARSE_CACHE_VERSION,
+            sys.version,
+            _get_package_version(package) if package else "",
+            parse_option.model_dump_json(),
+        )
+    )
+
+
+def _get_package_version(package: str) -> str:
+    # importlib.metadata は読み込みに時間がかかるため、キャッシュを使う場合にのみ読み込む
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return ""
+
+
+def _parse_plain(content: str) -> str:
+    return content
+
+
+def _parse_unsupported(_: str) -> dict:
+    return {}
+
+
+def tokenize_placeholders(template: str) -> tuple[PathToken, ...]:
+    tokens: list[PathToken] = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(template):
+        tokens.append((template[pos : m.start()], None))
+        tokens.append((m.group(0), m.group(1)))
+        pos = m.end()
+    tokens.append((template[pos:], None))
+    return tuple(token for token in tokens if token[0])
+
+
+def fill_placeholders(
+    tokens: tuple[PathToken, ...], variables: Mapping[str, Any]
+) -> str:
+    # 未定義のプレースホルダーはそのまま残す
+    return "".join(
+        str(variables[key]) if key is not None and key in variables else text
+        for text, key in tokens
+    )
+
+
+def _check_variable_usage(
+    recipe: RecipeOption, template_env: Environment, output_path: tuple[PathToken, ...]
+) -> bool:
+    # 返り値: 定義された変数を参照時に計算してよいか
+    # テンプレートが variables 全体を参照する場合 (tojson など) は、計算済みの dict を渡す
+    if not recipe.variables or not recipe.variables.defined:
+        return False
+    used = find_template_variables(template_env, recipe.template.file)
+    if used is None:
+        return False
+    used.update(key for _, key in output_path if key is not None)
+    for key in recipe.variables.defined:
+        if key not in used:
+            logger.warning(
+                f"Variable '{key}' is defined in recipe '{recipe.id}' but never used "
+                "in the template or output path."
+            )
+    return True
+
+
+# variables を辞書として扱うメソッド (参照されるキーを特定できない)
+_MAPPING_METHODS = {"get", "items", "keys", "values"}
+
+
+def find_template_variables(env: Environment, template_name: str) -> set[str] | None:
+    # テンプレート (include/import 先を含む) で参照される variables のキーを返す
+    # 属性・定数の添字以外で参照している場合は特定できないため None を返す
+    if env.loader is None or not env.loader.has_source_access:
+        return None
+    used: set[str] = set()
+    pending = [template_name]
+    seen: set[str] = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            source, _, _ = env.loader.get_source(env, name)  # type: ignore[union-attr]
+            ast = env.parse(source)
+        except TemplateError:
+            return None
+        if "variables" in meta.find_undeclared_variables(ast):
+            names = [
+                node
+                for node in ast.find_all(nodes.Name)
+                if node.name == "variables" and node.ctx == "load"
+            ]
+            static = 0
+            for node in ast.find_all((nodes.Getattr, nodes.Getitem)):
+                if not (
+                    isinstance(node.node, nodes.Name)
+                    and node.node.name == "variables"
+                    and node.node.ctx == "load"
+                ):
+                    continue
+                if isinstance(node, nodes.Getattr):
+                    if node.attr in _MAPPING_METHODS:
+                        return None
+                    used.add(node.attr)
+                elif isinstance(node.arg, nodes.Const) and isinstance(
+                    node.arg.value, str
+                ):
+                    used.add(node.arg.value)
+                else:
+                    return None
+                static += 1
+            if static != len(names):
+                return None
+        for reference in meta.find_referenced_templates(ast):
+            if reference is None:
+                return None
+            pending.append(reference)
+    return used
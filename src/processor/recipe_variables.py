@@ -1,22 +1,131 @@
+import functools
+from collections.abc import Callable, Iterator, Mapping
 from pathlib import Path
 from typing import Any
 
-import regex
 from loguru import logger
+from pydantic import BaseModel, ConfigDict
 
-from config import RecipeOption
+from config import RecipeOption, VariableOption
+
+
+class VariablePlan(BaseModel):
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+
+    key: str
+    option: VariableOption
+    # regex.Pattern (regex モジュールは変数を定義した場合にのみ読み込む)
+    pattern: Any
+    group: int | str
+
+
+class LazyVariables(Mapping[str, Any]):
+    def __init__(self, values: dict[str, Any], resolvers: dict[str, Callable[[], Any]]):
+        # resolvers の変数は最初に参照されたときに計算してキャッシュする
+        self._values = {k: v for k, v in values.items() if k not in resolvers}
+        self._resolvers = dict(resolvers)
+        self._keys = list(dict.fromkeys([*values, *resolvers]))
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._values:
+            self._values[key] = self._resolvers[key]()
+        return self._values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        # 未計算の変数は表示のために計算しない
+        pending = [key for key in self._resolvers if key not in self._values]
+        return f"LazyVariables({self._values!r}, pending={pending!r})"
+
+
+# per_record で出力パスに使えるレコードの値 ("record.キー" のように参照する)
+RECORD_PREFIX = "record."
+RECORD_INDEX = "recordIndex"
+
+
+class RecordVariables(dict):
+    def __init__(self, variables: Mapping[str, Any], record: Any, index: int):
+        # ファイルの変数に、レコード番号を加える (レコードの値は参照時に取り出す)
+        # 計算済みの dict はコピーし、テンプレートで dict として扱えるようにする (tojson など)
+        # LazyVariables の場合はコピーせず、参照されたキーのみ計算する
+        super().__init__(variables if isinstance(variables, dict) else {})
+        self[RECORD_INDEX] = index
+        self._variables = variables
+        self.record = record
+        self.index = index
+
+    def __missing__(self, key: str) -> Any:
+        if key.startswith(RECORD_PREFIX):
+            value = self.record
+            for name in key[len(RECORD_PREFIX) :].split("."):
+                if isinstance(value, Mapping):
+                    value = value[name]
+                elif (
+                    isinstance(value, list)
+                    and name.isdigit()
+                    and int(name) < len(value)
+                ):
+                    value = value[int(name)]
+                else:
+                    raise KeyError(key)
+            return value
+        return self._variables[key]
+
+    def __contains__(self, key: object) -> bool:
+        if super().__contains__(key):
+            return True
+        try:
+            self[key]  # type: ignore[index]
+        except (KeyError, TypeError, AttributeError):
+            return False
+        return True
+
+
+def compile_variables(recipe: RecipeOption) -> tuple[VariablePlan, ...]:
+    # 正規表現のコンパイルと取得するグループの解決はファイルごとではなく一度だけ行う
+    if not recipe.variables or not recipe.variables.defined:
+        return ()
+    import regex
+
+    plans = []
+    for key, param in recipe.variables.defined.items():
+        try:
+            pattern = regex.compile(param.pattern)
+        except regex.error as e:
+            raise ValueError(f"Invalid regex pattern '{param.pattern}': {e}") from e
+        if isinstance(param.match_index, int):
+            group = param.match_index if 0 < param.match_index <= pattern.groups else 0
+        else:
+            group = param.match_index if param.match_index in pattern.groupindex else 0
+        plans.append(
+            VariablePlan.model_construct(
+                key=key, option=param, pattern=pattern, group=group
+            )
+        )
+    return tuple(plans)
 
 
 def resolve_recipe_variables(
-    file: Path, content: str, recipe: RecipeOption
-) -> dict[str, Any]:
+    file: Path,
+    content: str,
+    recipe: RecipeOption,
+    variable_plans: tuple[VariablePlan, ...] | None = None,
+    lazy: bool = False,
+) -> Mapping[str, Any]:
+    # lazy が有効な場合は、定義された変数を参照時に計算する LazyVariables を返す
+    # (テンプレートが variables の個々のキーのみを参照する場合に限る; RecipePlan.lazy_variables)
     def _get_path(path: Path, path_separator: str) -> str:
         if path_separator == "posix":
             return str(path.as_posix())
         else:
             return str(path)
 
-    variables = {
+    variables: dict[str, Any] = {
         "fileName": file.name,
         "fileExt": file.suffix,
         "filePath": str(file),
@@ -38,9 +147,11 @@ def resolve_recipe_variables(
                 case _:
                     continue
 
-    if not recipe.variables or not recipe.variables.defined:
-        return variables
-    for key, param in recipe.variables.defined.items():
+    if variable_plans is None:
+        variable_plans = compile_variables(recipe)
+    resolvers: dict[str, Callable[[], Any]] = {}
+    for plan in variable_plans:
+        param = plan.option
         match param.target:
             case "filename":
                 target = file.name
@@ -51,22 +162,15 @@ def resolve_recipe_variables(
             case _:
                 logger.warning(f"Unknown variable target: {param.target}")
                 continue
-        pattern = regex.compile(param.pattern)
-        match = pattern.search(target)
-        if match:
-            if isinstance(param.match_index, int):
-                index = (
-                    param.match_index
-                    if param.match_index > 0
-                    and param.match_index <= len(match.groups())
-                    else 0
-                )
-            else:
-                index = (
-                    param.match_index if param.match_index in match.groupdict() else 0
-                )
-            variables[key] = match.group(index)
-        else:
-            variables[key] = ""
+        resolvers[plan.key] = functools.partial(_match_variable, plan, target)
 
+    if lazy and resolvers:
+        return LazyVariables(variables, resolvers)
+    for key, resolve in resolvers.items():
+        variables[key] = resolve()
     return variables
+
+
+def _match_variable(plan: VariablePlan, target: str) -> str:
+    match = plan.pattern.search(target)
+    return match.group(plan.group) if match else ""
@@ -1,25 +1,35 @@
+import multiprocessing
+import os
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Iterator
+from typing import Any
 
+from jinja2 import Template
 from loguru import logger
 from pydantic import BaseModel
 
-from config import Config, InputOption, OutputOption, RecipeOption
-from processor.parser.dsv_parser import parse_dsv
-from processor.parser.json_parser import parse_json
-from processor.parser.textfsm_parser import parse_textfsm
-from processor.parser.xml_parser import parse_xml
-from processor.parser.yaml_parser import parse_yaml
+from config import Config, InputOption, OutputOption, RecipeOption, RunOption
+from processor.manifest import IncrementalState
+from processor.output_sink import OutputSink, write_file
+from processor.parse_cache import ParseCache, cached_parse, open_parse_cache
+from processor.pipeline import run_pipeline
 from processor.read_content import read_content
-from processor.recipe_variables import resolve_recipe_variables
-from processor.templater import setup_template_environment
-from utilities.resolve_path import resolve_path
+from processor.recipe_plan import RecipePlan, build_recipe_plan
+from processor.recipe_variables import RecordVariables, resolve_recipe_variables
+from processor.templater import (
+    get_compiled_template_dir,
+    get_template_cache_dir,
+    set_compiled_template_dir,
+    set_template_cache_dir,
+)
 
 
 class RecipeParams(BaseModel):
     content: str = ""
     parse_result: Any = None
-    variables: dict[str, Any] = {}
+    variables: Mapping[str, Any] = {}
     result_name: str = "parse_result"
 
     def to_dict(self):
@@ -29,72 +39,446 @@ class RecipeParams(BaseModel):
         return d
 
 
+# per_record が有効なレシピのレコードごとの結果: (出力パスの変数, レンダリング結果)
+RecordOutputs = Iterable[tuple[Mapping[str, Any], str | Iterator[str]]]
+
+# レシピごとの処理結果: (レンダリング結果, パラメータ, エラー)
+# stream が有効なレシピのレンダリング結果は、書き込み時に生成される文字列のイテレーター
+# per_record が有効なレシピのレンダリング結果は RecordOutputs
+RecipeResult = tuple[
+    str | Iterator[str] | RecordOutputs | None, RecipeParams | None, str | None
+]
+
+
 def run_recipe(
     input_path: Path,
     recipe: RecipeOption,
     config: Config,
+    run_option: RunOption | None = None,
 ):
-    logger.info(f"Processing {recipe.id}({recipe.name}):  {input_path}")
+    run_recipe_group(input_path, [recipe], config, run_option)
 
-    template_env = setup_template_environment(recipe.template)
-    if not template_env:
-        logger.error(f"Failed to set up template environment for recipe: {recipe.id}")
+
+def run_recipe_group(
+    input_path: Path,
+    recipes: list[RecipeOption],
+    config: Config,
+    run_option: RunOption | None = None,
+):
+    # recipes は input/read_content/parse の設定が同一であること (processor.planner を参照)
+    for recipe in recipes:
+        logger.info(f"Processing {recipe.id}({recipe.name}):  {input_path}")
+    plans = prepare_recipe_group(recipes)
+    if not plans:
         return
+    run_files(iter_files(input_path, plans[0].recipe.input), plans, run_option)
+    for plan in plans:
+        logger.info(f"Recipe {plan.recipe.id} completed successfully.")
 
-    for file in iter_files(input_path, recipe.input):
-        if not file:
-            logger.error(f"No valid files found in input path: {input_path}")
+
+def prepare_recipe_group(recipes: list[RecipeOption]) -> list[RecipePlan]:
+    plans: list[RecipePlan] = []
+    for recipe in recipes:
+        plan = build_recipe_plan(recipe)
+        if not plan:
+            logger.error(f"Failed to build execution plan for recipe: {recipe.id}")
             continue
-        logger.info(f"Processing file: {file}")
+        plans.append(plan)
+    return plans
+
+
+def run_files(
+    files: Iterable[Path],
+    plans: list[RecipePlan],
+    run_option: RunOption | None = None,
+):
+    if run_option is None:
+        run_option = RunOption()
+    incremental = IncrementalState(
+        [plan.recipe for plan in plans],
+        [plan.template_env for plan in plans],
+        run_option,
+    )
+    jobs = run_option.jobs
+    if jobs is None:
+        jobs = next(
+            (p.recipe.parallel for p in plans if p.recipe.parallel is not None), None
+        )
+    workers = resolve_jobs(jobs)
+    parse_cache = (
+        open_parse_cache(run_option.cache_dir, run_option.parse_cache_size)
+        if any(plan.parse_key is not None for plan in plans)
+        else None
+    )
+    # 出力はレシピグループ単位でバッファリングし、終了時にまとめて書き込む
+    with OutputSink() as sink:
+        if run_option.engine == "async":
+            run_files_async(
+                files,
+                plans,
+                incremental,
+                sink,
+                workers,
+                run_option.queue_size,
+                parse_cache,
+            )
+        elif workers > 1:
+            run_files_parallel(files, plans, incremental, sink, workers, parse_cache)
+        else:
+            for file in files:
+                if not file:
+                    logger.error("No valid files found to process.")
+                    continue
+                indices = incremental.pending(file)
+                if not indices:
+                    continue
+                logger.info(f"Processing file: {file}")
+                results = process_file(file, plans, indices, parse_cache=parse_cache)
+                write_results(file, plans, indices, results, incremental, sink)
+    incremental.save()
+    if parse_cache is not None:
+        logger.info(parse_cache.summary())
+
+
+def process_file(
+    file: Path,
+    plans: list[RecipePlan],
+    indices: list[int] | None = None,
+    allow_stream: bool = True,
+    parse_cache: ParseCache | None = None,
+) -> list[RecipeResult]:
+    if indices is None:
+        indices = list(range(len(plans)))
+    content = _read_plan_content(file, plans[indices[0]])
+    return process_content(file, content, plans, indices, allow_stream, parse_cache)
+
+
+def _read_plan_content(file: Path, plan: RecipePlan) -> str:
+    return read_content(file, plan.recipe.read_content, markers=plan.markers)
+
+
+def process_content(
+    file: Path,
+    content: str,
+    plans: list[RecipePlan],
+    indices: list[int],
+    allow_stream: bool = True,
+    parse_cache: ParseCache | None = None,
+) -> list[RecipeResult]:
+    # パースは一度だけ行い、結果を各レシピのテンプレートに渡す
+    # allow_stream が False の場合 (プロセス間で受け渡す場合など) は文字列にレンダリングする
+    # パースのエラーも、レンダリングのエラーと同じくレシピごとの結果として返す
+    base: RecipeParams | None = None
+    results: list[RecipeResult] = []
+    for index in indices:
+        plan = plans[index]
         try:
-            params = create_recipe_params(file, recipe)
-            params.variables = resolve_recipe_variables(file, params.content, recipe)
-            rendered = render_template(template_env, recipe.template.file, params)
-            write_output(rendered, recipe.output, params)
+            if base is None:
+                base = create_recipe_params(
+                    file, plans[indices[0]], content, parse_cache
+                )
+            params = base.model_copy()
+            params.variables = resolve_recipe_variables(
+                file,
+                params.content,
+                plan.recipe,
+                plan.variables,
+                lazy=plan.lazy_variables,
+            )
+            stream = allow_stream and plan.recipe.output.stream
+            if plan.per_record:
+                records = render_records(plan, params, stream)
+                if not allow_stream:
+                    records = list(records)
+                results.append((records, params, None))
+                continue
+            rendered = render_template(plan.get_template(), params, stream)
+            results.append((rendered, params, None))
         except Exception as e:
-            logger.error(f"Error processing file {file}: {e}")
+            results.append((None, None, str(e)))
+    return results
+
+
+def write_results(
+    file: Path,
+    plans: list[RecipePlan],
+    indices: list[int],
+    results: list[RecipeResult],
+    incremental: IncrementalState,
+    sink: OutputSink | None = None,
+):
+    for index, (rendered, params, error) in zip(indices, results):
+        plan = plans[index]
+        recipe = plan.recipe
+        if error is not None or rendered is None or params is None:
+            logger.error(f"Error processing file {file} ({recipe.id}): {error}")
+            continue
+        try:
+            if plan.per_record:
+                output_path = None
+                for variables, record_rendered in rendered:
+                    output_path = plan.resolve_output_path(variables)
+                    write_output(record_rendered, output_path, recipe.output, sink)
+                if output_path is None:
+                    logger.warning(f"No records found in {file} ({recipe.id})")
+                    continue
+            else:
+                output_path = plan.resolve_output_path(params.variables)
+                write_output(rendered, output_path, recipe.output, sink)
+        except Exception as e:  # noqa: BLE001
+            # stream の場合はテンプレートのエラーも書き込み中に発生する
+            logger.error(f"Error processing file {file} ({recipe.id}): {e}")
+            continue
+        incremental.record(index, file, output_path)
+
+
+def resolve_jobs(jobs: int | None) -> int:
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+# ワーカープロセスごとに初期化時に一度だけ構築する状態
+_worker_state: dict[str, Any] = {}
+
+
+def _init_worker(
+    recipes: list[RecipeOption],
+    template_cache_dir: Path | None,
+    compiled_template_dir: Path | None,
+    parse_cache: ParseCache | None = None,
+):
+    # コンパイル済みのパターンやテンプレートはワーカーごとに構築し直す
+    set_template_cache_dir(template_cache_dir)
+    set_compiled_template_dir(compiled_template_dir)
+    _worker_state["plans"] = [build_recipe_plan(recipe) for recipe in recipes]
+    # fork で起動した場合も親プロセスの集計を引き継がないよう、構築し直す
+    _worker_state["parse_cache"] = (
+        ParseCache(parse_cache.directory, parse_cache.max_size)
+        if parse_cache is not None
+        else None
+    )
+
+
+def _take_parse_cache_stats() -> Counter[str]:
+    # ワーカーでのキャッシュの利用状況は、処理結果とともに親プロセスへ返して集計する
+    parse_cache: ParseCache | None = _worker_state.get("parse_cache")
+    return parse_cache.take_stats() if parse_cache is not None else Counter()
+
+
+def _get_template_settings() -> tuple[Path | None, Path | None]:
+    return get_template_cache_dir(), get_compiled_template_dir()
+
+
+def _get_thread_safe_mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+def _strip_results(
+    results: list[RecipeResult], indices: list[int]
+) -> list[RecipeResult]:
+    # 親プロセスへは出力パスに必要な変数のみを返す
+    stripped: list[RecipeResult] = []
+    for index, (rendered, params, error) in zip(indices, results):
+        if params is None:
+            stripped.append((rendered, None, error))
             continue
-    logger.info(f"Recipe {recipe.id} completed successfully.")
+        keys = _worker_state["plans"][index].output_keys
+        variables = {
+            key: params.variables[key] for key in keys if key in params.variables
+        }
+        stripped.append((rendered, RecipeParams(variables=variables), None))
+    return stripped
+
+
+def _process_file_in_worker(
+    task: tuple[Path, list[int]],
+) -> tuple[Path, list[int], list[RecipeResult], Counter[str]]:
+    # 返り値: (ファイル, レシピのインデックス, レシピごとの処理結果, キャッシュの利用状況)
+    # (エラーはレシピごとの処理結果に含まれる)
+    file, indices = task
+    results = process_file(
+        file,
+        _worker_state["plans"],
+        indices,
+        allow_stream=False,
+        parse_cache=_worker_state["parse_cache"],
+    )
+    return (file, indices, _strip_results(results, indices), _take_parse_cache_stats())
+
 
+def _process_content_in_worker(
+    file: Path, data: tuple[list[int], str]
+) -> tuple[list[int], list[RecipeResult], Counter[str]]:
+    indices, content = data
+    results = process_content(
+        file,
+        content,
+        _worker_state["plans"],
+        indices,
+        allow_stream=False,
+        parse_cache=_worker_state["parse_cache"],
+    )
+    return indices, _strip_results(results, indices), _take_parse_cache_stats()
+
+
+def run_files_parallel(
+    files: Iterable[Path],
+    plans: list[RecipePlan],
+    incremental: IncrementalState,
+    sink: OutputSink,
+    workers: int,
+    parse_cache: ParseCache | None = None,
+):
+    files = list(files)
+    if not files:
+        logger.error("No valid files found to process.")
+        return
+    tasks = [
+        (file, indices) for file in files if (indices := incremental.pending(file))
+    ]
+    if not tasks:
+        return
+    logger.info(f"Processing {len(tasks)} files with {workers} workers")
+    chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+    recipes = [plan.recipe for plan in plans]
+    # サーバーなど、スレッドが動いているプロセスから呼ばれる場合があるため fork を避ける
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_get_thread_safe_mp_context(),
+        initializer=_init_worker,
+        initargs=(recipes, *_get_template_settings(), parse_cache),
+    ) as executor:
+        # 出力は入力の順序どおりに親プロセスで書き込み、直列実行と同じ結果にする
+        for file, indices, results, stats in executor.map(
+            _process_file_in_worker, tasks, chunksize=chunksize
+        ):
+            if parse_cache is not None:
+                parse_cache.add_stats(stats)
+            logger.info(f"Processed file: {file}")
+            write_results(file, plans, indices, results, incremental, sink)
+
+
+def run_files_async(
+    files: Iterable[Path],
+    plans: list[RecipePlan],
+    incremental: IncrementalState,
+    sink: OutputSink,
+    workers: int,
+    queue_size: int,
+    parse_cache: ParseCache | None = None,
+):
+    def read(file: Path) -> tuple[list[int], str] | None:
+        indices = incremental.pending(file)
+        if not indices:
+            return None
+        logger.info(f"Processing file: {file}")
+        return indices, _read_plan_content(file, plans[indices[0]])
 
-def create_recipe_params(file: Path, recipe: RecipeOption) -> RecipeParams:
-    params = RecipeParams()
-    params.content = read_content(file, recipe.read_content)
-    if recipe.parse:
-        params.parse_result, params.result_name = parse_content(
-            params.content, recipe.parse
+    def compute(
+        file: Path, data: tuple[list[int], str]
+    ) -> tuple[list[int], list[RecipeResult], Counter[str]]:
+        # 同じプロセスで処理する場合は parse_cache に直接集計される
+        indices, content = data
+        results = process_content(
+            file, content, plans, indices, parse_cache=parse_cache
+        )
+        return indices, results, Counter()
+
+    def write(file: Path, result: tuple[list[int], list[RecipeResult], Counter[str]]):
+        indices, results, stats = result
+        if parse_cache is not None:
+            parse_cache.add_stats(stats)
+        write_results(file, plans, indices, results, incremental, sink)
+
+    executor: Executor
+    if workers > 1:
+        # パイプライン実行中はスレッドが動いているため fork を避ける
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=_get_thread_safe_mp_context(),
+            initializer=_init_worker,
+            initargs=(
+                [plan.recipe for plan in plans],
+                *_get_template_settings(),
+                parse_cache,
+            ),
+        )
+        compute_func = _process_content_in_worker
+    else:
+        executor = ThreadPoolExecutor(max_workers=1)
+        compute_func = compute
+    logger.info(f"Processing files with async pipeline (queue size: {queue_size})")
+    with executor:
+        try:
+            run_pipeline(
+                files,
+                read,
+                compute_func,
+                write,
+                executor,
+                queue_size,
+            )
+        except ExceptionGroup as e:
+            # ステージ自体の失敗 (ファイルの一覧の取得など) は TaskGroup からまとめて送出される
+            logger.error(f"Async pipeline failed: {'; '.join(map(str, e.exceptions))}")
+
+
+def create_recipe_params(
+    file: Path,
+    plan: RecipePlan,
+    content: str | None = None,
+    parse_cache: ParseCache | None = None,
+) -> RecipeParams:
+    params = RecipeParams(result_name=plan.result_name)
+    if content is None:
+        content = _read_plan_content(file, plan)
+    params.content = content
+    if plan.parser is not None:
+        params.parse_result = cached_parse(
+            parse_cache,
+            plan.get_parse_key() if parse_cache is not None else None,
+            plan.parser,
+            params.content,
         )
     else:
         params.parse_result = params.content
     return params
 
 
-def parse_content(content: str, parse_option) -> tuple[Any, str]:
-    parse_type = parse_option.parse_type
-    result_name = parse_option.parse_result_name or "parse_result"
-    match parse_type:
-        case "plain":
-            result = content
-        case "json":
-            result = parse_json(content, parse_option.json_options)
-        case "yaml":
-            result = parse_yaml(content, parse_option.yaml_options)
-        case "xml":
-            result = parse_xml(content, parse_option.xml_options)
-        case "dsv":
-            result = parse_dsv(content, parse_option.dsv_options)
-        case "textfsm":
-            result = parse_textfsm(content, parse_option.textfsm_options)
-        case _:
-            logger.error(f"Unsupported parse type: {parse_type}")
-            result = {}
-    return result, result_name
-
-
-def render_template(template_env, template_file: str, params: RecipeParams) -> str:
-    logger.debug(f"Rendering template: {template_file} with params: {params}")
-    renderer = template_env.get_template(template_file)
-    return renderer.render(params.to_dict())
+def render_records(
+    plan: RecipePlan, params: RecipeParams, stream: bool = False
+) -> Iterator[tuple[Mapping[str, Any], str | Iterator[str]]]:
+    # レコードを一つずつ parse_result としてレンダリングする
+    # 出力パスの変数は、stream でない場合 (プロセス間で受け渡す場合など) は必要なものだけにする
+    template = plan.get_template()
+    keys = plan.output_keys
+    for index, record in enumerate(params.parse_result):
+        record_params = params.model_copy()
+        record_params.parse_result = record
+        record_params.variables = RecordVariables(params.variables, record, index)
+        rendered = render_template(template, record_params, stream)
+        variables: Mapping[str, Any] = record_params.variables
+        if not stream:
+            variables = {key: variables[key] for key in keys if key in variables}
+        yield variables, rendered
+
+
+def render_template(
+    template: Template, params: RecipeParams, stream: bool = False
+) -> str | Iterator[str]:
+    # レコードごとに呼ばれるため、params (内容全体を含む) の文字列は DEBUG の場合にのみ作る
+    logger.opt(lazy=True).debug(
+        "Rendering template: {} with params: {}", lambda: template.name, lambda: params
+    )
+    if stream:
+        # 出力全体を文字列にせず、書き込みながら少しずつレンダリングする
+        return template.generate(params.to_dict())
+    return template.render(params.to_dict())
 
 
 def iter_files(input_path: Path, option: InputOption) -> Iterator[Path]:
@@ -110,16 +494,31 @@ def iter_files(input_path: Path, option: InputOption) -> Iterator[Path]:
     logger.error(f"Invalid input path: {input_path}")
 
 
-def write_output(rendered: str, option: OutputOption, params: RecipeParams):
-    output_path = resolve_path(replace_placeholders(option.path, params.variables))
-    if not output_path.parent.exists():
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open(option.write_mode, encoding=option.encoding) as f:
-        f.write(rendered)
-    logger.info(f"Output written to [{option.write_mode}] {output_path}")
-
-
-def replace_placeholders(template: str, variables: dict[str, Any]) -> str:
-    for key, value in variables.items():
-        template = template.replace("${" + key + "}", str(value))
-    return template
+def write_output(
+    rendered: str | Iterable[str],
+    output_path: Path,
+    option: OutputOption,
+    sink: OutputSink | None = None,
+):
+    if sink is not None:
+        written = sink.write(
+            output_path,
+            rendered,
+            option.write_mode,
+            option.encoding,
+            option.skip_unchanged,
+        )
+    else:
+        if not output_path.parent.exists():
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+        written = write_file(
+            output_path,
+            rendered,
+            option.write_mode,
+            option.encoding,
+            option.skip_unchanged,
+        )
+    if written:
+        logger.info(f"Output written to [{option.write_mode}] {output_path}")
+    else:
+        logger.info(f"Output unchanged, skipped writing {output_path}")
@@ -1,10 +1,11 @@
+from collections.abc import Iterator
 from pathlib import Path
-from typing import Iterator
 
 from loguru import logger
 
-from config import Config, RecipeOption
-from processor.run_recipe import run_recipe
+from config import Config, RecipeOption, RunOption
+from processor.planner import plan_recipe_groups
+from processor.run_recipe import run_recipe_group
 
 
 def run_processor(
@@ -12,15 +13,13 @@ def run_processor(
     config: Config,
     recipes: list[str] | None = None,
     presets: list[str] | None = None,
+    run_option: RunOption | None = None,
 ):
     if not recipes and not presets:
         logger.error("At least one of 'recipes' or 'presets' must be provided.")
         return
-    for recipe in iter_recipes(config, recipes, presets):
-        if not recipe:
-            logger.warning("No valid recipes found in the provided configuration.")
-            continue
-        run_recipe(input_path, recipe, config)
+    for group in plan_recipe_groups(iter_recipes(config, recipes, presets)):
+        run_recipe_group(input_path, group, config, run_option)
 
 
 def iter_recipes(
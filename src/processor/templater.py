@@ -1,13 +1,114 @@
+import hashlib
 import ipaddress
+import threading
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import (
+    BytecodeCache,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    ModuleLoader,
+    TemplateSyntaxError,
+)
 from loguru import logger
 
-from config import TemplateOption
+from config import Config, TemplateOption
 from utilities.resolve_path import resolve_path
 
+# (テンプレートフォルダ, エンコーディング) ごとにプロセス内で共有する環境
+_environments: dict[tuple[Path, str], Environment] = {}
+_environments_lock = threading.Lock()
+_bytecode_cache: BytecodeCache | None = None
+_bytecode_cache_dir: Path | None = None
+_compiled_dir: Path | None = None
+
+
+class CompiledTemplateLoader(ModuleLoader):
+    def __init__(self, path: Path):
+        # compile-templates で出力したモジュールを読み込む (ソースは参照できない)
+        super().__init__(str(path))
+        self.path = path
+        self.digest = _compute_compiled_digest(path)
+
+
+def _compute_compiled_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*.py"))
+    for file in files:
+        h.update(file.name.encode("utf-8") + b"\0" + file.read_bytes())
+    return h.hexdigest()
+
+
+def set_template_cache_dir(cache_dir: Path | None):
+    # コンパイル済みテンプレートの保存先を設定する (None の場合はディスクに保存しない)
+    # キャッシュにはテンプレートのチェックサムが含まれ、変更されたテンプレートは再コンパイルされる
+    global _bytecode_cache, _bytecode_cache_dir
+    with _environments_lock:
+        if cache_dir is not None:
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Template cache disabled ({cache_dir}): {e}")
+                cache_dir = None
+        _bytecode_cache_dir = cache_dir
+        _bytecode_cache = (
+            FileSystemBytecodeCache(str(cache_dir)) if cache_dir is not None else None
+        )
+        _environments.clear()
+
+
+def get_template_cache_dir() -> Path | None:
+    return _bytecode_cache_dir
+
+
+def set_compiled_template_dir(compiled_dir: Path | None):
+    # compile-templates の出力先を設定し、コンパイル済みのフォルダはそちらから読み込む
+    global _compiled_dir
+    with _environments_lock:
+        _compiled_dir = compiled_dir
+        _environments.clear()
+
+
+def get_compiled_template_dir() -> Path | None:
+    return _compiled_dir
+
+
+def get_compiled_template_name(option: TemplateOption) -> str:
+    # 実行環境によって基準パスが変わるため、設定ファイルに記述されたフォルダ名から決める
+    key = f"{option.folder}\0{option.encoding}".encode()
+    return "templates_" + hashlib.sha1(key).hexdigest()[:16]
+
+
+def _find_compiled_templates(option: TemplateOption) -> Path | None:
+    if _compiled_dir is None:
+        return None
+    name = get_compiled_template_name(option)
+    for path in (_compiled_dir / name, _compiled_dir / f"{name}.zip"):
+        if path.exists():
+            return path
+    return None
+
+
+def clear_template_environments():
+    with _environments_lock:
+        _environments.clear()
+
 
 def setup_template_environment(option: TemplateOption) -> Environment | None:
+    compiled = _find_compiled_templates(option)
+    if compiled is not None:
+        with _environments_lock:
+            env = _environments.get((compiled, ""))
+            if env is None:
+                env = Environment(loader=CompiledTemplateLoader(compiled))
+                setup_filters(env)
+                _environments[(compiled, "")] = env
+        return env
+
     template_folder = resolve_path(option.folder)
     if not template_folder.exists():
         logger.error(f"Template folder does not exist: {template_folder}")
@@ -16,65 +117,356 @@ def setup_template_environment(option: TemplateOption) -> Environment | None:
         logger.error(f"Template folder is not a directory: {template_folder}")
         return None
 
-    env = Environment(
-        loader=FileSystemLoader(template_folder.as_posix(), encoding=option.encoding)
-    )
-    setup_filters(env)
+    # 同じフォルダを使うレシピ間で環境とテンプレートのキャッシュを共有する
+    # auto_reload により、更新されたテンプレートは取得時に読み込み直される
+    key = (template_folder.resolve(), option.encoding)
+    with _environments_lock:
+        env = _environments.get(key)
+        if env is None:
+            env = Environment(
+                loader=FileSystemLoader(
+                    template_folder.as_posix(), encoding=option.encoding
+                ),
+                bytecode_cache=_bytecode_cache,
+                auto_reload=True,
+            )
+            setup_filters(env)
+            _environments[key] = env
     return env
 
 
+def compile_config_templates(
+    config: Config, target: Path, use_zip: bool = False
+) -> int:
+    # 設定ファイルで参照されるテンプレートフォルダをそれぞれ Python モジュールにコンパイルする
+    # 返り値: 終了コード
+    target.mkdir(parents=True, exist_ok=True)
+    options = {
+        get_compiled_template_name(recipe.template): recipe.template
+        for recipe in config.recipes
+    }
+    exit_code = 0
+    for name, option in options.items():
+        template_folder = resolve_path(option.folder)
+        if not template_folder.is_dir():
+            logger.error(f"Template folder does not exist: {template_folder}")
+            exit_code = 1
+            continue
+        env = Environment(
+            loader=FileSystemLoader(
+                template_folder.as_posix(), encoding=option.encoding
+            )
+        )
+        setup_filters(env)
+        output = target / (f"{name}.zip" if use_zip else name)
+        try:
+            env.compile_templates(
+                str(output),
+                zip="deflated" if use_zip else None,
+                ignore_errors=False,
+                log_function=logger.debug,
+            )
+        except (TemplateSyntaxError, UnicodeError) as e:
+            logger.error(f"Failed to compile templates in {template_folder}: {e}")
+            exit_code = 1
+            continue
+        logger.info(f"Compiled templates in {template_folder} to {output}")
+    return exit_code
+
+
 def setup_filters(env: Environment):
-    env.filters["ip_address_strict"] = ipaddress.ip_address
-    env.filters["ip_network_strict"] = ipaddress.ip_network
-    env.filters["ip_interface_strict"] = ipaddress.ip_interface
+    env.filters["ip_address_strict"] = _parse_address_strict
+    env.filters["ip_network_strict"] = _parse_network_strict
+    env.filters["ip_interface_strict"] = _parse_interface_strict
     env.filters["ip_address"] = ip_address
     env.filters["ip_network"] = ip_network
     env.filters["ip_interface"] = ip_interface
     env.filters["is_ip_address"] = is_ip_address
     env.filters["is_ip_network"] = is_ip_network
     env.filters["is_ip_interface"] = is_ip_interface
+    env.filters["map_ip_network"] = map_ip_network
+    env.filters["collapse_networks"] = collapse_networks
+    env.filters["summarize"] = summarize
+    env.filters["prefix_table"] = prefix_table
+    env.globals["prefix_table"] = prefix_table
 
 
-def ip_address(value: str) -> str:
+# 同じアドレスが繰り返し渡されるため、解析結果をプロセス内で保持する (ipaddress のオブジェクトは不変)
+IP_CACHE_SIZE = 1 << 16
+
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_address_strict(value: Any):
+    return ipaddress.ip_address(value)
+
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_network_strict(value: Any, strict: bool = True):
+    return ipaddress.ip_network(value, strict=strict)
+
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_interface_strict(value: Any):
+    return ipaddress.ip_interface(value)
+
+
+def _cached_parse(parse: Callable[[Any], Any], value: Any) -> Any:
+    # 返り値: 解析結果 (解析できない場合は None)
     try:
-        return str(ipaddress.ip_address(value))
-    except ValueError:
-        return value
+        return parse(value)
+    except TypeError:
+        # ハッシュできない値はキャッシュできず、アドレスとしても解析できない
+        return None
 
 
-def ip_network(value: str) -> str:
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_address(value: Any):
     try:
-        return str(ipaddress.ip_network(value))
+        return ipaddress.ip_address(value)
     except ValueError:
-        return value
+        return None
 
 
-def ip_interface(value: str) -> str:
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_network(value: Any):
     try:
-        return str(ipaddress.ip_interface(value))
+        return ipaddress.ip_network(value)
     except ValueError:
-        return value
+        return None
 
 
-def is_ip_address(value: str) -> bool:
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_interface(value: Any):
     try:
-        ipaddress.ip_address(value)
-        return True
+        return ipaddress.ip_interface(value)
     except ValueError:
-        return False
+        return None
 
 
-def is_ip_network(value: str) -> bool:
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_loose_network(value: Any):
+    # ホストビットが立っているネットワークも受け付ける
     try:
-        ipaddress.ip_network(value)
-        return True
+        return ipaddress.ip_network(value, strict=False)
     except ValueError:
-        return False
+        return None
+
+
+def clear_ip_caches():
+    for func in (
+        _parse_address_strict,
+        _parse_network_strict,
+        _parse_interface_strict,
+        _parse_address,
+        _parse_network,
+        _parse_interface,
+        _parse_loose_network,
+        _parse_query,
+    ):
+        func.cache_clear()
+
+
+def ip_address(value: str) -> str:
+    parsed = _cached_parse(_parse_address, value)
+    return value if parsed is None else str(parsed)
+
+
+def ip_network(value: str) -> str:
+    parsed = _cached_parse(_parse_network, value)
+    return value if parsed is None else str(parsed)
+
+
+def ip_interface(value: str) -> str:
+    parsed = _cached_parse(_parse_interface, value)
+    return value if parsed is None else str(parsed)
+
+
+def is_ip_address(value: str) -> bool:
+    return _cached_parse(_parse_address, value) is not None
+
+
+def is_ip_network(value: str) -> bool:
+    return _cached_parse(_parse_network, value) is not None
 
 
 def is_ip_interface(value: str) -> bool:
-    try:
-        ipaddress.ip_interface(value)
+    return _cached_parse(_parse_interface, value) is not None
+
+
+def map_ip_network(values: Iterable[str], strict: bool = True) -> list[str]:
+    # ip_network を列全体に適用する (strict=False の場合はホストビットを落とす)
+    parse = _parse_network if strict else _parse_loose_network
+    results = []
+    for value in values:
+        parsed = _cached_parse(parse, value)
+        results.append(value if parsed is None else str(parsed))
+    return results
+
+
+def collapse_networks(values: Iterable[str]) -> list[str]:
+    # 重複・包含・隣接するネットワークをまとめる (解析できない値は無視する)
+    networks = []
+    for value in values:
+        parsed = _cached_parse(_parse_loose_network, value)
+        if parsed is not None:
+            networks.append(parsed)
+    return [str(network) for network in _collapse(networks)]
+
+
+def summarize(values: Iterable[str]) -> list[str]:
+    # アドレス・ネットワーク・範囲 ("開始-終了") を最小のネットワークの一覧にまとめる
+    networks: list[IPNetwork] = []
+    for value in values:
+        parsed = _cached_parse(_parse_loose_network, value)
+        if parsed is not None:
+            networks.append(parsed)
+            continue
+        first, separator, last = str(value).partition("-")
+        if not separator:
+            continue
+        start = _cached_parse(_parse_address, first.strip())
+        end = _cached_parse(_parse_address, last.strip())
+        if start is None or end is None or start.version != end.version:
+            continue
+        if start > end:
+            start, end = end, start
+        networks.extend(ipaddress.summarize_address_range(start, end))
+    return [str(network) for network in _collapse(networks)]
+
+
+def _collapse(networks: list[IPNetwork]) -> list[IPNetwork]:
+    # collapse_addresses は IPv4/IPv6 の混在を受け付けないため、バージョンごとにまとめる
+    results: list[IPNetwork] = []
+    for version in (4, 6):
+        group = [network for network in networks if network.version == version]
+        if group:
+            results.extend(ipaddress.collapse_addresses(group))
+    return results
+
+
+class _PrefixNode:
+    __slots__ = ("children", "entry")
+
+    def __init__(self):
+        self.children: list[_PrefixNode | None] = [None, None]
+        # (ネットワーク, 行) または None
+        self.entry: tuple[IPNetwork, Any] | None = None
+
+
+class PrefixTable:
+    def __init__(self, rows: Iterable[Any] = (), attribute: Any = None):
+        # ネットワークの一覧 (または attribute でネットワークを参照できる行の一覧) の索引
+        # 検索はプレフィックス長に比例する時間で行う
+        self._roots = {4: _PrefixNode(), 6: _PrefixNode()}
+        self._size = 0
+        for row in rows:
+            self.add(_get_row_value(row, attribute), row)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: Any, row: Any = None) -> bool:
+        # 同じネットワークが複数ある場合は最初の行を使う
+        network = _cached_parse(_parse_loose_network, value)
+        if network is None:
+            return False
+        bits = int(network.network_address)
+        node = self._roots[network.version]
+        for shift in _prefix_shifts(network):
+            bit = (bits >> shift) & 1
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = _PrefixNode()
+            node = child
+        if node.entry is not None:
+            return False
+        node.entry = (network, value if row is None else row)
+        self._size += 1
         return True
-    except ValueError:
-        return False
+
+    def longest_match(self, value: Any) -> Any:
+        # アドレス (またはネットワーク) を含む最も長いプレフィックスの行を返す
+        entry = self._match(value)
+        return None if entry is None else entry[1]
+
+    def longest_match_network(self, value: Any) -> str | None:
+        entry = self._match(value)
+        return None if entry is None else str(entry[0])
+
+    def contains(self, value: Any) -> bool:
+        return self._match(value) is not None
+
+    def covered_by(self, value: Any) -> list[Any]:
+        # ネットワークに含まれるプレフィックスの行をアドレス順に返す
+        network = _cached_parse(_parse_query, value)
+        if network is None:
+            return []
+        bits = int(network.network_address)
+        node: _PrefixNode | None = self._roots[network.version]
+        for shift in _prefix_shifts(network):
+            if node is None:
+                return []
+            node = node.children[(bits >> shift) & 1]
+        results: list[Any] = []
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            if current is None:
+                continue
+            if current.entry is not None:
+                results.append(current.entry[1])
+            pending.append(current.children[1])
+            pending.append(current.children[0])
+        return results
+
+    def _match(self, value: Any) -> tuple[IPNetwork, Any] | None:
+        network = _cached_parse(_parse_query, value)
+        if network is None:
+            return None
+        bits = int(network.network_address)
+        node: _PrefixNode | None = self._roots[network.version]
+        found = None
+        for shift in _prefix_shifts(network):
+            if node.entry is not None:
+                found = node.entry
+            node = node.children[(bits >> shift) & 1]
+            if node is None:
+                return found
+        return node.entry if node.entry is not None else found
+
+
+def _prefix_shifts(network: IPNetwork) -> range:
+    # 上位ビットから順にプレフィックス長の分だけ参照する
+    return range(
+        network.max_prefixlen - 1, network.max_prefixlen - 1 - network.prefixlen, -1
+    )
+
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def _parse_query(value: Any) -> IPNetwork | None:
+    # インターフェース ("192.0.2.1/24") はそのアドレスで検索する
+    address = _parse_address(value)
+    if address is not None:
+        return ipaddress.ip_network(address)
+    network = _parse_network(value)
+    if network is not None:
+        return network
+    interface = _parse_interface(value)
+    if interface is not None:
+        return ipaddress.ip_network(interface.ip)
+    return None
+
+
+def _get_row_value(row: Any, attribute: Any) -> Any:
+    if attribute is None:
+        return row
+    try:
+        return row[attribute]
+    except (KeyError, IndexError, TypeError):
+        return getattr(row, str(attribute), None)
+
+
+def prefix_table(rows: Iterable[Any], attribute: Any = None) -> PrefixTable:
+    return PrefixTable(rows, attribute)
@@ -0,0 +1,280 @@
+import os
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+from loguru import logger
+from ruamel.yaml import YAMLError
+
+from config import Config, RunOption
+from processor.planner import plan_recipe_groups
+from processor.recipe_plan import RecipePlan
+from processor.run_recipe import iter_files, prepare_recipe_group, run_files
+from processor.runner import iter_recipes
+from utilities.resolve_path import resolve_path
+
+DEFAULT_WATCH_INTERVAL = 1.0
+DEFAULT_STAT_BATCH_SIZE = 20000
+
+# (mtime_ns, size, inode)
+FileStat = tuple[int, int, int]
+
+
+def _to_file_stat(st: os.stat_result) -> FileStat:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class StatIndex:
+    def __init__(
+        self, roots: Iterable[Path], batch_size: int = DEFAULT_STAT_BATCH_SIZE
+    ):
+        # フォルダの mtime で追加・削除を検出し、ファイルの更新は一定数ずつ巡回して検出する
+        self.roots = list(roots)
+        self.batch_size = max(1, batch_size)
+        self._files: dict[Path, FileStat] = {}
+        self._dirs: dict[Path, int] = {}
+        self._dir_files: dict[Path, set[Path]] = {}
+        self._dir_subdirs: dict[Path, set[Path]] = {}
+        self._order: list[Path] = []
+        self._order_dirty = True
+        self._cursor = 0
+        for root in self.roots:
+            self._add_root(root, None)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def poll(self) -> tuple[set[Path], set[Path]]:
+        # 返り値: (追加・変更されたファイル, 削除されたファイル)
+        changed: set[Path] = set()
+        removed: set[Path] = set()
+        for root in self.roots:
+            if root not in self._files and root not in self._dirs:
+                self._add_root(root, changed)
+        for directory in list(self._dirs):
+            if directory not in self._dirs:
+                continue
+            try:
+                mtime = directory.stat().st_mtime_ns
+            except OSError:
+                self._remove_dir(directory, removed)
+                continue
+            if mtime != self._dirs[directory]:
+                self._dirs[directory] = mtime
+                self._rescan_dir(directory, changed, removed)
+        for file in self._next_batch():
+            if file not in self._files or file in changed:
+                continue
+            try:
+                current = _to_file_stat(file.stat())
+            except OSError:
+                self._remove_file(file, removed)
+                continue
+            if current != self._files[file]:
+                self._files[file] = current
+                changed.add(file)
+        return changed, removed
+
+    def _add_root(self, root: Path, changed: set[Path] | None):
+        try:
+            st = root.stat()
+        except OSError:
+            return
+        if root.is_dir():
+            self._walk(root, changed)
+        else:
+            self._files[root] = _to_file_stat(st)
+            self._order_dirty = True
+            if changed is not None:
+                changed.add(root)
+
+    def _walk(self, directory: Path, changed: set[Path] | None):
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                self._dirs[current] = current.stat().st_mtime_ns
+                entries = list(os.scandir(current))
+            except OSError:
+                self._dirs.pop(current, None)
+                continue
+            files = self._dir_files.setdefault(current, set())
+            subdirs = self._dir_subdirs.setdefault(current, set())
+            for entry in entries:
+                path = Path(entry.path)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.add(path)
+                        pending.append(path)
+                    elif entry.is_file():
+                        self._files[path] = _to_file_stat(entry.stat())
+                        files.add(path)
+                        if changed is not None:
+                            changed.add(path)
+                except OSError:
+                    continue
+        self._order_dirty = True
+
+    def _rescan_dir(self, directory: Path, changed: set[Path], removed: set[Path]):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            self._remove_dir(directory, removed)
+            return
+        files = self._dir_files.setdefault(directory, set())
+        subdirs = self._dir_subdirs.setdefault(directory, set())
+        seen_files: set[Path] = set()
+        seen_dirs: set[Path] = set()
+        for entry in entries:
+            path = Path(entry.path)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    seen_dirs.add(path)
+                    if path not in subdirs:
+                        subdirs.add(path)
+                        self._walk(path, changed)
+                elif entry.is_file():
+                    seen_files.add(path)
+                    current = _to_file_stat(entry.stat())
+                    if self._files.get(path) != current:
+                        self._files[path] = current
+                        changed.add(path)
+                    if path not in files:
+                        files.add(path)
+                        self._order_dirty = True
+            except OSError:
+                continue
+        for path in files - seen_files:
+            self._remove_file(path, removed)
+        for path in subdirs - seen_dirs:
+            self._remove_dir(path, removed)
+
+    def _remove_file(self, file: Path, removed: set[Path]):
+        if self._files.pop(file, None) is not None:
+            removed.add(file)
+            self._order_dirty = True
+        files = self._dir_files.get(file.parent)
+        if files is not None:
+            files.discard(file)
+
+    def _remove_dir(self, directory: Path, removed: set[Path]):
+        for file in list(self._dir_files.pop(directory, set())):
+            self._remove_file(file, removed)
+        for subdir in list(self._dir_subdirs.pop(directory, set())):
+            self._remove_dir(subdir, removed)
+        self._dirs.pop(directory, None)
+        parent_subdirs = self._dir_subdirs.get(directory.parent)
+        if parent_subdirs is not None:
+            parent_subdirs.discard(directory)
+
+    def _next_batch(self) -> list[Path]:
+        if self._order_dirty:
+            self._order = list(self._files)
+            self._order_dirty = False
+            self._cursor = min(self._cursor, len(self._order))
+        if not self._order:
+            return []
+        if len(self._order) <= self.batch_size:
+            return self._order
+        if self._cursor >= len(self._order):
+            self._cursor = 0
+        batch = self._order[self._cursor : self._cursor + self.batch_size]
+        self._cursor += self.batch_size
+        return batch
+
+
+def matches_input(file: Path, input_path: Path, pattern: str) -> bool:
+    if file == input_path:
+        return True
+    try:
+        return file.relative_to(input_path).full_match(pattern)
+    except ValueError:
+        return False
+
+
+class _WatchState:
+    def __init__(
+        self,
+        config_path: Path,
+        config: Config,
+        recipes: list[str] | None,
+        presets: list[str] | None,
+    ):
+        self.config_path = config_path
+        self.config = config
+        self.groups: list[list[RecipePlan]] = []
+        for group in plan_recipe_groups(iter_recipes(config, recipes, presets)):
+            plans = prepare_recipe_group(group)
+            if plans:
+                self.groups.append(plans)
+
+    def source_paths(self) -> list[Path]:
+        # 変更時に再読み込みが必要な設定ファイル・テンプレート
+        paths = [self.config_path]
+        for plans in self.groups:
+            for recipe in (plan.recipe for plan in plans):
+                paths.append(resolve_path(recipe.template.folder))
+                if recipe.parse and recipe.parse.textfsm_options:
+                    paths.append(resolve_path(recipe.parse.textfsm_options.template))
+        return list(dict.fromkeys(paths))
+
+
+def watch_processor(
+    input_path: Path,
+    config_path: Path,
+    config: Config,
+    load_config: Callable[[Path], Config | None],
+    recipes: list[str] | None = None,
+    presets: list[str] | None = None,
+    run_option: RunOption | None = None,
+    interval: float = DEFAULT_WATCH_INTERVAL,
+    max_polls: int | None = None,
+):
+    if not recipes and not presets:
+        logger.error("At least one of 'recipes' or 'presets' must be provided.")
+        return
+    state = _WatchState(config_path, config, recipes, presets)
+    _run_all(input_path, state, run_option)
+    inputs = StatIndex([input_path])
+    sources = StatIndex(state.source_paths())
+    logger.info(f"Watching {input_path} ({len(inputs)} files)")
+
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        time.sleep(interval)
+        polls += 1
+        source_changed, source_removed = sources.poll()
+        if source_changed or source_removed:
+            logger.info("Configuration or templates changed, reloading...")
+            try:
+                new_config = load_config(config_path)
+            except (OSError, TypeError, ValueError, YAMLError) as e:
+                logger.error(f"Failed to load config from {config_path}: {e}")
+                new_config = None
+            if new_config is None:
+                logger.error("Failed to reload config, keeping the previous one.")
+                new_config = state.config
+            state = _WatchState(config_path, new_config, recipes, presets)
+            sources = StatIndex(state.source_paths())
+            _run_all(input_path, state, run_option)
+            inputs.poll()
+            continue
+
+        changed, removed = inputs.poll()
+        for file in sorted(removed):
+            logger.debug(f"Input removed: {file}")
+        if not changed:
+            continue
+        for plans in state.groups:
+            pattern = plans[0].recipe.input.file_pattern
+            files = sorted(
+                file for file in changed if matches_input(file, input_path, pattern)
+            )
+            if files:
+                logger.info(f"Re-rendering {len(files)} changed files")
+                run_files(files, plans, run_option)
+
+
+def _run_all(input_path: Path, state: _WatchState, run_option: RunOption | None):
+    for plans in state.groups:
+        run_files(iter_files(input_path, plans[0].recipe.input), plans, run_option)
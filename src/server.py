@@ -0,0 +1,318 @@
+import http.client
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from config import Config, RunOption
+from processor.parse_cache import open_parse_cache
+from processor.read_content import extract_content
+from processor.recipe_plan import RecipePlan
+from processor.run_recipe import (
+    iter_files,
+    prepare_recipe_group,
+    process_content,
+    run_files,
+)
+from utilities.resolve_path import resolve_path
+
+DEFAULT_SOCKET_PATH = "stapler.sock"
+# --port を使う場合のトークンを保存するファイル (所有者のみ読み書きできる)
+DEFAULT_TOKEN_PATH = "stapler.token"
+LOOPBACK_HOST = "127.0.0.1"
+
+
+class RenderService:
+    def __init__(self, config: Config, run_option: RunOption | None = None):
+        # 設定とテンプレート環境をプロセス内に保持し、リクエストごとの初期化を省く
+        self.config = config
+        self.run_option = run_option or RunOption()
+        self._prepared: dict[str, RecipePlan] = {}
+        self._lock = threading.Lock()
+        self._run_locks: dict[str, threading.Lock] = {}
+        self._parse_cache = open_parse_cache(
+            self.run_option.cache_dir, self.run_option.parse_cache_size
+        )
+
+    def get_recipe(self, recipe_id: str) -> RecipePlan:
+        with self._lock:
+            if recipe_id in self._prepared:
+                return self._prepared[recipe_id]
+            recipe = self.config.get_recipe(recipe_id)
+            if not recipe:
+                raise ValueError(f"Recipe '{recipe_id}' not found in config.")
+            if not recipe.enabled:
+                raise ValueError(f"Recipe '{recipe_id}' is not enabled.")
+            plans = prepare_recipe_group([recipe])
+            if not plans:
+                raise ValueError(
+                    f"Failed to build execution plan for recipe: {recipe_id}"
+                )
+            self._prepared[recipe_id] = plans[0]
+            self._run_locks[recipe_id] = threading.Lock()
+            return self._prepared[recipe_id]
+
+    def run(self, recipe_id: str, path: str) -> dict[str, Any]:
+        plan = self.get_recipe(recipe_id)
+        recipe = plan.recipe
+        input_path = resolve_path(path)
+        if not input_path.exists():
+            raise ValueError(f"The input path '{input_path}' does not exist.")
+        logger.info(f"Processing {recipe.id}({recipe.name}):  {input_path}")
+        # 同じレシピの出力が競合しないよう、レシピごとに直列化する
+        with self._run_locks[recipe_id]:
+            run_files(iter_files(input_path, recipe.input), [plan], self.run_option)
+        return {"status": "ok", "recipe": recipe_id, "path": str(input_path)}
+
+    def render(self, recipe_id: str, content: str, file_name: str) -> str:
+        plan = self.get_recipe(recipe_id)
+        content = extract_content(content, plan.recipe.read_content, plan.markers)
+        [(rendered, _, error)] = process_content(
+            Path(file_name),
+            content,
+            [plan],
+            [0],
+            allow_stream=False,
+            parse_cache=self._parse_cache,
+        )
+        if error is not None or rendered is None:
+            raise ValueError(error)
+        if plan.per_record:
+            # レコードごとの結果を連結して返す
+            return "".join(record_rendered for _, record_rendered in rendered)
+        return rendered
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        service: RenderService = self.server.service  # type: ignore[attr-defined]
+        if not self._authorize():
+            return
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "config": service.config.name})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        service: RenderService = self.server.service  # type: ignore[attr-defined]
+        if not self._authorize():
+            return
+        # 他のサイトから送られたフォームなどを受け付けないよう、JSON のみを受け付ける
+        if self.headers.get_content_type() != "application/json":
+            self._send_json(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            match self.path:
+                case "/run":
+                    result = service.run(body["recipe"], body["path"])
+                case "/render":
+                    rendered = service.render(
+                        body["recipe"],
+                        body.get("content", ""),
+                        body.get("file_name", "<request>"),
+                    )
+                    result = {"status": "ok", "rendered": rendered}
+                case _:
+                    self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+                    return
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:  # noqa: BLE001
+            # 予期しないエラーも接続を切らずに 500 として返す
+            logger.error(f"Error handling request {self.path}: {e}")
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, result)
+
+    def _authorize(self) -> bool:
+        # ループバックの HTTP は他のユーザーからも接続できるため、トークンを確認する
+        token: str | None = self.server.token  # type: ignore[attr-defined]
+        if token is None:
+            return True
+        scheme, _, value = self.headers.get("Authorization", "").partition(" ")
+        if scheme == "Bearer" and secrets.compare_digest(value, token):
+            return True
+        self._send_json(401, {"error": "Invalid or missing token"})
+        return False
+
+    def _send_json(self, status: int, payload: dict[str, Any]):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+if hasattr(socket, "AF_UNIX"):
+
+    class _ThreadingUnixHTTPServer(
+        socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        daemon_threads = True
+
+
+def create_server(
+    service: RenderService,
+    socket_path: Path | None = None,
+    port: int | None = None,
+    token: str | None = None,
+) -> socketserver.BaseServer:
+    server: Any
+    if port is not None:
+        server = ThreadingHTTPServer((LOOPBACK_HOST, port), _RequestHandler)
+    else:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix sockets are not supported, use --port instead.")
+        socket_path = socket_path or resolve_path(DEFAULT_SOCKET_PATH)
+        if socket_path.is_socket():
+            socket_path.unlink()
+        server = _ThreadingUnixHTTPServer(str(socket_path), _RequestHandler)
+    server.service = service
+    server.token = token
+    return server
+
+
+def write_token(token_path: Path) -> str:
+    token = secrets.token_urlsafe(32)
+    token_path.unlink(missing_ok=True)
+    fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def read_token(token_path: Path | None = None) -> str:
+    token_path = token_path or resolve_path(DEFAULT_TOKEN_PATH)
+    return token_path.read_text(encoding="utf-8").strip()
+
+
+def serve(
+    config: Config,
+    run_option: RunOption | None = None,
+    socket_path: Path | None = None,
+    port: int | None = None,
+    token_path: Path | None = None,
+):
+    token = None
+    if port is not None:
+        token_path = token_path or resolve_path(DEFAULT_TOKEN_PATH)
+        token = write_token(token_path)
+        logger.warning(
+            "Loopback HTTP can be reached by any local user; "
+            f"requests must send the token in {token_path}. "
+            "Use a Unix socket (without --port) where available."
+        )
+    server = create_server(RenderService(config, run_option), socket_path, port, token)
+    address = server.server_address
+    logger.info(f"Serving {config.name} on {address}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if isinstance(address, str):
+            Path(address).unlink(missing_ok=True)
+        if token_path is not None:
+            token_path.unlink(missing_ok=True)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: Path, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(self.socket_path))
+
+
+def send_request(
+    endpoint: str,
+    payload: dict[str, Any] | None = None,
+    socket_path: Path | None = None,
+    port: int | None = None,
+    timeout: float | None = None,
+    token: str | None = None,
+) -> tuple[int, dict[str, Any]]:
+    connection: http.client.HTTPConnection
+    if port is not None:
+        connection = http.client.HTTPConnection(LOOPBACK_HOST, port, timeout=timeout)
+    else:
+        connection = _UnixHTTPConnection(
+            socket_path or resolve_path(DEFAULT_SOCKET_PATH), timeout
+        )
+    headers = {"Authorization": f"Bearer {token}"} if token is not None else {}
+    try:
+        if payload is None:
+            connection.request("GET", endpoint, headers=headers)
+        else:
+            connection.request(
+                "POST",
+                endpoint,
+                body=json.dumps(payload).encode("utf-8"),
+                headers={**headers, "Content-Type": "application/json"},
+            )
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+
+
+def run_client(
+    recipes: list[str],
+    input_path: Path | None = None,
+    socket_path: Path | None = None,
+    port: int | None = None,
+    token_path: Path | None = None,
+) -> int:
+    # input_path がない場合は標準入力の内容をレンダリングして標準出力に書き出す
+    token = None
+    if port is not None:
+        try:
+            token = read_token(token_path)
+        except OSError as e:
+            logger.error(f"Failed to read server token: {e}")
+            return 1
+    content = sys.stdin.read() if input_path is None else ""
+    exit_code = 0
+    for recipe_id in recipes:
+        if input_path is not None:
+            payload = {"recipe": recipe_id, "path": str(input_path)}
+            endpoint = "/run"
+        else:
+            payload = {"recipe": recipe_id, "content": content, "file_name": "<stdin>"}
+            endpoint = "/render"
+        try:
+            status, result = send_request(
+                endpoint, payload, socket_path, port, token=token
+            )
+        except OSError as e:
+            logger.error(f"Failed to connect to server: {e}")
+            return 1
+        if status != 200:
+            logger.error(f"Recipe {recipe_id} failed: {result.get('error')}")
+            exit_code = 1
+        elif input_path is None:
+            sys.stdout.write(result["rendered"])
+        else:
+            logger.info(f"Recipe {recipe_id} completed: {result.get('path')}")
+    return exit_code
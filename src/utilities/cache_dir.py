@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+
+def get_default_cache_dir() -> Path:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME")
+    root = Path(base) if base else Path.home() / ".cache"
+    return root / "stapler-templater"
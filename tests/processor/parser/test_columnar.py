@@ -0,0 +1,96 @@
+import io
+
+import pytest
+from jinja2 import Environment
+
+import textfsm
+from src.config import DsvOption, TextFSMOption
+from src.processor.parser.columnar import ColumnarTable
+from src.processor.parser.dsv_parser import parse_dsv
+from src.processor.parser.textfsm_parser import parse_textfsm
+
+CONTENT = """port\tvlan\ttype
+Gi1/0/1\t10\taccess
+Gi1/0/2\t20\taccess
+Gi1/0/3\t10\ttrunk
+Gi1/0/4
+"""
+
+
+def test_columnar_table_from_dsv():
+    table = parse_dsv(CONTENT, DsvOption(parse_type="columnar"))
+    assert type(table).__name__ == "ColumnarTable"
+    assert len(table) == 4
+    assert table.header == ["port", "vlan", "type"]
+    assert table.column("vlan") == ["10", "20", "10", ""]
+    # 同じ値は同じオブジェクトを共有する
+    assert table.column("type")[0] is table.column("type")[1]
+    # 行ビューは辞書の一覧と同じ内容になる (足りない列は空文字列)
+    expected = parse_dsv(CONTENT, DsvOption(parse_type="dict"))
+    expected[-1].update({"vlan": "", "type": ""})
+    assert list(table) == expected
+    assert table[-1]["port"] == "Gi1/0/4"
+    with pytest.raises(IndexError):
+        table[4]
+
+
+def test_columnar_table_where_and_group_by():
+    table = parse_dsv(CONTENT, DsvOption(parse_type="columnar"))
+    assert table.where(vlan="10").column("port") == ["Gi1/0/1", "Gi1/0/3"]
+    assert table.where({"vlan": "10", "type": "trunk"}).column("port") == ["Gi1/0/3"]
+    assert len(table.where(vlan="99")) == 0
+    groups = table.group_by("vlan")
+    assert list(groups) == ["10", "20", ""]
+    assert groups["10"].column("type") == ["access", "trunk"]
+
+
+def test_columnar_table_without_header():
+    table = ColumnarTable.from_rows([["a"], ["b", "c", "d"], []])
+    assert table.header == [0, 1, 2]
+    assert table.columns == [["a", "b", ""], ["", "c", ""], ["", "d", ""]]
+    assert ColumnarTable.from_rows([]).header == []
+    assert len(parse_dsv("", DsvOption(parse_type="columnar"))) == 0
+
+
+def test_columnar_table_in_template():
+    table = parse_dsv(CONTENT, DsvOption(parse_type="columnar"))
+    template = Environment().from_string(
+        "{% for vlan, ports in table.group_by('vlan').items() %}"
+        "{{ vlan }}:{% for row in ports.rows() %}{{ row.port }} {% endfor %};"
+        "{% endfor %}{{ table.column('port')|length }}"
+    )
+    assert template.render(table=table) == (
+        "10:Gi1/0/1 Gi1/0/3 ;20:Gi1/0/2 ;:Gi1/0/4 ;4"
+    )
+
+
+def test_columnar_table_from_textfsm(tmp_path):
+    tpl_path = tmp_path / "show.textfsm"
+    tpl_path.write_text(
+        "Value Filldown Vlan (\\d+)\nValue List Ports (\\S+)\n\nStart\n"
+        "  ^vlan ${Vlan}\n  ^ port ${Ports}\n  ^end -> Record\n",
+        encoding="utf-8",
+    )
+    content = "vlan 10\n port a\n port b\nend\nvlan 20\n port c\nend\n"
+    options = TextFSMOption(template=str(tpl_path), parse_type="columnar")
+    table = parse_textfsm(content, options)
+    assert type(table).__name__ == "ColumnarTable"
+    expected = parse_textfsm(content, options.model_copy(update={"parse_type": "dict"}))
+    assert list(table) == expected
+    assert list(table.group_by("Ports")) == [("a", "b"), ("c",), ()]
+
+
+def test_columnar_table_from_textfsm_fillup(tmp_path):
+    template = (
+        "Value Port (\\S+)\nValue Fillup Vlan (\\d+)\n\nStart\n"
+        "  ^port ${Port} -> Record\n  ^vlan ${Vlan}\n"
+    )
+    tpl_path = tmp_path / "show.textfsm"
+    tpl_path.write_text(template, encoding="utf-8")
+    content = "port a\nport b\nvlan 10\n"
+    options = TextFSMOption(template=str(tpl_path), parse_type="columnar")
+    table = parse_textfsm(content, options)
+    # Fillup で後から埋められる値も ParseTextToDicts と同じになる
+    expected = textfsm.TextFSM(io.StringIO(template)).ParseTextToDicts(content)
+    assert list(table) == expected
+    assert table.column("Vlan") == ["10", "10", "10"]
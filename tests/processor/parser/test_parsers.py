@@ -3,12 +3,16 @@ from pathlib import Path
 
 import pytest
 
-from src.config import DsvOption, TextFSMOption
-from src.processor.parser.dsv_parser import parse_dsv
-from src.processor.parser.json_parser import parse_json
-from src.processor.parser.textfsm_parser import parse_textfsm
+from src.config import DsvOption, TextFSMOption, XmlOption
+from src.processor.parser.dsv_parser import DsvRows, parse_dsv
+from src.processor.parser.json_parser import parse_json, parse_jsonl
+from src.processor.parser.textfsm_parser import (
+    load_textfsm_template,
+    parse_textfsm,
+    validate_textfsm_templates,
+)
 from src.processor.parser.xml_parser import parse_xml
-from src.processor.parser.yaml_parser import parse_yaml
+from src.processor.parser.yaml_parser import parse_yaml, parse_yaml_stream
 
 
 # JSON
@@ -26,7 +30,20 @@ def test_parse_json_all(content, expected):
     assert parse_json(content, None) == expected
 
 
-# YAML
+def test_parse_jsonl():
+    records = parse_jsonl('{"a": 1}\n\n[1, 2]\nnot json\n"x"', None)
+    assert not isinstance(records, list)
+    assert list(records) == [{"a": 1}, [1, 2], "x"]
+    # 反復するたびに先頭から読み直す
+    assert list(records) == [{"a": 1}, [1, 2], "x"]
+
+
+def test_parse_jsonl_line_separators():
+    # 文字列内の U+2028 / U+0085 などは区切りとしない
+    content = '{"a": "x\u2028y"}\r\n{"b": "\x85"}\nnot json\n'
+    assert list(parse_jsonl(content, None)) == [{"a": "x\u2028y"}, {"b": "\x85"}]
+
+
 @pytest.mark.parametrize(
     "content,expected",
     [
@@ -41,6 +58,12 @@ def test_parse_yaml_all(content, expected):
     assert parse_yaml(content, None) == expected
 
 
+def test_parse_yaml_stream():
+    documents = parse_yaml_stream("a: 1\n---\n- 2\n---\nb: [\n", None)
+    assert list(documents) == [{"a": 1}, [2]]
+    assert list(parse_yaml_stream("", None)) == []
+
+
 # XML
 @pytest.mark.parametrize(
     "content,expected_dict",
@@ -65,6 +88,84 @@ def test_parse_xml_all(content, expected_dict):
     assert elem == expected_dict
 
 
+NETCONF_REPLY = """<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0">
+  <data>
+    <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+      <interface><name>eth0</name></interface>
+      <interface><name>eth1</name></interface>
+    </interfaces>
+  </data>
+</rpc-reply>"""
+
+CONFIG_XML = """<config>
+  <interface><name>eth0</name><enabled>true</enabled></interface>
+  <interface>
+    <name>eth1</name>
+    <ipv4 mtu="1500"><address>192.0.2.1</address></ipv4>
+  </interface>
+  <system><hostname>router1</hostname></system>
+</config>"""
+
+
+def test_parse_xml_paths():
+    options = XmlOption(paths=["interface", "/config/system/*"])
+    assert parse_xml(CONFIG_XML, options) == {
+        "interface": [
+            {"name": {"#text": "eth0"}, "enabled": {"#text": "true"}},
+            {
+                "name": {"#text": "eth1"},
+                "ipv4": {"@mtu": "1500", "address": {"#text": "192.0.2.1"}},
+            },
+        ],
+        "/config/system/*": [{"#text": "router1"}],
+    }
+    # 一致した要素の内側は、その要素の変換結果に含まれる
+    full = parse_xml(CONFIG_XML, None)
+    assert parse_xml(CONFIG_XML, XmlOption(paths=["/config", "interface"])) == {
+        "/config": [full["config"]],
+        "interface": [],
+    }
+    assert parse_xml("<config><a>", XmlOption(paths=["a"])) is None
+
+
+def test_parse_xml_paths_namespaces():
+    # 名前空間を含まない要素名は、名前空間を除いた要素名と比較する
+    ns = "{urn:ietf:params:xml:ns:yang:ietf-interfaces}"
+    for path in ["interfaces/interface/name", f"{ns}interface/{ns}name"]:
+        result = parse_xml(NETCONF_REPLY, XmlOption(paths=[path]))
+        assert result == {path: [{"#text": "eth0"}, {"#text": "eth1"}]}
+    assert parse_xml(NETCONF_REPLY, XmlOption(paths=["{other}name"])) == {
+        "{other}name": []
+    }
+
+
+def test_parse_xml_paths_stream():
+    options = XmlOption(paths=["interface/name"], stream=True)
+    result = parse_xml(CONFIG_XML, options)
+    names = result["interface/name"]
+    assert not isinstance(names, list)
+    assert [name["#text"] for name in names] == ["eth0", "eth1"]
+    assert [name["#text"] for name in names] == ["eth0", "eth1"]
+
+
+@pytest.mark.parametrize(
+    "paths", [["name", "/config/interface"], ["/config", "interface"]]
+)
+def test_parse_xml_paths_stream_overlapping(paths):
+    # 複数のパスに一致する要素の選択は stream でない場合と同じ
+    expected = parse_xml(CONFIG_XML, XmlOption(paths=paths))
+    result = parse_xml(CONFIG_XML, XmlOption(paths=paths, stream=True))
+    assert {path: list(values) for path, values in result.items()} == expected
+
+
+def test_parse_xml_deep():
+    content = "<a>" * 5000 + "x" + "</a>" * 5000
+    result = parse_xml(content, None)
+    for _ in range(4999):
+        result = result["a"]
+    assert result == {"a": {"#text": "x"}}
+
+
 # DSV
 @pytest.mark.parametrize(
     "content,options,expected",
@@ -100,12 +201,103 @@ def test_parse_xml_all(content, expected_dict):
             [["c"]],
         ),
         ("", DsvOption(parse_type="dict", enable_header=True), []),
+        (
+            'a,b\n"x,y",z\n"multi\nline",""""\n',
+            DsvOption(
+                parse_type="list", delimiter=",", enable_header=True, quotechar='"'
+            ),
+            [["x,y", "z"], ["multi\nline", '"']],
+        ),
+        (
+            'a,b\n"x,y",z',
+            DsvOption(
+                parse_type="list", delimiter=",", enable_header=False, quotechar=None
+            ),
+            [["a", "b"], ['"x', 'y"', "z"]],
+        ),
+        (
+            "a,b\nx\\,y,z",
+            DsvOption(
+                parse_type="list",
+                delimiter=",",
+                enable_header=True,
+                escapechar="\\",
+            ),
+            [["x,y", "z"]],
+        ),
+        (
+            "a::b\n  # comment\n \nc::d",
+            DsvOption(
+                parse_type="dict", delimiter="::", enable_header=False, comment_line="#"
+            ),
+            [{0: "a", 1: "b"}, {0: "c", 1: "d"}],
+        ),
+        (
+            "a\tb\n\nc\td",
+            DsvOption(parse_type="list", enable_header=True, skip_empty_lines=False),
+            [[""], ["c", "d"]],
+        ),
     ],
 )
 def test_parse_dsv_all(content, options, expected):
     assert parse_dsv(content, options) == expected
 
 
+def test_parse_dsv_stream():
+    content = "a,b\n# comment\n1,2\n3,4\n"
+    options = DsvOption(delimiter=",", comment_line="#")
+    expected = parse_dsv(content, options)
+    rows = parse_dsv(content, options.model_copy(update={"stream": True}))
+    assert isinstance(rows, DsvRows)
+    assert list(rows) == expected == [{"a": "1", "b": "2"}, {"a": "3", "b": "4"}]
+    # 反復するたびに先頭から読み直す
+    assert list(rows) == expected
+
+
+# 引用符の有無で分割方法 (str.split / csv) が変わっても、空行や改行の扱いは同じ
+@pytest.mark.parametrize("c", ["c", '"c"'])
+@pytest.mark.parametrize(
+    "skip_empty_lines, expected",
+    [
+        (True, [["a", "b"], ["", "", ""], ["c", "d\x0be"], ["f\x85g"]]),
+        (
+            False,
+            [["a", "b"], ["", "", ""], [""], ["  "], ["c", "d\x0be"], ["f\x85g"]],
+        ),
+    ],
+)
+def test_parse_dsv_empty_rows(c, skip_empty_lines, expected):
+    content = f"a,b\r\n,,\n\n  \r{c},d\x0be\nf\x85g"
+    options = DsvOption(
+        parse_type="list",
+        delimiter=",",
+        enable_header=False,
+        skip_empty_lines=skip_empty_lines,
+        quotechar='"',
+    )
+    assert parse_dsv(content, options) == expected
+    stream = options.model_copy(update={"stream": True})
+    assert list(parse_dsv(content, stream)) == expected
+
+
+def test_parse_dsv_quotechar():
+    # 引用符は指定した場合のみ解釈する
+    content = 'a,b\n"x,y",z\n'
+    options = DsvOption(parse_type="list", delimiter=",", enable_header=False)
+    assert parse_dsv(content, options) == [["a", "b"], ['"x', 'y"', "z"]]
+    options.quotechar = '"'
+    assert parse_dsv(content, options) == [["a", "b"], ["x,y", "z"]]
+    # 閉じられていない引用符は、以降の行を一つの値にせずエラーとする
+    content = 'a,b\n"x,y\nc,d\n'
+    assert parse_dsv(content, options) is None
+    assert (
+        parse_dsv(content, options.model_copy(update={"parse_type": "columnar"}))
+        is None
+    )
+    stream = options.model_copy(update={"stream": True})
+    assert list(parse_dsv(content, stream)) == [["a", "b"]]
+
+
 # TextFSMテンプレート内容
 TESTFSM_TEMPLATE = """# TextFSM Template
 Value Required Test1 (\\S+)
@@ -149,3 +341,94 @@ def test_parse_textfsm_all(content, tpl_content, parse_type, enable_header, expe
     finally:
         if tpl_content is not None:
             Path(tpl_path).unlink(missing_ok=True)
+
+
+FILLDOWN_TEMPLATE = """Value Filldown Interface (\\S+)
+Value Required Address (\\S+)
+
+Start
+  ^interface ${Interface}
+  ^ address ${Address} -> Record
+
+"""
+
+
+def test_parse_textfsm_reuses_template(tmp_path):
+    tpl_path = tmp_path / "show.textfsm"
+    tpl_path.write_text(FILLDOWN_TEMPLATE, encoding="utf-8")
+    options = TextFSMOption(template=str(tpl_path))
+    cached = load_textfsm_template(tpl_path, "utf-8")
+    assert load_textfsm_template(tpl_path, "utf-8") is cached
+
+    content = "interface eth0\n address 192.0.2.1\n"
+    expected = [{"Interface": "eth0", "Address": "192.0.2.1"}]
+    assert parse_textfsm(content, options) == expected
+    # Filldown の値や前回の結果は持ち越さない
+    assert parse_textfsm(" address 192.0.2.2\n", options) == [
+        {"Interface": "", "Address": "192.0.2.2"}
+    ]
+    assert parse_textfsm(content, options) == expected
+
+    # テンプレートが更新された場合は読み込み直す
+    tpl_path.write_text(TESTFSM_TEMPLATE, encoding="utf-8")
+    assert load_textfsm_template(tpl_path, "utf-8") is not cached
+    assert parse_textfsm("abc 123", options) == [{"Test1": "abc"}]
+
+
+def test_validate_textfsm_templates(tmp_path):
+    valid = tmp_path / "valid.textfsm"
+    valid.write_text(TESTFSM_TEMPLATE, encoding="utf-8")
+    invalid = tmp_path / "invalid.textfsm"
+    invalid.write_text("Value Test1 (\\S+\n\nStart\n  ^${Test1}\n", encoding="utf-8")
+    assert validate_textfsm_templates([TextFSMOption(template=str(valid))])
+    assert not validate_textfsm_templates(
+        [TextFSMOption(template=str(valid)), TextFSMOption(template=str(invalid))]
+    )
+    assert not validate_textfsm_templates(
+        [TextFSMOption(template=str(tmp_path / "missing.textfsm"))]
+    )
+
+
+EOF_TEMPLATE = """Value Name (\\S+)
+
+Start
+  ^name ${Name} -> Record
+  ^end -> End
+
+"""
+
+
+FILLUP_TEMPLATE = """Value Interface (\\S+)
+Value Fillup Name (\\S+)
+
+Start
+  ^interface ${Interface} -> Record
+  ^name ${Name}
+
+"""
+
+
+@pytest.mark.parametrize(
+    "tpl_content", [FILLDOWN_TEMPLATE, EOF_TEMPLATE, FILLUP_TEMPLATE]
+)
+@pytest.mark.parametrize(
+    "parse_type, enable_header", [("dict", True), ("list", True), ("list", False)]
+)
+def test_parse_textfsm_stream(tmp_path, tpl_content, parse_type, enable_header):
+    tpl_path = tmp_path / "show.textfsm"
+    tpl_path.write_text(tpl_content, encoding="utf-8")
+    content = "".join(
+        f"interface eth{i}\n address 192.0.2.{i}\n address 198.51.100.{i}\nname n{i}\n"
+        for i in range(50)
+    )
+    content += "end\nname after_end\n interface eth99"
+    options = TextFSMOption(
+        template=str(tpl_path), parse_type=parse_type, enable_header=enable_header
+    )
+    expected = parse_textfsm(content, options)
+    stream_options = options.model_copy(update={"stream": True})
+    records = parse_textfsm(content, stream_options)
+    assert not isinstance(records, list)
+    assert list(records) == expected
+    # 反復するたびにパースし直す (入れ子で反復しても互いに影響しない)
+    assert [len(list(records)) for _ in records] == [len(expected)] * len(expected)
@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from src.config import (
+    Config,
+    InputOption,
+    OutputOption,
+    RecipeOption,
+    RunOption,
+    TemplateOption,
+)
+from src.processor.manifest import get_manifest_path, load_manifest
+from src.processor.run_recipe import run_recipe
+
+
+def make_config_and_recipe(tmpdir):
+    template_dir = tmpdir / "templates"
+    template_dir.mkdir(parents=True, exist_ok=True)
+    (template_dir / "test.tpl").write_text("v1 {{ content }}", encoding="utf-8")
+    recipe = RecipeOption(
+        enabled=True,
+        id="r1",
+        name="TestRecipe",
+        input=InputOption(file_pattern="*.txt"),
+        output=OutputOption(path=str(tmpdir / "out" / "${fileName}.out")),
+        template=TemplateOption(folder=str(template_dir), file="test.tpl"),
+        read_content=None,
+        parse=None,
+        variables=None,
+        additional_params=None,
+    )
+    config = Config(version="1.0", name="test", recipes=[recipe], presets=[])
+    return config, recipe
+
+
+def test_get_manifest_path():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        _, recipe = make_config_and_recipe(tmpdir)
+        assert get_manifest_path(recipe) == tmpdir / "out" / ".stapler-manifest.r1.json"
+        recipe.output.path = str(tmpdir / "out.txt")
+        assert get_manifest_path(recipe) == tmpdir / ".stapler-manifest.r1.json"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_incremental_skips_unchanged_files():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        (input_dir / "a.txt").write_text("a", encoding="utf-8")
+        (input_dir / "b.txt").write_text("b", encoding="utf-8")
+        config, recipe = make_config_and_recipe(tmpdir)
+        out_a = tmpdir / "out" / "a.txt.out"
+        out_b = tmpdir / "out" / "b.txt.out"
+        run_option = RunOption(incremental=True)
+
+        run_recipe(input_dir, recipe, config, run_option)
+        assert out_a.read_text(encoding="utf-8") == "v1 a"
+        assert len(load_manifest(recipe).entries) == 2
+
+        # 変更のないファイルはスキップされる
+        out_a.write_text("untouched", encoding="utf-8")
+        (input_dir / "b.txt").write_text("b2", encoding="utf-8")
+        run_recipe(input_dir, recipe, config, run_option)
+        assert out_a.read_text(encoding="utf-8") == "untouched"
+        assert out_b.read_text(encoding="utf-8") == "v1 b2"
+
+        # テンプレートの変更で全ファイルを再生成する
+        (tmpdir / "templates" / "test.tpl").write_text("v2 {{ content }}", "utf-8")
+        run_recipe(input_dir, recipe, config, run_option)
+        assert out_a.read_text(encoding="utf-8") == "v2 a"
+
+        out_a.write_text("untouched", encoding="utf-8")
+        run_recipe(input_dir, recipe, config, RunOption(incremental=True, force=True))
+        assert out_a.read_text(encoding="utf-8") == "v2 a"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_incremental_prune_manifest():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        (input_dir / "a.txt").write_text("a", encoding="utf-8")
+        (input_dir / "b.txt").write_text("b", encoding="utf-8")
+        config, recipe = make_config_and_recipe(tmpdir)
+        run_recipe(input_dir, recipe, config, RunOption(incremental=True))
+        (input_dir / "b.txt").unlink()
+
+        run_recipe(input_dir, recipe, config, RunOption(incremental=True))
+        assert len(load_manifest(recipe).entries) == 2
+        run_recipe(
+            input_dir,
+            recipe,
+            config,
+            RunOption(incremental=True, prune_manifest=True),
+        )
+        assert list(load_manifest(recipe).entries) == [str(input_dir / "a.txt")]
+    finally:
+        shutil.rmtree(tmpdir)
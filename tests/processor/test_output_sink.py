@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from src.processor.output_sink import OutputSink, write_file
+
+
+def test_output_sink_buffers_appends_until_close():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        path = tmpdir / "sub" / "out.txt"
+        with OutputSink() as sink:
+            sink.write(path, "a", "a", "utf-8")
+            sink.write(path, "b", "a", "utf-8")
+            assert not path.exists()
+        assert path.read_text(encoding="utf-8") == "ab"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_output_sink_keeps_order_with_overwrite():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        path = tmpdir / "out.txt"
+        with OutputSink() as sink:
+            sink.write(path, "a", "a", "utf-8")
+            sink.write(path, "b", "w", "utf-8")
+            sink.write(path, "c", "a", "utf-8")
+        assert path.read_text(encoding="utf-8") == "bc"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_output_sink_flushes_at_threshold_and_evicts_handles():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        paths = [tmpdir / f"out_{i}.txt" for i in range(3)]
+        with OutputSink(max_handles=1, buffer_size=4) as sink:
+            for i in range(4):
+                for path in paths:
+                    sink.write(path, f"{i}{i}", "a", "utf-8")
+            # 閾値を超えたパスは書き込み済みになっている
+            assert paths[0].read_text(encoding="utf-8").startswith("0011")
+        for path in paths:
+            assert path.read_text(encoding="utf-8") == "00112233"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_write_file_skips_unchanged_content():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        path = tmpdir / "out.txt"
+        assert write_file(path, "line1\nline2\n", "w", "utf-8", skip_unchanged=True)
+        before = path.stat().st_mtime_ns
+        os.utime(path, ns=(before - 10**9, before - 10**9))
+        assert not write_file(path, "line1\nline2\n", "w", "utf-8", True)
+        assert path.stat().st_mtime_ns == before - 10**9
+        assert write_file(path, "line1\nline3\n", "w", "utf-8", True)
+        assert path.read_text(encoding="utf-8") == "line1\nline3\n"
+        assert [p.name for p in tmpdir.iterdir()] == ["out.txt"]
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_write_file_streams_chunks():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        path = tmpdir / "out.txt"
+        chunks = ["line1\n", "日本語\n"]
+        assert write_file(path, iter(chunks), "w", "utf-16", skip_unchanged=True)
+        assert path.read_text(encoding="utf-16") == "line1\n日本語\n"
+        assert not write_file(path, iter(chunks), "w", "utf-16", True)
+        with OutputSink(buffer_size=4) as sink:
+            sink.write(path, iter(["a", "b"]), "a", "utf-16")
+        assert path.read_text(encoding="utf-16") == "line1\n日本語\nab"
+        assert [p.name for p in tmpdir.iterdir()] == ["out.txt"]
+    finally:
+        shutil.rmtree(tmpdir)
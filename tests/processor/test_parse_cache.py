@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.processor.parse_cache import ParseCache, cached_parse, open_parse_cache
+
+
+def entry_sizes(directory):
+    return [path.stat().st_size for path in directory.rglob("*.pickle")]
+
+
+def test_parse_cache_round_trip(tmp_path):
+    cache = ParseCache(tmp_path, 1 << 20)
+    calls = []
+
+    def parser(content):
+        calls.append(content)
+        return {"root": content.split()}
+
+    assert cached_parse(cache, "xml", parser, "a b") == {"root": ["a", "b"]}
+    assert cached_parse(cache, "xml", parser, "a b") == {"root": ["a", "b"]}
+    # 設定が異なる場合は別のキーになる
+    assert cached_parse(cache, "yaml", parser, "a b") == {"root": ["a", "b"]}
+    assert calls == ["a b", "a b"]
+    assert cache.stats == {"hits": 1, "misses": 2, "stores": 2}
+    assert cache.summary() == "Parse cache: 1 hits, 2 misses, 2 stored, 0 evicted"
+
+
+def test_cached_parse_does_not_store_failures(tmp_path):
+    cache = ParseCache(tmp_path, 1 << 20)
+    assert cached_parse(cache, "xml", lambda _: None, "<broken") is None
+    assert cached_parse(cache, "xml", lambda _: {"ok": 1}, "<broken") == {"ok": 1}
+    assert cache.stats["stores"] == 1
+
+
+def test_cached_parse_without_cache():
+    assert cached_parse(None, "xml", str.upper, "abc") == "ABC"
+
+
+def test_parse_cache_discards_unreadable_entry(tmp_path):
+    cache = ParseCache(tmp_path, 1 << 20)
+    cached_parse(cache, "xml", lambda content: [content], "abc")
+    [path] = tmp_path.rglob("*.pickle")
+    path.write_bytes(b"broken")
+    assert cached_parse(cache, "xml", lambda content: [content, 1], "abc") == [
+        "abc",
+        1,
+    ]
+    assert cache.stats["misses"] == 2
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path):
+    value = "x" * 1000
+    cache = ParseCache(tmp_path, 3500)
+    keys = [cache.make_key(str(i), "xml") for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, value)
+        os.utime(cache._entry_path(key), ns=(i * 10**9, i * 10**9))
+    # 最も古いものを参照すると、次に古いものが削除される
+    assert cache.get(keys[0]) == value
+    cache.put(cache.make_key("3", "xml"), value)
+    assert cache.get(keys[0]) == value
+    assert not cache._entry_path(keys[1]).exists()
+    assert cache.stats["evictions"] >= 1
+    assert sum(entry_sizes(tmp_path)) <= 3500
+
+
+def test_parse_cache_skips_oversized_values(tmp_path):
+    cache = ParseCache(tmp_path, 100)
+    cache.put(cache.make_key("a", "xml"), "x" * 1000)
+    assert entry_sizes(tmp_path) == []
+
+
+def _fill_cache(args):
+    directory, max_size, prefix = args
+    cache = ParseCache(directory, max_size)
+    for i in range(50):
+        cache.put(cache.make_key(f"{prefix}-{i}", "xml"), "x" * 1000)
+    return cache.take_stats()["stores"]
+
+
+def test_parse_cache_size_holds_with_concurrent_writers(tmp_path):
+    max_size = 20000
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        stores = list(
+            executor.map(_fill_cache, [(tmp_path, max_size, p) for p in range(4)])
+        )
+    assert stores == [50] * 4
+    assert 0 < sum(entry_sizes(tmp_path)) <= max_size
+
+
+def test_open_parse_cache(tmp_path):
+    assert open_parse_cache(None, 1 << 20) is None
+    assert open_parse_cache(tmp_path, 0) is None
+    cache = open_parse_cache(tmp_path, 1 << 20)
+    assert cache is not None
+    assert cache.directory == tmp_path / "parse"
+    assert cache.directory.is_dir()
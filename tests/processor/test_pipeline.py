@@ -0,0 +1,59 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from src.processor.pipeline import run_pipeline
+
+
+def test_run_pipeline_keeps_input_order():
+    files = [Path(f"file_{i}.txt") for i in range(20)]
+    written = []
+
+    def read(file):
+        return file.stem
+
+    def compute(file, data):
+        # 後続のファイルほど早く終わるようにして順序の保持を確認する
+        time.sleep(0.001 * (20 - int(data.split("_")[1])))
+        return data.upper()
+
+    def write(file, result):
+        written.append((file, result))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        run_pipeline(files, read, compute, write, executor, queue_size=2)
+    assert written == [(file, file.stem.upper()) for file in files]
+
+
+def test_run_pipeline_skips_and_reports_errors():
+    files = [Path("skip.txt"), Path("bad.txt"), Path("ok.txt")]
+    written = []
+
+    def read(file):
+        return None if file.stem == "skip" else file.stem
+
+    def compute(file, data):
+        if data == "bad":
+            raise ValueError("bad content")
+        return data
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        run_pipeline(files, read, compute, lambda f, r: written.append(r), executor)
+    assert written == ["ok"]
+
+
+def test_run_pipeline_propagates_stage_failure():
+    def broken_files():
+        yield Path("a.txt")
+        raise RuntimeError("glob failed")
+
+    with ThreadPoolExecutor(max_workers=1) as executor, pytest.raises(ExceptionGroup):
+        run_pipeline(
+            broken_files(),
+            lambda f: f,
+            lambda f, d: d,
+            lambda f, r: None,
+            executor,
+        )
@@ -0,0 +1,70 @@
+from src.config import (
+    DsvOption,
+    InputOption,
+    OutputOption,
+    ParseOption,
+    RecipeOption,
+    TemplateOption,
+)
+from src.processor.planner import plan_recipe_groups
+
+
+def make_recipe(recipe_id, file_pattern="*.txt", parse=None):
+    return RecipeOption(
+        enabled=True,
+        id=recipe_id,
+        name=recipe_id,
+        input=InputOption(file_pattern=file_pattern),
+        output=OutputOption(path=f"{recipe_id}.txt"),
+        template=TemplateOption(folder="t", file=f"{recipe_id}.tpl"),
+        read_content=None,
+        parse=parse,
+        variables=None,
+        additional_params=None,
+    )
+
+
+def test_plan_recipe_groups_shares_same_options():
+    dsv = ParseOption(parse_type="dsv", dsv_options=DsvOption())
+    r1 = make_recipe("r1", parse=dsv)
+    r2 = make_recipe("r2", parse=dsv)
+    r3 = make_recipe("r3", parse=ParseOption(parse_type="json"))
+    r4 = make_recipe("r4", file_pattern="*.log", parse=dsv)
+    groups = plan_recipe_groups([r1, r2, r3, r4])
+    assert [[r.id for r in group] for group in groups] == [
+        ["r1", "r2"],
+        ["r3"],
+        ["r4"],
+    ]
+
+
+def test_plan_recipe_groups_collapses_duplicates():
+    r1 = make_recipe("r1")
+    r2 = make_recipe("r2")
+    groups = plan_recipe_groups([r1, None, r2, r1])
+    assert [[r.id for r in group] for group in groups] == [["r1", "r2"]]
+
+
+def test_plan_recipe_groups_keeps_order():
+    json_parse = ParseOption(parse_type="json")
+    a = make_recipe("a")
+    b = make_recipe("b", parse=json_parse)
+    c = make_recipe("c")
+    d = make_recipe("d")
+    groups = plan_recipe_groups([a, b, c, d])
+    # 隣り合うレシピのみをまとめ、指定順を変えない
+    assert [[r.id for r in group] for group in groups] == [["a"], ["b"], ["c", "d"]]
+
+
+def test_plan_recipe_groups_separates_appends_to_same_output():
+    recipes = [make_recipe(recipe_id) for recipe_id in ("a", "b", "c")]
+    for recipe in recipes:
+        recipe.output.path = "shared.txt"
+    recipes[2].output.write_mode = "a"
+    recipes[1].output.write_mode = "a"
+    groups = plan_recipe_groups(recipes)
+    assert [[r.id for r in group] for group in groups] == [["a"], ["b"], ["c"]]
+    for recipe in recipes:
+        recipe.output.write_mode = "w"
+    groups = plan_recipe_groups(recipes)
+    assert [[r.id for r in group] for group in groups] == [["a", "b", "c"]]
@@ -1,10 +1,11 @@
+import io
 import tempfile
 from pathlib import Path
 
 import pytest
 
 from src.config import ReadContentExtractOption, ReadContentOption
-from src.processor.read_content import read_content
+from src.processor.read_content import extract_content, iter_lines, read_content
 
 # テストデータ
 TEST_CONTENT = (
@@ -57,6 +58,18 @@ TEST_CONTENT = (
             ),
             "line3: baz\nline4: 123\nline5: barfoo\nline6: end\n",
         ),
+        (
+            ReadContentOption(
+                start=ReadContentExtractOption(extract_type="line", target=-2)
+            ),
+            "line5: barfoo\nline6: end\n",
+        ),
+        (
+            ReadContentOption(
+                end=ReadContentExtractOption(extract_type="index", target=-4)
+            ),
+            "line1: foo\nline2: bar\nline3: baz\nline4: 123\nline5: barfoo\nline6: ",
+        ),
         # --- exact ---
         (
             ReadContentOption(
@@ -123,3 +136,135 @@ def test_read_content(option, expected):
         assert result == expected
     finally:
         tf_path.unlink(missing_ok=True)
+
+
+STREAM_OPTIONS = [
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="exact", target="barfoo"),
+        end=ReadContentExtractOption(extract_type="exact", target="end"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(
+            extract_type="regex", target=r"(?m)^line\d: 12\d+$", include_match=False
+        ),
+        end=ReadContentExtractOption(extract_type="regex", target=r"foo\n(?=line6)"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="regex", target="(?<=bar)foo"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="exact", target="not found"),
+        end=ReadContentExtractOption(extract_type="line", target=2),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="line", target=5),
+        end=ReadContentExtractOption(extract_type="index", target=100),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="index", target=30),
+        end=ReadContentExtractOption(extract_type="regex", target="ba."),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="line", target=-3),
+        end=ReadContentExtractOption(extract_type="exact", target="end"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="index", target=-15),
+        end=ReadContentExtractOption(extract_type="line", target=-1),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="line", target=-100),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="exact", target="line2"),
+        end=ReadContentExtractOption(extract_type="line", target=-2),
+    ),
+    # $ や \Z はファイルの末尾でのみ一致し、途中の改行の直前には一致しない
+    ReadContentOption(
+        end=ReadContentExtractOption(extract_type="regex", target="o$"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="regex", target="(?:foo|end)$"),
+    ),
+    ReadContentOption(
+        end=ReadContentExtractOption(extract_type="regex", target="\\w\\n?\\Z"),
+    ),
+    # 貪欲な量指定子は、同じ行の続きを読んでから確定する
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="regex", target=r"line\d: .*a"),
+        end=ReadContentExtractOption(extract_type="regex", target=r"b.*o"),
+    ),
+    ReadContentOption(
+        start=ReadContentExtractOption(extract_type="regex", target=r"\d: \w+"),
+        end=ReadContentExtractOption(extract_type="regex", target=r"\d+\s*"),
+    ),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 20])
+@pytest.mark.parametrize("option", STREAM_OPTIONS)
+def test_read_content_stream_matches_whole_read(option, chunk_size, tmp_path):
+    # チャンクの境界をまたぐマッチでも、全体を読み込んだ場合と同じ結果になる
+    tf_path = tmp_path / "input.txt"
+    tf_path.write_text(TEST_CONTENT, encoding="utf-8")
+    result = read_content(tf_path, option, chunk_size=chunk_size)
+    assert result == extract_content(TEST_CONTENT, option)
+
+
+def test_read_content_stream_dollar_at_chunk_end(tmp_path):
+    # 最初に読み込む範囲の末尾に一致しても、ファイルの末尾でなければ採用しない
+    content = "x" * 8188 + "END\n" + "y" * 100 + "END\n"
+    tf_path = tmp_path / "input.txt"
+    tf_path.write_text(content, encoding="utf-8", newline="")
+    option = ReadContentOption(
+        end=ReadContentExtractOption(extract_type="regex", target="END$"),
+    )
+    assert read_content(tf_path, option) == extract_content(content, option)
+    assert len(read_content(tf_path, option)) == len(content) - 1
+
+
+@pytest.mark.parametrize("padding", [8170, 8176, 8185, 8190])
+def test_read_content_stream_greedy_at_chunk_end(padding, tmp_path):
+    # 最初に読み込む範囲の境界をまたいで、貪欲なマッチが長くなる場合
+    content = "x" * padding + "Total 1 entries, 2 entries\nTotal 3 entries\n"
+    tf_path = tmp_path / "input.txt"
+    tf_path.write_text(content, encoding="utf-8", newline="")
+    option = ReadContentOption(
+        start=ReadContentExtractOption(
+            extract_type="regex", target="Total.*entries", include_match=False
+        ),
+        end=ReadContentExtractOption(extract_type="regex", target="3.*"),
+    )
+    assert read_content(tf_path, option) == extract_content(content, option)
+    assert read_content(tf_path, option) == "\nTotal 3 entries"
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp932", "utf-16"])
+def test_read_content_from_end(encoding, tmp_path):
+    # 末尾からの位置は、マルチバイト文字を含む場合も全体を読み込んだ場合と同じ結果になる
+    content = "".join(f"{i}行目: テスト\r\n" for i in range(1, 200))
+    tf_path = tmp_path / "input.txt"
+    tf_path.write_bytes(content.encode(encoding))
+    option = ReadContentOption(
+        start=ReadContentExtractOption(extract_type="line", target=-3),
+        encoding=encoding,
+    )
+    result = read_content(tf_path, option, chunk_size=16)
+    assert result == "197行目: テスト\n198行目: テスト\n199行目: テスト\n"
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["", "a", "a\n", "a\r\nb\rc\n\nd", "a\x0bb\u2028c\r", "\n\n"],
+)
+def test_iter_lines(content):
+    assert list(iter_lines(content)) == content.splitlines()
+    assert list(iter_lines(content * 50, True, chunk_size=3)) == (
+        content * 50
+    ).splitlines(True)
+    # newlines_only の場合は "\r\n"・"\r"・"\n" のみで区切る
+    expected = io.StringIO(content * 50, newline="").readlines()
+    assert list(iter_lines(content * 50, True, 3, newlines_only=True)) == expected
+    assert list(iter_lines(content, newlines_only=True)) == [
+        line.rstrip("\r\n") for line in io.StringIO(content, newline="")
+    ]
@@ -0,0 +1,149 @@
+import os
+from pathlib import Path
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from src.config import (
+    InputOption,
+    OutputOption,
+    ParseOption,
+    RecipeOption,
+    TemplateOption,
+    TextFSMOption,
+    VariableOption,
+    VariablesOption,
+)
+from src.processor.recipe_plan import (
+    build_recipe_plan,
+    fill_placeholders,
+    find_template_variables,
+    tokenize_placeholders,
+)
+
+
+def make_recipe(tmp_path, template_file="test.tpl", parse=None, variables=None):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir(exist_ok=True)
+    (template_dir / "test.tpl").write_text("{{ parse_result }}", encoding="utf-8")
+    return RecipeOption(
+        enabled=True,
+        id="r1",
+        name="TestRecipe",
+        input=InputOption(file_pattern="*.txt"),
+        output=OutputOption(path="out/${fileName}_${name}.txt"),
+        template=TemplateOption(folder=str(template_dir), file=template_file),
+        parse=parse,
+        variables=variables,
+    )
+
+
+def test_build_recipe_plan(tmp_path):
+    variables = VariablesOption(
+        defined={
+            "name": VariableOption(
+                target="content", pattern=r"name=(\w+)", match_index=1
+            ),
+            "missing": VariableOption(target="content", pattern=r"\d+", match_index=3),
+            "named": VariableOption(
+                target="filename", pattern=r"(?P<stem>\w+)\.txt", match_index="stem"
+            ),
+        }
+    )
+    plan = build_recipe_plan(
+        make_recipe(tmp_path, parse=ParseOption(parse_type="json"), variables=variables)
+    )
+    assert plan is not None
+    assert plan.template.render(parse_result="ok") == "ok"
+    assert plan.parser is not None
+    assert plan.parser('{"a": 1}') == {"a": 1}
+    # 範囲外のグループ番号は 0 (マッチ全体) に解決される
+    assert [(v.key, v.group) for v in plan.variables] == [
+        ("name", 1),
+        ("missing", 0),
+        ("named", "stem"),
+    ]
+    output = plan.resolve_output_path({"fileName": "a.txt", "name": "x"})
+    assert output == Path.cwd() / "out" / "a.txt_x.txt"
+
+
+@pytest.mark.parametrize(
+    "template,lazy",
+    [
+        ("{{ variables.name }}", True),
+        ("{{ variables['name'] }}", True),
+        ("{{ variables | tojson }}", False),
+        ("{{ variables.get('name') }}", False),
+    ],
+)
+def test_build_recipe_plan_lazy_variables(tmp_path, template, lazy):
+    variables = VariablesOption(
+        defined={"name": VariableOption(target="content", pattern=r"\w+")}
+    )
+    recipe = make_recipe(tmp_path, variables=variables)
+    (tmp_path / "templates" / "test.tpl").write_text(template, encoding="utf-8")
+    plan = build_recipe_plan(recipe)
+    assert plan.lazy_variables is lazy
+
+
+def test_build_recipe_plan_missing_template(tmp_path):
+    assert build_recipe_plan(make_recipe(tmp_path, template_file="none.tpl")) is None
+
+
+def test_fill_placeholders_keeps_unknown_keys():
+    tokens = tokenize_placeholders("${a}/${b}-${a}.txt")
+    assert fill_placeholders(tokens, {"a": 1}) == "1/${b}-1.txt"
+    assert fill_placeholders(tokenize_placeholders("plain.txt"), {}) == "plain.txt"
+
+
+@pytest.mark.parametrize(
+    "templates,expected",
+    [
+        ({"main": "{{ content }}"}, set()),
+        (
+            {
+                "main": "{{ variables.a }}{{ variables['b'] }}{% include 'sub' %}",
+                "sub": "{{ variables.c }}",
+            },
+            {"a", "b", "c"},
+        ),
+        ({"main": "{% for k in variables %}{{ k }}{% endfor %}"}, None),
+        ({"main": "{{ variables.get('a') }}"}, None),
+        ({"main": "{% include name %}"}, None),
+    ],
+)
+def test_find_template_variables(templates, expected):
+    env = Environment(loader=DictLoader(templates))
+    assert find_template_variables(env, "main") == expected
+
+
+@pytest.mark.parametrize(
+    "parse,cached",
+    [
+        (None, False),
+        (ParseOption(parse_type="json"), False),
+        (ParseOption(parse_type="xml"), True),
+        (ParseOption(parse_type="yaml"), True),
+        (ParseOption(parse_type="jsonl", per_record=True), False),
+    ],
+)
+def test_build_recipe_plan_parse_key(tmp_path, parse, cached):
+    plan = build_recipe_plan(make_recipe(tmp_path, parse=parse))
+    assert (plan.get_parse_key() is not None) == cached
+
+
+def test_build_recipe_plan_parse_key_follows_textfsm_template(tmp_path):
+    template = tmp_path / "template.textfsm"
+    template.write_text("Value A (\\S+)\n\nStart\n  ^${A} -> Record\n")
+    parse = ParseOption(
+        parse_type="textfsm", textfsm_options=TextFSMOption(template=str(template))
+    )
+    plan = build_recipe_plan(make_recipe(tmp_path, parse=parse))
+    key = plan.get_parse_key()
+    assert key is not None
+    template.write_text("Value B (\\S+)\n\nStart\n  ^${B} -> Record\n")
+    os.utime(template, ns=(1, 1))
+    assert plan.get_parse_key() not in (None, key)
+    # stream が有効な場合は遅延評価のため、キャッシュしない
+    parse.textfsm_options.stream = True
+    assert build_recipe_plan(make_recipe(tmp_path, parse=parse)).get_parse_key() is None
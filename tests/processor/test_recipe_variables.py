@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 import pytest
@@ -10,7 +11,7 @@ from src.config import (
     VariableOption,
     VariablesOption,
 )
-from src.processor.recipe_variables import resolve_recipe_variables
+from src.processor.recipe_variables import LazyVariables, resolve_recipe_variables
 
 
 def make_recipe(template_file, template_folder, variables=None):
@@ -111,3 +112,33 @@ def test_resolve_recipe_variables_no_variables():
     assert result["fileName"] == "abc.txt"
     assert result["templateName"] == "tmpl.txt"
     assert result["templateFolder"] == "tmpl_dir"
+
+
+def test_lazy_variables_resolve_on_first_access():
+    calls = []
+
+    def resolve():
+        calls.append("value")
+        return "value"
+
+    variables = LazyVariables({"a": "1", "b": "2"}, {"b": resolve, "c": resolve})
+    assert list(variables) == ["a", "b", "c"]
+    assert calls == []
+    assert variables["b"] == "value"
+    assert variables["b"] == "value"
+    assert calls == ["value"]
+    assert dict(variables) == {"a": "1", "b": "value", "c": "value"}
+
+
+def test_resolve_recipe_variables_lazy():
+    file = Path("/tmp/abc.txt")
+    variables = VariablesOption(
+        defined={"num": VariableOption(target="content", pattern=r"\d+")}
+    )
+    recipe = make_recipe("tmpl.txt", "tmpl_dir", variables)
+    result = resolve_recipe_variables(file, "abc=123", recipe)
+    assert type(result) is dict
+    assert json.loads(json.dumps(result))["num"] == "123"
+    lazy = resolve_recipe_variables(file, "abc=123", recipe, lazy=True)
+    assert type(lazy).__name__ == "LazyVariables"
+    assert dict(lazy) == result
@@ -12,9 +12,12 @@ from src.config import (
     OutputOption,
     ParseOption,
     RecipeOption,
+    RunOption,
     TemplateOption,
+    VariableOption,
+    VariablesOption,
 )
-from src.processor.run_recipe import run_recipe
+from src.processor.run_recipe import run_recipe, run_recipe_group
 
 
 def make_config_and_recipe(
@@ -146,3 +149,196 @@ def test_run_recipe_output_placeholder():
         assert (tmpdir / "input.txt.out").exists()
     finally:
         shutil.rmtree(tmpdir)
+
+
+@pytest.mark.parametrize(
+    "write_mode,run_option",
+    [
+        ("w", RunOption(jobs=2)),
+        ("a", RunOption(jobs=2)),
+        ("w", RunOption(engine="async", queue_size=2)),
+        ("a", RunOption(engine="async", queue_size=2)),
+        ("a", RunOption(engine="async", jobs=2)),
+    ],
+)
+def test_run_recipe_parallel_matches_serial(write_mode, run_option):
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        for i in range(8):
+            (input_dir / f"input_{i}.txt").write_text(f"line{i}", encoding="utf-8")
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{{ variables.fileName }}: {{ content }}\n",
+            output_path=tmpdir / "out.txt",
+        )
+        recipe.output.write_mode = write_mode
+        run_recipe(input_dir, recipe, config)
+        serial = (tmpdir / "out.txt").read_bytes()
+        (tmpdir / "out.txt").unlink()
+        run_recipe(input_dir, recipe, config, run_option)
+        parallel = (tmpdir / "out.txt").read_bytes()
+        assert parallel == serial
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_run_recipe_group_fans_out_to_each_template():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        infile = tmpdir / "input.txt"
+        infile.write_text("a\tb\nabc\t123", encoding="utf-8")
+        parse = ParseOption(parse_type="dsv", dsv_options=DsvOption())
+        config, r1 = make_config_and_recipe(
+            tmpdir, template_content="{{ parse_result[0]['a'] }}", parse=parse
+        )
+        r2 = r1.model_copy(deep=True)
+        r2.id = "r2"
+        r2.template.file = "test2.tpl"
+        r2.output.path = str(tmpdir / "out2.txt")
+        (tmpdir / "templates" / "test2.tpl").write_text(
+            "{{ parse_result[0]['b'] }}", encoding="utf-8"
+        )
+        run_recipe_group(infile, [r1, r2], config)
+        assert (tmpdir / "out.txt").read_text(encoding="utf-8") == "abc"
+        assert (tmpdir / "out2.txt").read_text(encoding="utf-8") == "123"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@pytest.mark.parametrize("write_mode", ["w", "a"])
+@pytest.mark.parametrize(
+    "run_option", [RunOption(), RunOption(engine="async"), RunOption(jobs=2)]
+)
+def test_run_recipe_stream_matches_render(write_mode, run_option):
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        for i in range(4):
+            (input_dir / f"input_{i}.txt").write_text(
+                "\n".join(f"row{j}" for j in range(100)), encoding="utf-8"
+            )
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{% for line in content.splitlines() %}"
+            "{{ variables.fileName }}: {{ line }}\n{% endfor %}",
+            output_path=tmpdir / "out.txt",
+        )
+        recipe.output.write_mode = write_mode
+        run_recipe(input_dir, recipe, config)
+        rendered = (tmpdir / "out.txt").read_bytes()
+        (tmpdir / "out.txt").unlink()
+        recipe.output.stream = True
+        run_recipe(input_dir, recipe, config, run_option)
+        assert (tmpdir / "out.txt").read_bytes() == rendered
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@pytest.mark.parametrize(
+    "run_option", [RunOption(), RunOption(engine="async"), RunOption(jobs=2)]
+)
+@pytest.mark.parametrize("stream", [False, True])
+def test_run_recipe_per_record(run_option, stream):
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        for i in range(3):
+            (input_dir / f"input_{i}.txt").write_text(
+                "\n".join(
+                    json.dumps({"host": {"name": f"h{i}-{j}"}, "value": j})
+                    for j in range(2)
+                ),
+                encoding="utf-8",
+            )
+        parse = ParseOption(parse_type="jsonl", per_record=True)
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{{ parse_result.host.name }}={{ parse_result.value }}",
+            parse=parse,
+            output_path=tmpdir / "out" / "${record.host.name}_${recordIndex}.txt",
+        )
+        recipe.output.stream = stream
+        run_recipe(input_dir, recipe, config, run_option)
+        outputs = sorted((tmpdir / "out").iterdir())
+        assert [p.name for p in outputs] == [
+            f"h{i}-{j}_{j}.txt" for i in range(3) for j in range(2)
+        ]
+        assert (tmpdir / "out" / "h2-1_1.txt").read_text(encoding="utf-8") == "h2-1=1"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_run_recipe_record_iterator():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        infile = tmpdir / "input.txt"
+        infile.write_text("name: a\n---\nname: b\n", encoding="utf-8")
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{% for doc in parse_result %}{{ doc.name }};{% endfor %}",
+            parse=ParseOption(parse_type="yaml_stream"),
+        )
+        run_recipe(infile, recipe, config)
+        assert (tmpdir / "out.txt").read_text(encoding="utf-8") == "a;b;"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_run_recipe_parse_cache():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        infile = tmpdir / "input.txt"
+        infile.write_text("<root><name>a</name></root>", encoding="utf-8")
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{{ parse_result.root.name['#text'] }}",
+            parse=ParseOption(parse_type="xml"),
+        )
+        run_option = RunOption(cache_dir=tmpdir / "cache")
+        run_recipe(infile, recipe, config, run_option)
+        entries = list((tmpdir / "cache" / "parse").rglob("*.pickle"))
+        assert len(entries) == 1
+        # キャッシュから読み込んだ結果でレンダリングする
+        (tmpdir / "out.txt").unlink()
+        run_recipe(
+            infile, recipe, config, RunOption(cache_dir=tmpdir / "cache", jobs=2)
+        )
+        assert (tmpdir / "out.txt").read_text(encoding="utf-8") == "a"
+        assert list((tmpdir / "cache" / "parse").rglob("*.pickle")) == entries
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@pytest.mark.parametrize("per_record", [False, True])
+def test_run_recipe_variables_tojson(per_record):
+    # variables 全体を参照するテンプレートには、計算済みの dict を渡す
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        infile = tmpdir / "input.txt"
+        infile.write_text('{"name": "a"}\n', encoding="utf-8")
+        config, recipe = make_config_and_recipe(
+            tmpdir,
+            template_content="{{ variables | tojson }}|{{ variables }}",
+            parse=ParseOption(parse_type="jsonl", per_record=per_record),
+        )
+        recipe.variables = VariablesOption(
+            defined={
+                "name": VariableOption(
+                    target="content", pattern=r'"name": "(\w+)"', match_index=1
+                )
+            }
+        )
+        run_recipe(infile, recipe, config)
+        rendered, text = (tmpdir / "out.txt").read_text(encoding="utf-8").split("|")
+        variables = json.loads(rendered)
+        assert variables["fileName"] == "input.txt"
+        assert variables["name"] == "a"
+        assert text.startswith("{'fileName': 'input.txt'")
+        if per_record:
+            assert variables["recordIndex"] == 0
+    finally:
+        shutil.rmtree(tmpdir)
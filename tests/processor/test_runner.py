@@ -8,6 +8,7 @@ from src.config import (
     Config,
     InputOption,
     OutputOption,
+    ParseOption,
     PresetOption,
     PresetRecipeOption,
     RecipeOption,
@@ -63,3 +64,43 @@ def test_run_processor_param(recipes, presets, should_exist):
         assert exists == should_exist
     finally:
         shutil.rmtree(tmpdir)
+
+
+def test_run_processor_runs_recipe_once_for_presets_and_recipes():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        infile = tmpdir / "input.txt"
+        infile.write_text("dummy", encoding="utf-8")
+        config = make_config(tmpdir)
+        config.recipes[0].output.write_mode = "a"
+        run_processor(infile, config, recipes=["r1"], presets=["Preset1"])
+        assert (tmpdir / "out.txt").read_text(encoding="utf-8") == "ok"
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_run_processor_keeps_recipe_order_for_shared_output():
+    # 同じ出力に追記するレシピは、指定順にレシピごとに全ファイルを処理する
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        for i in range(2):
+            (input_dir / f"input_{i}.txt").write_text("{}", encoding="utf-8")
+        config = make_config(tmpdir)
+        template_dir = tmpdir / "templates"
+        recipes = []
+        for recipe_id in ("A", "B", "C"):
+            (template_dir / f"{recipe_id}.tpl").write_text(recipe_id, encoding="utf-8")
+            recipe = config.recipes[0].model_copy(deep=True)
+            recipe.id = recipe_id
+            recipe.template.file = f"{recipe_id}.tpl"
+            recipe.output.write_mode = "a"
+            if recipe_id == "B":
+                recipe.parse = ParseOption(parse_type="json")
+            recipes.append(recipe)
+        config.recipes = recipes
+        run_processor(input_dir, config, recipes=["A", "B", "C"])
+        assert (tmpdir / "out.txt").read_text(encoding="utf-8") == "AABBCC"
+    finally:
+        shutil.rmtree(tmpdir)
@@ -2,15 +2,33 @@ import shutil
 import tempfile
 from pathlib import Path
 
-from src.config import TemplateOption
+import pytest
+
+from src.config import (
+    Config,
+    InputOption,
+    OutputOption,
+    RecipeOption,
+    TemplateOption,
+)
 from src.processor.templater import (
+    CompiledTemplateLoader,
+    _parse_address,
+    clear_ip_caches,
+    collapse_networks,
+    compile_config_templates,
     ip_address,
     ip_interface,
     ip_network,
     is_ip_address,
     is_ip_interface,
     is_ip_network,
+    map_ip_network,
+    prefix_table,
+    set_compiled_template_dir,
+    set_template_cache_dir,
     setup_template_environment,
+    summarize,
 )
 
 
@@ -67,6 +85,108 @@ def test_ip_filters():
     assert is_ip_interface("bad") is False
 
 
+def test_ip_filters_cached():
+    clear_ip_caches()
+    for _ in range(3):
+        assert ip_address("192.0.2.1") == "192.0.2.1"
+        assert is_ip_address("bad") is False
+    info = _parse_address.cache_info()
+    assert info.misses == 2
+    assert info.hits == 4
+    # ハッシュできない値は解析できない値として扱う
+    assert is_ip_address(["192.0.2.1"]) is False
+
+
+def test_bulk_ip_filters():
+    assert map_ip_network(["192.0.2.0/24", "bad", "192.0.2.1/24"]) == [
+        "192.0.2.0/24",
+        "bad",
+        "192.0.2.1/24",
+    ]
+    assert map_ip_network(["192.0.2.1/24"], strict=False) == ["192.0.2.0/24"]
+    assert collapse_networks(
+        ["192.0.2.0/25", "192.0.2.128/25", "192.0.2.1/32", "2001:db8::/33", "bad"]
+    ) == ["192.0.2.0/24", "2001:db8::/33"]
+    assert summarize(["192.0.2.0", "192.0.2.1", "192.0.2.2-192.0.2.3"]) == [
+        "192.0.2.0/30"
+    ]
+    assert summarize(["198.51.100.10 - 198.51.100.8", "bad-range"]) == [
+        "198.51.100.8/31",
+        "198.51.100.10/32",
+    ]
+
+
+def test_bulk_ip_filters_in_template():
+    tmpdir = make_template_dir(
+        {"test.tpl": "{{ routes|map(attribute='prefix')|collapse_networks|join(',') }}"}
+    )
+    option = TemplateOption(folder=str(tmpdir), file="test.tpl")
+    env = setup_template_environment(option)
+    assert env is not None
+    routes = [{"prefix": "10.0.0.0/24"}, {"prefix": "10.0.1.0/24"}]
+    assert env.get_template("test.tpl").render(routes=routes) == "10.0.0.0/23"
+    shutil.rmtree(tmpdir)
+
+
+def test_prefix_table():
+    routes = [
+        {"prefix": "0.0.0.0/0", "nexthop": "default"},
+        {"prefix": "10.0.0.0/8", "nexthop": "a"},
+        {"prefix": "10.1.0.0/16", "nexthop": "b"},
+        {"prefix": "10.1.2.0/24", "nexthop": "c"},
+        {"prefix": "10.1.2.0/24", "nexthop": "duplicate"},
+        {"prefix": "2001:db8::/32", "nexthop": "v6"},
+        {"prefix": "bad", "nexthop": "ignored"},
+    ]
+    table = prefix_table(routes, "prefix")
+    assert len(table) == 5
+    assert table.longest_match("10.1.2.3")["nexthop"] == "c"
+    assert table.longest_match("10.1.3.1/24")["nexthop"] == "b"
+    assert table.longest_match("10.2.0.0/16")["nexthop"] == "a"
+    assert table.longest_match("192.0.2.1")["nexthop"] == "default"
+    assert table.longest_match_network("10.1.9.9") == "10.1.0.0/16"
+    assert table.longest_match("2001:db8::1")["nexthop"] == "v6"
+    assert table.longest_match("2001:db9::1") is None
+    assert table.longest_match("bad") is None
+    assert table.contains("2001:db8:1::/48") is True
+    assert table.contains("::1") is False
+    assert [row["nexthop"] for row in table.covered_by("10.0.0.0/8")] == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert table.covered_by("172.16.0.0/12") == []
+
+    table = prefix_table(["192.0.2.0/25", "192.0.2.128/25"])
+    assert table.covered_by("192.0.2.0/24") == ["192.0.2.0/25", "192.0.2.128/25"]
+    assert table.longest_match("192.0.2.200") == "192.0.2.128/25"
+
+
+def test_prefix_table_in_template():
+    tmpdir = make_template_dir(
+        {
+            "test.tpl": (
+                "{% set routes = prefix_table(routes, 'prefix') %}"
+                "{% for ip in interfaces %}"
+                "{{ ip }}={{ routes.longest_match(ip).nexthop }};"
+                "{% endfor %}"
+            )
+        }
+    )
+    option = TemplateOption(folder=str(tmpdir), file="test.tpl")
+    env = setup_template_environment(option)
+    assert env is not None
+    routes = [
+        {"prefix": "10.0.0.0/8", "nexthop": "a"},
+        {"prefix": "10.1.0.0/16", "nexthop": "b"},
+    ]
+    rendered = env.get_template("test.tpl").render(
+        routes=routes, interfaces=["10.1.0.1/24", "10.2.0.1/24"]
+    )
+    assert rendered == "10.1.0.1/24=b;10.2.0.1/24=a;"
+    shutil.rmtree(tmpdir)
+
+
 def test_jinja_filters_registered():
     structure = {"test.tpl": "{{ '192.0.2.1'|ip_address }}"}
     tmpdir = make_template_dir(structure)
@@ -77,3 +197,58 @@ def test_jinja_filters_registered():
     template = env.get_template("test.tpl")
     assert template.render() == "192.0.2.1"
     shutil.rmtree(tmpdir)
+
+
+def test_setup_template_environment_shared_with_bytecode_cache(tmp_path):
+    tmpdir = make_template_dir({"test.tpl": "Hello {{ name }}"})
+    cache_dir = tmp_path / "cache"
+    set_template_cache_dir(cache_dir)
+    try:
+        option = TemplateOption(folder=str(tmpdir), file="test.tpl")
+        env = setup_template_environment(option)
+        assert env is not None
+        assert setup_template_environment(option) is env
+        assert env.get_template("test.tpl").render(name="World") == "Hello World"
+        assert list(cache_dir.iterdir())
+
+        # 新しいプロセスと同様に環境を作り直しても、更新後のテンプレートが使われる
+        (tmpdir / "test.tpl").write_text("Bye {{ name }}", encoding="utf-8")
+        set_template_cache_dir(cache_dir)
+        env = setup_template_environment(option)
+        assert env is not None
+        assert env.get_template("test.tpl").render(name="World") == "Bye World"
+    finally:
+        set_template_cache_dir(None)
+        shutil.rmtree(tmpdir)
+
+
+@pytest.mark.parametrize("use_zip", [False, True])
+def test_compile_config_templates(tmp_path, use_zip):
+    tmpdir = make_template_dir(
+        {
+            "test.tpl": "{% include 'sub.tpl' %}",
+            "sub.tpl": "{{ '192.0.2.1'|ip_address }}",
+        }
+    )
+    option = TemplateOption(folder=str(tmpdir), file="test.tpl")
+    recipe = RecipeOption(
+        enabled=True,
+        id="r1",
+        name="r1",
+        input=InputOption(file_pattern="*"),
+        output=OutputOption(path="out.txt"),
+        template=option,
+    )
+    config = Config(version="1.0", name="test", recipes=[recipe], presets=[])
+    try:
+        assert compile_config_templates(config, tmp_path / "compiled", use_zip) == 0
+        # ソースのフォルダがなくてもコンパイル済みのテンプレートを読み込める
+        shutil.rmtree(tmpdir)
+        set_compiled_template_dir(tmp_path / "compiled")
+        env = setup_template_environment(option)
+        assert env is not None
+        assert isinstance(env.loader, CompiledTemplateLoader)
+        assert env.get_template("test.tpl").render() == "192.0.2.1"
+    finally:
+        set_compiled_template_dir(None)
+        shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from src.config import (
+    Config,
+    InputOption,
+    OutputOption,
+    RecipeOption,
+    TemplateOption,
+)
+from src.processor import watcher
+from src.processor.watcher import StatIndex, matches_input, watch_processor
+
+
+def touch(path: Path, content: str, offset_ns: int = 0):
+    path.write_text(content, encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + offset_ns))
+
+
+def test_stat_index_detects_changes():
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        touch(tmpdir / "a.txt", "a")
+        (tmpdir / "sub").mkdir()
+        touch(tmpdir / "sub" / "b.txt", "b")
+        index = StatIndex([tmpdir], batch_size=1)
+        assert len(index) == 2
+        assert index.poll() == (set(), set())
+
+        touch(tmpdir / "sub" / "c.txt", "c")
+        changed, removed = index.poll()
+        assert changed == {tmpdir / "sub" / "c.txt"}
+        assert removed == set()
+
+        (tmpdir / "a.txt").unlink()
+        changed, removed = index.poll()
+        assert removed == {tmpdir / "a.txt"}
+
+        # 内容の変更はバッチごとの巡回で検出される
+        touch(tmpdir / "sub" / "b.txt", "bb", offset_ns=10**9)
+        changed = set()
+        for _ in range(len(index)):
+            changed |= index.poll()[0]
+        assert changed == {tmpdir / "sub" / "b.txt"}
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_matches_input():
+    root = Path("/data")
+    assert matches_input(Path("/data/a.txt"), root, "*.txt")
+    assert not matches_input(Path("/data/sub/a.txt"), root, "*.txt")
+    assert matches_input(Path("/data/sub/a.txt"), root, "**/*.txt")
+    assert not matches_input(Path("/other/a.txt"), root, "**/*.txt")
+
+
+def test_watch_processor_rerenders_changed_files(monkeypatch):
+    tmpdir = Path(tempfile.mkdtemp())
+    try:
+        input_dir = tmpdir / "inputs"
+        input_dir.mkdir()
+        touch(input_dir / "a.txt", "a1")
+        touch(input_dir / "b.txt", "b1")
+        template_dir = tmpdir / "templates"
+        template_dir.mkdir()
+        (template_dir / "test.tpl").write_text("{{ content }}", encoding="utf-8")
+        recipe = RecipeOption(
+            enabled=True,
+            id="r1",
+            name="TestRecipe",
+            input=InputOption(file_pattern="*.txt"),
+            output=OutputOption(path=str(tmpdir / "out" / "${fileName}")),
+            template=TemplateOption(folder=str(template_dir), file="test.tpl"),
+        )
+        config = Config(version="1.0", name="test", recipes=[recipe], presets=[])
+
+        def fake_sleep(_):
+            (tmpdir / "out" / "b.txt").write_text("untouched", encoding="utf-8")
+            touch(input_dir / "a.txt", "a2", offset_ns=10**9)
+
+        monkeypatch.setattr(watcher.time, "sleep", fake_sleep)
+        watch_processor(
+            input_dir,
+            tmpdir / "config.yaml",
+            config,
+            lambda _: config,
+            recipes=["r1"],
+            max_polls=1,
+        )
+        assert (tmpdir / "out" / "a.txt").read_text(encoding="utf-8") == "a2"
+        assert (tmpdir / "out" / "b.txt").read_text(encoding="utf-8") == "untouched"
+    finally:
+        shutil.rmtree(tmpdir)
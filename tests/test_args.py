@@ -34,10 +34,19 @@ def test_set_parser_defaults(monkeypatch):
     parser, args = set_parser()
     assert isinstance(parser, argparse.ArgumentParser)
     assert isinstance(args, Argument)
+    assert args.command == "run"
     assert args.config == Path("config.yaml")
     assert args.input is None
     assert args.recipes is None
     assert args.presets is None
+    assert args.jobs is None
+    assert args.incremental is False
+    assert args.force is False
+    assert args.prune_manifest is False
+    assert args.cache_dir is None
+    assert args.no_cache is False
+    assert args.parse_cache_size == 512
+    assert args.validate_textfsm is False
     assert args.verbose is False
 
 
@@ -54,6 +63,10 @@ def test_set_parser_all_args(monkeypatch):
         "-p",
         "pre1",
         "pre2",
+        "-j",
+        "4",
+        "--cache-dir",
+        "cache",
         "--verbose",
     ]
     monkeypatch.setattr(sys, "argv", argv)
@@ -62,4 +75,28 @@ def test_set_parser_all_args(monkeypatch):
     assert args.input == Path("input.txt")
     assert args.recipes == ["rec1", "rec2"]
     assert args.presets == ["pre1", "pre2"]
+    assert args.jobs == 4
+    assert args.cache_dir == Path("cache")
     assert args.verbose is True
+
+
+def test_set_parser_command(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "serve", "--port", "8765"])
+    _, args = set_parser()
+    assert args.command == "serve"
+    assert args.port == 8765
+
+
+def test_set_parser_compile_templates(monkeypatch):
+    argv = ["prog", "compile-templates", "--compiled-templates", "out", "--compile-zip"]
+    monkeypatch.setattr(sys, "argv", argv)
+    _, args = set_parser()
+    assert args.command == "compile-templates"
+    assert args.compiled_templates == Path("out")
+    assert args.compile_zip is True
+
+
+def test_set_parser_validate_textfsm(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--validate-textfsm"])
+    _, args = set_parser()
+    assert args.validate_textfsm is True
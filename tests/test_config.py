@@ -52,6 +52,8 @@ def test_read_content_extract_option_invalid():
         ReadContentExtractOption(extract_type="index", target="notint")
     with pytest.raises(ValidationError):
         ReadContentExtractOption(extract_type="exact", target=123)
+    with pytest.raises(ValidationError):
+        ReadContentExtractOption(extract_type="regex", target="(unclosed")
 
 
 def test_read_content_extract_option_include_match():
@@ -83,6 +85,8 @@ def test_variable_option():
     v = VariableOption(target="filename", pattern=".*")
     assert v.target == "filename"
     assert v.pattern == ".*"
+    with pytest.raises(ValidationError):
+        VariableOption(target="filename", pattern="[a-")
 
 
 def test_additional_param_option():
@@ -176,6 +180,10 @@ def test_parse_option_all_types():
     ParseOption(parse_type="textfsm", textfsm_options=TextFSMOption(template="foo"))
     with pytest.raises(ValidationError):
         ParseOption(parse_type="textfsm")
+    ParseOption(parse_type="jsonl", per_record=True)
+    ParseOption(parse_type="yaml_stream", per_record=True)
+    with pytest.raises(ValidationError):
+        ParseOption(parse_type="json", per_record=True)
 
 
 def test_variables_option_defined():
@@ -35,3 +35,75 @@ def test_main_integration():
     assert fsm_output == expected_fsm_output, (
         "FSM output does not match expected FSM output"
     )
+
+
+# 起動時のモジュール読み込み時間の上限 (秒; -X importtime の合計)
+HELP_IMPORT_BUDGET = 0.5
+PLAIN_RENDER_IMPORT_BUDGET = 2.0
+
+
+def run_with_importtime(args, cwd):
+    # 返り値: (実行結果, 読み込んだモジュールの一覧, 読み込み時間の合計 (秒))
+    cmd = [sys.executable, "-X", "importtime", str(MAIN_PATH), *args]
+    result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, check=False)
+    modules = set()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        # 最上位 (インデントなし) の累計時間を合計する
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return result, modules, total / 1_000_000
+
+
+def test_main_help_startup(tmp_path):
+    result, modules, total = run_with_importtime(["--help"], tmp_path)
+    assert result.returncode == 0, f"STDERR: {result.stderr}"
+    assert "usage:" in result.stdout
+    for module in ("pydantic", "loguru", "jinja2", "ruamel.yaml", "textfsm"):
+        assert module not in modules
+    assert total < HELP_IMPORT_BUDGET
+
+
+def test_main_plain_render_startup(tmp_path):
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "plain.j2").write_text("{{ content }}", encoding="utf-8")
+    (tmp_path / "input.txt").write_text("hello", encoding="utf-8")
+    (tmp_path / "config.yaml").write_text(
+        "version: '1.0'\n"
+        "name: startup\n"
+        "recipes:\n"
+        "- enabled: true\n"
+        "  id: plain\n"
+        "  name: plain\n"
+        "  input:\n"
+        "    file_pattern: input.txt\n"
+        "  output:\n"
+        "    path: output.txt\n"
+        "  template:\n"
+        "    folder: templates\n"
+        "    file: plain.j2\n"
+        "presets: []\n",
+        encoding="utf-8",
+    )
+    args = ["-c", "config.yaml", "-i", "input.txt", "-r", "plain", "--no-cache"]
+    result, modules, total = run_with_importtime(args, tmp_path)
+    assert result.returncode == 0, f"STDERR: {result.stderr}"
+    assert (tmp_path / "output.txt").read_text(encoding="utf-8") == "hello"
+    # パーサーやサーバーなど、使わない機能のモジュールは読み込まない
+    for module in (
+        "textfsm",
+        "xml.etree.ElementTree",
+        "processor.parser.json_parser",
+        "processor.parser.textfsm_parser",
+        "http.server",
+        "processor.watcher",
+        "regex",
+    ):
+        assert module not in modules
+    assert total < PLAIN_RENDER_IMPORT_BUDGET
@@ -0,0 +1,156 @@
+import http.client
+import json
+import socket
+import threading
+import warnings
+
+import pytest
+
+from src.config import (
+    Config,
+    InputOption,
+    OutputOption,
+    ReadContentExtractOption,
+    ReadContentOption,
+    RecipeOption,
+    RunOption,
+    TemplateOption,
+)
+from src.server import (
+    LOOPBACK_HOST,
+    RenderService,
+    create_server,
+    read_token,
+    send_request,
+    write_token,
+)
+
+
+def make_config(tmp_path):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir(parents=True, exist_ok=True)
+    (template_dir / "test.tpl").write_text(
+        "{{ variables.fileName }}: {{ content }}", encoding="utf-8"
+    )
+    recipe = RecipeOption(
+        enabled=True,
+        id="r1",
+        name="TestRecipe",
+        input=InputOption(file_pattern="*.txt"),
+        output=OutputOption(path=str(tmp_path / "out.txt")),
+        template=TemplateOption(folder=str(template_dir), file="test.tpl"),
+        read_content=ReadContentOption(
+            start=ReadContentExtractOption(
+                extract_type="exact", target="BEGIN", include_match=False
+            )
+        ),
+    )
+    return Config(version="1.0", name="test", recipes=[recipe], presets=[])
+
+
+def start_server(service, **kwargs):
+    server = create_server(service, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def test_render_service_render_and_run(tmp_path):
+    service = RenderService(make_config(tmp_path))
+    assert service.render("r1", "skip BEGIN body", "dev.txt") == "dev.txt:  body"
+    infile = tmp_path / "input.txt"
+    infile.write_text("BEGINfile", encoding="utf-8")
+    service.run("r1", str(infile))
+    assert (tmp_path / "out.txt").read_text(encoding="utf-8") == "input.txt: file"
+    with pytest.raises(ValueError):
+        service.render("missing", "", "dev.txt")
+
+
+def test_server_over_loopback_http(tmp_path):
+    token = write_token(tmp_path / "stapler.token")
+    assert read_token(tmp_path / "stapler.token") == token
+    server = start_server(RenderService(make_config(tmp_path)), port=0, token=token)
+    port = server.server_address[1]
+    try:
+        assert send_request("/health", port=port, token=token)[0] == 200
+        status, result = send_request(
+            "/render",
+            {"recipe": "r1", "content": "BEGINabc", "file_name": "a.txt"},
+            port=port,
+            token=token,
+        )
+        assert status == 200
+        assert result["rendered"] == "a.txt: abc"
+        status, result = send_request(
+            "/render", {"recipe": "nope"}, port=port, token=token
+        )
+        assert status == 400
+        # トークンがない、または異なる場合は受け付けない
+        assert send_request("/health", port=port)[0] == 401
+        status, _ = send_request(
+            "/render", {"recipe": "r1"}, port=port, token=token + "x"
+        )
+        assert status == 401
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_run_with_jobs(tmp_path):
+    service = RenderService(make_config(tmp_path), RunOption(jobs=2))
+    server = start_server(service, port=0, token="secret")
+    infile = tmp_path / "input.txt"
+    infile.write_text("BEGINfile", encoding="utf-8")
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            status, _ = send_request(
+                "/run",
+                {"recipe": "r1", "path": str(infile)},
+                port=server.server_address[1],
+                token="secret",
+            )
+        assert status == 200
+        assert (tmp_path / "out.txt").read_text(encoding="utf-8") == "input.txt: file"
+        # 処理スレッドから worker プロセスを fork しない (3.12 以降は DeprecationWarning)
+        assert not [w for w in caught if "fork" in str(w.message)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets required")
+def test_server_over_unix_socket(tmp_path):
+    socket_path = tmp_path / "stapler.sock"
+    server = start_server(RenderService(make_config(tmp_path)), socket_path=socket_path)
+    try:
+        infile = tmp_path / "input.txt"
+        infile.write_text("BEGINfile", encoding="utf-8")
+        status, _ = send_request(
+            "/run", {"recipe": "r1", "path": str(infile)}, socket_path=socket_path
+        )
+        assert status == 200
+        assert (tmp_path / "out.txt").read_text(encoding="utf-8") == "input.txt: file"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_rejects_non_json_content_type(tmp_path):
+    token = "secret"
+    server = start_server(RenderService(make_config(tmp_path)), port=0, token=token)
+    connection = http.client.HTTPConnection(LOOPBACK_HOST, server.server_address[1])
+    try:
+        connection.request(
+            "POST",
+            "/render",
+            body=json.dumps({"recipe": "r1", "content": "BEGINabc"}),
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+        )
+        response = connection.getresponse()
+        assert response.status == 415
+        assert json.loads(response.read())["error"]
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()